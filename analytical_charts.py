@@ -0,0 +1,216 @@
+from datetime import datetime
+
+from query_cache import cached
+from summary_tables import tag_activity
+from tag_bitmaps import popular_tags
+
+# Data for each chart on the analytical dashboard.
+#
+# The dashboard used to compute every chart before returning any HTML. Now the
+# page renders the KPI cards and filters only, and each chart fetches its own
+# payload from /api/analytical/<chart> in parallel, so the slowest chart no
+# longer holds up the rest of the page.
+
+# Seconds a browser may reuse a chart payload before revalidating it
+ANALYTICAL_CHART_MAX_AGE = 60
+
+RATING_LABELS = ['1 Star', '2 Stars', '3 Stars', '4 Stars', '5 Stars']
+
+# Tags that read as product aspects, preferred for the aspect ratings chart
+ASPECT_TAGS = ('Quality', 'Price', 'Value', 'Design', 'Performance', 'Material')
+
+
+# Tables the KPI cards are computed from; the cached bundle is reused until one changes
+KPI_TABLES = ('Products', 'Tags', 'Product_Tags', 'Product_Ratings')
+
+
+def _compute_kpis(conn):
+    # One statement: Product_Tags is grouped once for both the tag coverage and
+    # the most-tagged product, everything else is a lookup in the summary tables
+    row = conn.execute("""
+    WITH product_tag_counts AS (
+        SELECT COUNT(*) AS TagCount FROM Product_Tags GROUP BY ProductID
+    ),
+    lowest_tag AS (
+        SELECT t.TagName, ts.AvgRating
+        FROM tag_stats ts
+        JOIN Tags t ON ts.TagID = t.TagID
+        WHERE ts.RatingCount > 0
+        ORDER BY ts.AvgRating ASC
+        LIMIT 1
+    ),
+    top_tag AS (
+        SELECT t.TagName, ts.ProductCount
+        FROM tag_stats ts
+        JOIN Tags t ON ts.TagID = t.TagID
+        WHERE ts.ProductCount > 0
+        ORDER BY ts.ProductCount DESC, t.TagName
+        LIMIT 1
+    )
+    SELECT
+        (SELECT RowCount FROM table_stats WHERE TableName = 'Products' AND ColumnName = '*') AS total_products,
+        (SELECT RowCount FROM table_stats WHERE TableName = 'Tags' AND ColumnName = '*') AS total_tags,
+        (SELECT ValueCount FROM table_stats WHERE TableName = 'Product_Ratings' AND ColumnName = 'Rating') AS total_ratings,
+        (SELECT ValueSum / ValueCount FROM table_stats
+         WHERE TableName = 'Product_Ratings' AND ColumnName = 'Rating' AND ValueCount > 0) AS avg_rating,
+        (SELECT MAX(TagCount) FROM product_tag_counts) AS most_tags_count,
+        (SELECT COUNT(*) FROM product_tag_counts) AS tagged_products,
+        (SELECT TagName FROM lowest_tag) AS lowest_tag_name,
+        (SELECT AvgRating FROM lowest_tag) AS lowest_tag_rating,
+        (SELECT TagName FROM top_tag) AS top_tag_name,
+        (SELECT ProductCount FROM top_tag) AS top_tag_usage
+    """).fetchone()
+    (total_products, total_tags, total_ratings, avg_rating, most_tags_count, tagged_products,
+     lowest_tag_name, lowest_tag_rating, top_tag_name, top_tag_usage) = row
+
+    return {
+        'total_products': total_products or 0,
+        'total_tags': total_tags or 0,
+        'total_ratings': total_ratings or 0,
+        'avg_rating': round(avg_rating, 1) if avg_rating is not None else 0,
+        'most_tags_count': most_tags_count or 0,
+        'coverage_pct': round(tagged_products * 100.0 / total_products, 1) if total_products else 0,
+        'lowest_rated_tag': {'TagName': lowest_tag_name, 'AvgRating': lowest_tag_rating}
+        if lowest_tag_name is not None else {'TagName': 'N/A', 'AvgRating': 0},
+        'top_tag': {'TagName': top_tag_name, 'TagUsage': top_tag_usage} if top_tag_name is not None else None
+    }
+
+
+def analytical_kpis(conn):
+    """Numbers for the KPI cards rendered with the page shell, cached per data version."""
+    return cached(conn, 'analytical_kpis', _compute_kpis, tables=KPI_TABLES)
+
+
+def tag_ratings_chart(conn, limit=15):
+    rows = conn.execute("""
+    SELECT t.TagName, ROUND(ts.AvgRating, 2) AS AvgRating, ts.RatingCount
+    FROM tag_stats ts
+    JOIN Tags t ON ts.TagID = t.TagID
+    WHERE ts.RatingCount > 0
+    ORDER BY ts.AvgRating DESC
+    LIMIT ?
+    """, (limit,)).fetchall()
+    return {
+        'tag_names': [row[0] for row in rows],
+        'ratings': [row[1] for row in rows],
+        'rating_counts': [row[2] for row in rows]
+    }
+
+
+def popular_tags_chart(conn, limit=50):
+    return {'tags': popular_tags(conn, limit=limit)}
+
+
+def rating_distribution_chart(conn):
+    # Summed from the per-product histograms instead of scanning Product_Ratings
+    row = conn.execute("""
+    SELECT COALESCE(SUM(Count1), 0), COALESCE(SUM(Count2), 0), COALESCE(SUM(Count3), 0),
+           COALESCE(SUM(Count4), 0), COALESCE(SUM(Count5), 0)
+    FROM product_rating_stats
+    """).fetchone()
+    return {'labels': RATING_LABELS, 'counts': list(row)}
+
+
+def aspect_ratings_chart(conn):
+    """{aspect tag: [count of 1..5 star ratings]}, falling back to the most rated tags."""
+    placeholders = ', '.join('?' for _ in ASPECT_TAGS)
+    rows = conn.execute(f"""
+    SELECT t.TagName, ts.Count1, ts.Count2, ts.Count3, ts.Count4, ts.Count5
+    FROM tag_stats ts
+    JOIN Tags t ON ts.TagID = t.TagID
+    WHERE t.TagName IN ({placeholders}) AND ts.RatingCount > 0
+    ORDER BY ts.ProductCount DESC
+    LIMIT 5
+    """, ASPECT_TAGS).fetchall()
+    if not rows:
+        rows = conn.execute("""
+        SELECT t.TagName, ts.Count1, ts.Count2, ts.Count3, ts.Count4, ts.Count5
+        FROM tag_stats ts
+        JOIN Tags t ON ts.TagID = t.TagID
+        WHERE ts.RatingCount > 0
+        ORDER BY ts.RatingCount DESC
+        LIMIT 3
+        """).fetchall()
+    return {'labels': RATING_LABELS, 'aspects': {row[0]: list(row[1:]) for row in rows}}
+
+
+def top_products_chart(conn, limit=10):
+    # Ranked by Bayesian average straight off the product_rating_stats index;
+    # tags are only looked up for the products returned
+    rows = conn.execute("""
+    SELECT
+        p.[Product Name] as ProductName,
+        ROUND(s.AvgRating, 1) AS Rating,
+        s.RatingCount AS ReviewCount,
+        ROUND(s.BayesianAvg, 2) AS BayesianRating,
+        (SELECT GROUP_CONCAT(t.TagName)
+         FROM Product_Tags pt
+         JOIN Tags t ON pt.TagID = t.TagID
+         WHERE pt.ProductID = s.ProductID) AS Tags
+    FROM product_rating_stats s
+    JOIN Products p ON p.[Product ID] = s.ProductID
+    WHERE s.RatingCount >= 3
+    ORDER BY s.BayesianAvg DESC, s.RatingCount DESC
+    LIMIT ?
+    """, (limit,)).fetchall()
+    return {'products': [dict(zip(('ProductName', 'Rating', 'ReviewCount', 'BayesianRating', 'Tags'), row))
+                         for row in rows]}
+
+
+def recommendation_strength_chart(conn):
+    """0-1 gauge value from data completeness, rating spread and tag coverage."""
+    kpis = analytical_kpis(conn)
+    rating_levels = sum(1 for count in rating_distribution_chart(conn)['counts'] if count > 0)
+    total_products, total_ratings = kpis['total_products'], kpis['total_ratings']
+
+    # Same weighting the dashboard has always used, on a 0-100 scale
+    score = min(100, ((total_products or 1) / 20) +
+                ((total_ratings or 1) / 40) +
+                ((total_ratings > 0) * 15) +
+                ((rating_levels or 1) * 5) +
+                (kpis['coverage_pct'] / 2) +
+                ((kpis['total_tags'] or 1) / 10))
+    return {'strength': round(min(1.0, max(0.0, score / 100.0)), 3), 'score': round(score, 1)}
+
+
+def tag_activity_chart(conn, months=6, top_n=5):
+    activity = tag_activity(conn, grain='month', periods=months, top_n=top_n)
+    labels = [datetime.strptime(bucket, '%Y-%m-%d').strftime('%b') for bucket in activity['buckets']]
+    names = [series['TagName'] for series in activity['series']]
+    data = [series['values'] for series in activity['series']]
+
+    # No events recorded yet - show the most used tags with no activity
+    if not data:
+        names = [tag['TagName'] for tag in popular_tags(conn, limit=top_n)]
+        data = [[0] * len(labels) for _ in names]
+    return {'labels': labels, 'tag_names': names, 'data': data}
+
+
+ANALYTICAL_CHARTS = {
+    'tag_ratings': tag_ratings_chart,
+    'popular_tags': popular_tags_chart,
+    'rating_distribution': rating_distribution_chart,
+    'aspect_ratings': aspect_ratings_chart,
+    'top_products': top_products_chart,
+    'recommendation_strength': recommendation_strength_chart,
+    'tag_activity': tag_activity_chart
+}
+
+# Source tables of each chart (the summary tables it reads are kept by
+# triggers on these); a cached payload is reused until one of them changes
+ANALYTICAL_CHART_TABLES = {
+    'tag_ratings': ('Tags', 'Product_Tags', 'Product_Ratings'),
+    'popular_tags': ('Tags', 'Product_Tags'),
+    'rating_distribution': ('Product_Ratings',),
+    'aspect_ratings': ('Tags', 'Product_Tags', 'Product_Ratings'),
+    'top_products': ('Products', 'Tags', 'Product_Tags', 'Product_Ratings'),
+    'recommendation_strength': KPI_TABLES,
+    # Month buckets also move with the calendar; SOFT_TTL refreshes those
+    'tag_activity': ('Tags', 'Product_Tags', 'Product_Ratings')
+}
+
+
+def analytical_chart(conn, chart):
+    """Payload of one chart in ANALYTICAL_CHARTS, cached per data version."""
+    return cached(conn, f'analytical_chart:{chart}', ANALYTICAL_CHARTS[chart],
+                  tables=ANALYTICAL_CHART_TABLES[chart])
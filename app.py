@@ -1,21 +1,69 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, url_for
 import sqlite3
 import os
 import json
 from datetime import datetime, timedelta
 import decimal
 
+from lookups import ensure_lookup_indexes, category_filter, tag_filter, get_dictionaries, resolve_category_ids
+from tag_bitmaps import ensure_bitmap_change_log, prune_bitmap_change_log, get_tag_index
+from recommendations import ensure_recommendation_indexes, recommend, precomputed_neighbours
+from summary_tables import ensure_summary_tables, tag_activity, table_stats, ACTIVITY_GRAINS, MAX_ACTIVITY_PERIODS
+from query_cache import ensure_data_versions, init_cache, cached_view, warm_with
+from cache_store import SqliteCacheStore
+from stock_cube import ensure_stock_cube, stock_cube_slice
+from olap import olap_query, describe_rollups
+from resampling import downsample_rows, DEFAULT_MAX_POINTS, MIN_MAX_POINTS, MAX_MAX_POINTS
+from analytical_charts import analytical_kpis, analytical_chart, ANALYTICAL_CHARTS, ANALYTICAL_CHART_MAX_AGE
+from cache_warming import ensure_request_stats, record_request, start_cache_warming, readiness
+from compression import compress_response
+from static_assets import init_static_assets
+from pagination import page_size, decode_cursor, keyset_condition, paginate
+from streaming import iter_query, ndjson_response, csv_response, STREAM_FORMATS
+from datasets import EXPORTS, HIDDEN_COLUMNS, expiring_products_query
+from live_updates import init_live_updates, tactical_event_stream
+from async_db import gather_query_group
+from db_profiles import DB_PATH, connect, checkpoint
+
 app = Flask(__name__)
+# Static files are served under content-hashed names with immutable caching
+init_static_assets(app)
+
+PRICE_TREND_GRAINS = ('day', 'week', 'month', 'quarter')
 
 # Database helper function - Use absolute path to ensure consistent connections
+# Views only read, so they get the read-only reader profile
 def get_db_connection():
-    # Always use the absolute path to the database
-    db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stock-project.db')
-    conn = sqlite3.connect(db_path)
+    conn = connect(DB_PATH, 'reader')
+    conn.row_factory = sqlite3.Row
+    print(f"Connected to database at: {DB_PATH}")
+    return conn
+
+# Startup schema work and request stats write through the WAL writer profile
+def get_write_connection():
+    conn = connect(DB_PATH, 'writer')
     conn.row_factory = sqlite3.Row
-    print(f"Connected to database at: {db_path}")
+    print(f"Connected to database for writing at: {DB_PATH}")
     return conn
 
+# Create the lookup dictionaries and indexes the dashboard filters rely on
+def init_database():
+    conn = get_write_connection()
+    try:
+        ensure_lookup_indexes(conn)
+        ensure_bitmap_change_log(conn)
+        prune_bitmap_change_log(conn)
+        ensure_recommendation_indexes(conn)
+        ensure_summary_tables(conn)
+        ensure_stock_cube(conn)
+        ensure_data_versions(conn)
+        ensure_request_stats(conn)
+        checkpoint(conn)
+    except sqlite3.Error as e:
+        print(f"Error preparing database lookups: {str(e)}")
+    finally:
+        conn.close()
+
 # Helper function to convert SQLite Row objects to dictionaries
 def dict_factory(cursor, row):
     d = {}
@@ -27,6 +75,28 @@ def dict_factory(cursor, row):
 def rows_to_dict_list(rows):
     return [dict(row) for row in rows] if rows else []
 
+init_database()
+# Cached results are shared by all worker processes through a file next to the database
+init_cache(get_db_connection, SqliteCacheStore(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'result-cache.db')))
+init_live_updates(get_db_connection)
+
+# Count what users request so the most popular filter combinations get warmed on startup
+@app.after_request
+def count_request(response):
+    record_request(request, response)
+    return response
+
+# gzip/brotli for text and JSON bodies (cached views arrive already compressed)
+@app.after_request
+def compress(response):
+    return compress_response(request, response)
+
+# Readiness probe - 503 until the startup cache warm-up has finished
+@app.route('/ready')
+def ready():
+    state = readiness()
+    return jsonify(state), 200 if state['ready'] else 503
+
 # Home page route
 @app.route('/')
 def index():
@@ -34,6 +104,7 @@ def index():
 
 # --- Strategic Dashboard ---
 @app.route('/dashboard/strategic')
+@cached_view(tables=('Products', 'Pricing_History'))
 def dashboard_strategic():
     conn = get_db_connection()
     
@@ -176,34 +247,47 @@ def dashboard_strategic():
 
 # AJAX endpoint for price trend data with filtering
 @app.route('/api/price_trend')
+@cached_view(tables=('Products', 'Pricing_History'))
 def api_price_trend():
     category = request.args.get('category', '')
+    grain = request.args.get('grain', 'day')
+    if grain not in PRICE_TREND_GRAINS:
+        return jsonify({'error': f"grain must be one of {', '.join(PRICE_TREND_GRAINS)}"}), 400
+    try:
+        max_points = int(request.args.get('max_points', DEFAULT_MAX_POINTS))
+    except ValueError:
+        return jsonify({'error': "max_points must be an integer"}), 400
+    if not MIN_MAX_POINTS <= max_points <= MAX_MAX_POINTS:
+        return jsonify({'error': f"max_points must be between {MIN_MAX_POINTS} and {MAX_MAX_POINTS}"}), 400
     
     conn = get_db_connection()
     
-    # Add WHERE clause if category filter is applied
-    where_clause = ""
-    params = []
+    # Bucketed in SQL at the requested grain - month and quarter come from the
+    # price_monthly rollup, day and week from Pricing_History
+    filters = {}
     if category and category != 'All':
-        where_clause = "WHERE p.[Product Category] = ?"
-        params.append(category)
+        filters['category'] = category
     
-    query = f"""
-    SELECT 
-        p.[Product Category] as CategoryName,
-        ph.EffectiveDate,
-        ROUND(AVG(ph.Price), 2) AS AvgPrice
-    FROM Pricing_History ph
-    JOIN Products p ON ph.ProductID = p.[Product ID]
-    {where_clause}
-    GROUP BY p.[Product Category], ph.EffectiveDate
-    ORDER BY p.[Product Category], ph.EffectiveDate
-    """
+    try:
+        trend = olap_query(conn, ['avg_price'], dimensions=['category'], filters=filters, grain=grain)
+    finally:
+        conn.close()
     
-    price_data = conn.execute(query, params).fetchall()
-    conn.close()
+    # Each category's series is cut down to max_points with LTTB so the
+    # payload stays the same size however much history there is
+    series = {}
+    for row in trend['rows']:
+        series.setdefault(row['category'], []).append({
+            'CategoryName': row['category'],
+            'EffectiveDate': row['period'],
+            'AvgPrice': row['avg_price']
+        })
     
-    return jsonify(rows_to_dict_list(price_data))
+    price_data = []
+    for rows in series.values():
+        price_data.extend(downsample_rows(rows, 'EffectiveDate', 'AvgPrice', max_points))
+    
+    return jsonify(price_data)
 
 # AJAX endpoint for volatility data with filtering
 @app.route('/api/price_volatility')
@@ -217,6 +301,7 @@ def api_price_volatility():
 
 # API endpoint for price volatility by category data
 @app.route('/api/price_volatility_data')
+@cached_view(tables=('Products', 'Pricing_History'), warm=('category=all&months=6',))
 def api_price_volatility_data():
     try:
         category = request.args.get('category', 'all')
@@ -347,6 +432,7 @@ def api_category_summary():
 
 # API endpoint for price heatmap data with year filtering
 @app.route('/api/price_heatmap_data')
+@cached_view(tables=('Products', 'Pricing_History'), warm=('category=all&months=6',))
 def api_price_heatmap_data():
     try:
         category = request.args.get('category', 'all')
@@ -469,6 +555,7 @@ def api_price_heatmap_data():
 
 # API endpoint for price growth rate data with year filtering
 @app.route('/api/price_growth_data')
+@cached_view(tables=('Products', 'Pricing_History'), warm=('category=all&months=6',))
 def api_price_growth_data():
     try:
         category = request.args.get('category', 'all')
@@ -824,70 +911,56 @@ def api_price_growth_data_old():
 
 # --- Tactical Dashboard ---
 @app.route('/dashboard/tactical')
-def dashboard_tactical():
-    conn = get_db_connection()
-    
-    # Get total number of products
-    total_products_query = "SELECT COUNT(*) AS TotalProducts FROM Products"
-    total_products = conn.execute(total_products_query).fetchone()['TotalProducts']
-    
-    # Get average stock level per product
-    avg_stock_query = """
-    SELECT AVG(StockQuantity) AS AvgStock 
-    FROM Inventory
-    """
-    avg_stock = round(conn.execute(avg_stock_query).fetchone()['AvgStock'], 1)
-    
-    # Get number of products near expiry (within 30 days)
+async def dashboard_tactical():
+    # The page's queries don't depend on each other, so they run side by side
+    # on the database pool instead of one after another
     expiry_window = 30
-    near_expiry_query = f"""
-    SELECT COUNT(*) AS NearExpiryCount 
-    FROM Inventory 
-    WHERE julianday(ExpirationDate) - julianday('now') <= {expiry_window}
-    AND julianday(ExpirationDate) - julianday('now') >= 0
-    """
-    near_expiry_count = conn.execute(near_expiry_query).fetchone()['NearExpiryCount']
-    
-    # Get average product price
-    avg_price_query = """
-    SELECT AVG(p.Price) AS AvgPrice 
-    FROM Products p
-    """
-    avg_price = round(conn.execute(avg_price_query).fetchone()['AvgPrice'], 2)
-    
-    # Get top category by stock quantity
-    top_category_query = """
-    SELECT 
-        p.[Product Category] as CategoryName,
-        SUM(i.StockQuantity) AS TotalStock
-    FROM Inventory i
-    JOIN Products p ON i.ProductID = p.[Product ID]
-    GROUP BY p.[Product Category]
-    ORDER BY TotalStock DESC
-    LIMIT 1
-    """
     
-    top_category = conn.execute(top_category_query).fetchone()
-    top_category_name = top_category['CategoryName'] if top_category else 'N/A'
-    top_category_stock = top_category['TotalStock'] if top_category else 0
+    # Get number of products near expiry (within 30 days)
+    def near_expiry(conn):
+        return conn.execute(f"""
+        SELECT COUNT(*) AS NearExpiryCount 
+        FROM Inventory 
+        WHERE julianday(ExpirationDate) - julianday('now') <= {expiry_window}
+        AND julianday(ExpirationDate) - julianday('now') >= 0
+        """).fetchone()['NearExpiryCount']
+    
+    # Get stock levels by category for context (the first is the top category)
+    def stock_levels(conn):
+        return rows_to_dict_list(conn.execute("""
+        SELECT 
+            p.[Product Category] as CategoryName,
+            SUM(i.StockQuantity) AS TotalStock
+        FROM Inventory i
+        JOIN Products p ON i.ProductID = p.[Product ID]
+        GROUP BY p.[Product Category]
+        ORDER BY TotalStock DESC
+        """).fetchall())
     
-    # Get stock levels by category for context
-    stock_query = """
-    SELECT 
-        p.[Product Category] as CategoryName,
-        SUM(i.StockQuantity) AS TotalStock
-    FROM Inventory i
-    JOIN Products p ON i.ProductID = p.[Product ID]
-    GROUP BY p.[Product Category]
-    ORDER BY TotalStock DESC
-    """
+    # Get categories for filter
+    def filter_categories(conn):
+        return rows_to_dict_list(conn.execute(
+            "SELECT DISTINCT [Product Category] AS CategoryName FROM Products ORDER BY [Product Category]"
+        ).fetchall())
+    
+    # Product count and averages are single-row lookups in table_stats
+    results = await gather_query_group(get_db_connection, {
+        'stats': table_stats,
+        'near_expiry': near_expiry,
+        'stock_levels': stock_levels,
+        'categories': filter_categories
+    })
+    stats = results['stats']
+    near_expiry_count = results['near_expiry']
+    stock_data = results['stock_levels']
+    categories = results['categories']
     
-    stock_data = rows_to_dict_list(conn.execute(stock_query).fetchall())
+    total_products = stats.get('Products', {}).get('rows', 0)
+    avg_stock = round(stats.get('Inventory', {}).get('StockQuantity', {}).get('avg') or 0, 1)
+    avg_price = round(stats.get('Products', {}).get('Price', {}).get('avg') or 0, 2)
     
-    # Get categories for filter
-    categories = rows_to_dict_list(conn.execute(
-        "SELECT DISTINCT [Product Category] AS CategoryName FROM Products ORDER BY [Product Category]"
-    ).fetchall())
+    top_category_name = stock_data[0]['CategoryName'] if stock_data else 'N/A'
+    top_category_stock = stock_data[0]['TotalStock'] if stock_data else 0
     
     # Calculate max values for progress indicators
     max_stock = 100  # Baseline max average stock
@@ -898,8 +971,6 @@ def dashboard_tactical():
     if avg_price > 800:
         max_price = round(avg_price * 1.25)
     
-    conn.close()
-    
     return render_template('dashboard_tactical.html', 
                           categories=categories,
                           total_products=total_products,
@@ -911,62 +982,61 @@ def dashboard_tactical():
                           max_stock=max_stock,
                           max_price=max_price)
 
+# A page of rows as a JSON list, with the cursor for the next page in the
+# X-Next-Cursor and Link headers (neither is set on the last page)
+def _paged_response(rows, cursor):
+    response = jsonify(rows)
+    if cursor:
+        args = request.args.to_dict()
+        args['after'] = cursor
+        response.headers['X-Next-Cursor'] = cursor
+        response.headers['Link'] = f'<{url_for(request.endpoint, **args)}>; rel="next"'
+    return response
+
+# Server-Sent Events: tactical KPIs, stock, low-stock and expiry counts pushed as they change
+@app.route('/api/tactical/stream')
+def api_tactical_stream():
+    return tactical_event_stream()
+
 # AJAX endpoint for expiring products data
 @app.route('/api/expiring_products')
 def api_expiring_products():
-    expiration_window = request.args.get('expiration_window', '30')
-    category = request.args.get('category', '')
-    
     conn = get_db_connection()
     
-    # Get filter parameters
-    days = request.args.get('days', '30')
-    category = request.args.get('category', 'all')
-    expiry_range = request.args.get('expiryRange', 'all')
-    tag = request.args.get('tag', 'all')
-    
-    # Process days parameter based on expiry range
-    if expiry_range == '7days':
-        days = 7
-    elif expiry_range == '14days':
-        days = 14
-    elif expiry_range == '30days':
-        days = 30
-    else:
-        days = int(days)
-    
-    params = [days]  # Start with basic parameter
-    
-    query = """
-    SELECT 
-        p.[Product Name], 
-        i.StockQuantity,
-        p.[Product Category] as Category,
-        p.Rating,
-        datetime(i.ExpirationDate) as ExpirationDate,
-        julianday(i.ExpirationDate) - julianday('now') as DaysRemaining,
-        p.[Product ID] as ProductID
-    FROM Inventory i
-    JOIN Products p ON i.ProductID = p.[Product ID]
-    WHERE i.ExpirationDate IS NOT NULL
-    AND julianday(i.ExpirationDate) - julianday('now') <= ?
-    """
-    
-    # Apply additional filters
-    if category != 'all':
-        query += " AND p.[Product Category] LIKE ?"
-        params.append(f'%{category}%')
-    
-    if tag != 'all':
-        query += " AND p.Tag LIKE ?"
-        params.append(f'%{tag}%')
+    # Filters (days / expiryRange / category / tag) are read by the shared
+    # dataset query; _ExpiryKey is the raw date the page cursor is made from
+    try:
+        query, params = expiring_products_query(conn, request.args)
+    except ValueError as e:
+        conn.close()
+        return jsonify({'error': str(e)}), 400
     
-    query += " ORDER BY i.ExpirationDate ASC LIMIT 30"
+    # format=ndjson streams the whole list; otherwise pages of `limit` rows
+    # continue from the `after` cursor (next one in the X-Next-Cursor header)
+    if request.args.get('format') == 'ndjson':
+        conn.close()
+        query += " ORDER BY i.ExpirationDate, i.ProductID"
+        return ndjson_response(iter_query(get_db_connection, query, params, exclude=('_ExpiryKey',)),
+                               filename='expiring_products.ndjson')
     
-    expiring_products = rows_to_dict_list(conn.execute(query, params).fetchall())
+    try:
+        limit = page_size(request.args.get('limit'), 30)
+        after = decode_cursor(request.args.get('after'), 2)
+    except ValueError as e:
+        conn.close()
+        return jsonify({'error': str(e)}), 400
+    if after:
+        query += f" AND {keyset_condition(['i.ExpirationDate', 'i.ProductID'])}"
+        params.extend(after)
+    query += " ORDER BY i.ExpirationDate, i.ProductID LIMIT ?"
+    params.append(limit + 1)
+    
+    rows = rows_to_dict_list(conn.execute(query, params).fetchall())
     conn.close()
     
-    return jsonify(expiring_products)
+    expiring_products, cursor = paginate(rows, limit, lambda row: (row['_ExpiryKey'], row['ProductID']),
+                                         hidden=('_ExpiryKey',))
+    return _paged_response(expiring_products, cursor)
 
 # AJAX endpoint for stock levels data
 @app.route('/api/stock_levels')
@@ -1006,8 +1076,9 @@ def api_low_stock():
     
     # Apply filters
     if category != 'all':
-        query += " AND p.[Product Category] LIKE ?"
-        params.append(f'%{category}%')
+        category_sql, category_params = category_filter(conn, category)
+        query += f" AND {category_sql}"
+        params.extend(category_params)
         
     if stock_level == 'critical':
         query += " AND i.StockQuantity < 5"
@@ -1019,74 +1090,84 @@ def api_low_stock():
         query += " AND i.StockQuantity < 30"
         
     if tag != 'all':
-        query += " AND p.Tag LIKE ?"
-        params.append(f'%{tag}%')
+        tag_sql, tag_params = tag_filter(conn, tag)
+        query += f" AND {tag_sql}"
+        params.extend(tag_params)
     
-    query += " ORDER BY i.StockQuantity ASC LIMIT 20"
+    # Same paging and streaming as /api/expiring_products, on (StockQuantity, ProductID)
+    if request.args.get('format') == 'ndjson':
+        conn.close()
+        query += " ORDER BY i.StockQuantity, i.ProductID"
+        return ndjson_response(iter_query(get_db_connection, query, params), filename='low_stock.ndjson')
     
-    data = rows_to_dict_list(conn.execute(query, params).fetchall())
+    try:
+        limit = page_size(request.args.get('limit'), 20)
+        after = decode_cursor(request.args.get('after'), 2)
+    except ValueError as e:
+        conn.close()
+        return jsonify({'error': str(e)}), 400
+    if after:
+        query += f" AND {keyset_condition(['i.StockQuantity', 'i.ProductID'])}"
+        params.extend(after)
+    query += " ORDER BY i.StockQuantity, i.ProductID LIMIT ?"
+    params.append(limit + 1)
+    
+    rows = rows_to_dict_list(conn.execute(query, params).fetchall())
     conn.close()
-    return jsonify(data)
+    
+    data, cursor = paginate(rows, limit, lambda row: (row['StockQuantity'], row['ProductID']))
+    return _paged_response(data, cursor)
 
 # API endpoint for Stock Availability Matrix (Heatmap)
 @app.route('/api/stock_availability_matrix')
 def api_stock_availability_matrix():
-    conn = get_db_connection()
-    
-    # Get stock availability by category and region
-    query = """
-    SELECT 
-        p.[Product Category] as CategoryName,
-        p.Region,
-        SUM(i.StockQuantity) AS TotalStock,
-        COUNT(DISTINCT p.[Product ID]) AS ProductCount,
-        ROUND(SUM(i.StockQuantity) * 100.0 / 
-            (SELECT SUM(StockQuantity) FROM Inventory 
-             WHERE ProductID IN (SELECT [Product ID] FROM Products 
-                               WHERE [Product Category] = p.[Product Category])), 2) AS StockPercentage
-    FROM Inventory i
-    JOIN Products p ON i.ProductID = p.[Product ID]
-    GROUP BY p.[Product Category], p.Region
-    ORDER BY p.[Product Category], p.Region
-    """
+    # Served from the stock cube; group_by (category,region,expiry) and the
+    # category / region / expiry_from / expiry_to filters drill into it
+    group_by = tuple(dimension.strip() for dimension in
+                     request.args.get('group_by', 'category,region').split(',') if dimension.strip())
     
     try:
-        matrix_data = rows_to_dict_list(conn.execute(query).fetchall())
-    except sqlite3.OperationalError as e:
-        # If Region column doesn't exist, use an alternative query
-        alternative_query = """
-        SELECT 
-            p.[Product Category] as CategoryName,
-            'All' as Region,
-            SUM(i.StockQuantity) AS TotalStock,
-            COUNT(DISTINCT p.[Product ID]) AS ProductCount,
-            ROUND(SUM(i.StockQuantity) * 100.0 / 
-                (SELECT SUM(StockQuantity) FROM Inventory), 2) AS StockPercentage
-        FROM Inventory i
-        JOIN Products p ON i.ProductID = p.[Product ID]
-        GROUP BY p.[Product Category]
-        ORDER BY p.[Product Category]
-        """
-        matrix_data = rows_to_dict_list(conn.execute(alternative_query).fetchall())
-    
-    conn.close()
+        conn = get_db_connection()
+        cube = stock_cube_slice(
+            conn,
+            group_by=group_by,
+            category=request.args.get('category'),
+            region=request.args.get('region'),
+            expiry_from=request.args.get('expiry_from'),
+            expiry_to=request.args.get('expiry_to')
+        )
+        conn.close()
+    except ValueError as e:
+        return jsonify({'error': str(e), 'categories': [], 'regions': [], 'data': []}), 400
+    except Exception as e:
+        print(f"Error reading stock cube: {str(e)}")
+        return jsonify({'error': str(e), 'categories': [], 'regions': [], 'data': []})
     
     # Format data for the matrix chart
-    categories = list(set([item['CategoryName'] for item in matrix_data]))
-    regions = list(set([item['Region'] for item in matrix_data]))
+    categories = sorted({cell['CategoryName'] for cell in cube['cells'] if 'CategoryName' in cell})
+    regions = sorted({cell['Region'] for cell in cube['cells'] if 'Region' in cell})
     
+    # With real regions each cell is its share of the category's stock; with
+    # the single 'All' region that would always be 100%, so use the overall share
+    share = 'CategoryPct' if len(regions) > 1 else 'TotalPct'
     formatted_data = []
-    for item in matrix_data:
+    for cell in cube['cells']:
         formatted_data.append({
-            'category': item['CategoryName'],
-            'region': item['Region'],
-            'value': item['StockPercentage'] if item['StockPercentage'] is not None else 0
+            'category': cell.get('CategoryName'),
+            'region': cell.get('Region'),
+            'expiry': cell.get('ExpiryMonth'),
+            'stock': cell['TotalStock'],
+            'items': cell['ItemCount'],
+            'value': cell[share] if cell[share] is not None else 0
         })
     
     return jsonify({
         'categories': categories,
         'regions': regions,
-        'data': formatted_data
+        'data': formatted_data,
+        'category_totals': cube['category_totals'],
+        'region_totals': cube['region_totals'],
+        'grand_total': cube['grand_total']
     })
 
 # API endpoint for Expiring Products Over Time (Area Chart)
@@ -1270,8 +1351,9 @@ def api_restock_recommendations():
     
     # Apply filters
     if category != 'all':
-        query += " AND p.[Product Category] LIKE ?"
-        params.append(f'%{category}%')
+        category_sql, category_params = category_filter(conn, category)
+        query += f" AND {category_sql}"
+        params.extend(category_params)
         
     if stock_level == 'critical':
         query += " AND i.StockQuantity < 5"
@@ -1281,8 +1363,9 @@ def api_restock_recommendations():
         query += " AND i.StockQuantity < 20"
         
     if tag != 'all':
-        query += " AND p.Tag LIKE ?"
-        params.append(f'%{tag}%')
+        tag_sql, tag_params = tag_filter(conn, tag)
+        query += f" AND {tag_sql}"
+        params.extend(tag_params)
     
     query += " ORDER BY i.StockQuantity ASC LIMIT 20"
     
@@ -1305,12 +1388,15 @@ def api_restock_recommendations():
             WHERE i.StockQuantity < 20
             """
             
+            fallback_params = []
             if category != 'all':
-                fallback_query += " AND p.[Product Category] LIKE ?"
+                category_sql, category_params = category_filter(conn, category)
+                fallback_query += f" AND {category_sql}"
+                fallback_params.extend(category_params)
                 
             fallback_query += " ORDER BY i.StockQuantity ASC LIMIT 20"
             
-            restock_data = rows_to_dict_list(conn.execute(fallback_query, params).fetchall())
+            restock_data = rows_to_dict_list(conn.execute(fallback_query, fallback_params).fetchall())
     except Exception as e:
         print(f"Error in restock recommendations query: {e}")
         # Most basic fallback with minimal columns
@@ -1413,712 +1499,223 @@ def api_stock_utilization_ratio():
 
 @app.route('/dashboard/analytical')
 @app.route('/dashboard_analytical')
-def dashboard_analytical():
+@warm_with()
+async def dashboard_analytical():
+    # Only the shell, KPI cards and filter options are rendered here; every
+    # chart loads its own data from /api/analytical/<chart> after the page is up
     try:
-        import random
-        import json
-        
-        # Helper function to generate trend data for tag usage over time
-        def generate_trend_data(base_value):
-            """Generate realistic trend data for the past 6 months based on a base value."""
-            # Create a moderately realistic trend with some randomness
-            trend = []
-            value = max(1, base_value * 0.7)  # Start at 70% of current value
-            for i in range(6):
-                # Add some random variation (±20%)
-                variation = random.uniform(-0.2, 0.2)
-                # Trend generally increases toward current value
-                growth = (i / 5) * 0.3 + variation
-                value = max(1, value * (1 + growth))
-                trend.append(int(value))
-            # Ensure the last value is close to the base_value
-            trend[-1] = base_value
-            return trend
-    
-        import json
+        results = await gather_query_group(get_db_connection, {
+            'kpis': analytical_kpis,
+            'dictionaries': get_dictionaries
+        })
+        kpis = results['kpis']
+        _, tag_ids = results['dictionaries']
         
-        # Get database connection
+        tags = [{'TagName': name} for name in sorted(tag_ids)]
+        return render_template(
+            'dashboard_analytical.html',
+            tags=tags,
+            **kpis
+        )
+    except Exception as e:
+        print(f"Error in dashboard_analytical: {str(e)}")
+        return render_template('error.html', error=str(e)), 500
+
+# API endpoint serving one analytical dashboard chart
+@app.route('/api/analytical/<chart>')
+@warm_with(arguments=[{'chart': chart} for chart in ANALYTICAL_CHARTS])
+def api_analytical_chart(chart):
+    if chart not in ANALYTICAL_CHARTS:
+        return jsonify({'error': f"Unknown chart '{chart}'", 'charts': sorted(ANALYTICAL_CHARTS)}), 404
+    
+    try:
         conn = get_db_connection()
-        
-        # Top-rated products by tag
-        try:
-            tag_ratings_query = """
-            SELECT 
-                t.TagName,
-                p.[Product Name] as ProductName,
-                AVG(r.Rating) AS AvgRating,
-                COUNT(r.Rating) AS RatingCount
-            FROM Product_Tags pt
-            JOIN Tags t ON pt.TagID = t.TagID
-            JOIN Products p ON pt.ProductID = p.[Product ID]
-            JOIN Product_Ratings r ON pt.ProductID = r.ProductID
-            GROUP BY t.TagName, p.[Product Name]
-            HAVING RatingCount >= 1
-            ORDER BY AvgRating DESC
-            LIMIT 100
-            """
-            
-            tag_ratings_results = conn.execute(tag_ratings_query).fetchall()
-            if tag_ratings_results:
-                tag_ratings = rows_to_dict_list(tag_ratings_results)
-                print(f"Successfully fetched {len(tag_ratings)} tag ratings from database")
-            else:
-                # If no results, try a more lenient query
-                lenient_query = """
-                SELECT 
-                    t.TagName,
-                    p.[Product Name] as ProductName,
-                    COALESCE(AVG(r.Rating), 3.0) AS AvgRating,
-                    COALESCE(COUNT(r.Rating), 0) AS RatingCount
-                FROM Product_Tags pt
-                JOIN Tags t ON pt.TagID = t.TagID
-                JOIN Products p ON pt.ProductID = p.[Product ID]
-                LEFT JOIN Product_Ratings r ON pt.ProductID = r.ProductID
-                GROUP BY t.TagName, p.[Product Name]
-                ORDER BY AvgRating DESC
-                LIMIT 100
-                """
-                tag_ratings = rows_to_dict_list(conn.execute(lenient_query).fetchall())
-                print(f"Using lenient query: fetched {len(tag_ratings)} tag ratings")
-        except Exception as e:
-            print(f"Error fetching tag ratings: {str(e)}")
-            tag_ratings = []
-        
-        # Popular tags (for word cloud)
-        try:
-            popular_tags_query = """
-            SELECT 
-                t.TagName,
-                COUNT(pt.ProductID) AS TagUsage
-            FROM Product_Tags pt
-            JOIN Tags t ON pt.TagID = t.TagID
-            GROUP BY t.TagName
-            ORDER BY TagUsage DESC
-            LIMIT 50
-            """
-            
-            popular_tags_results = conn.execute(popular_tags_query).fetchall()
-            if popular_tags_results:
-                popular_tags = rows_to_dict_list(popular_tags_results)
-                print(f"Successfully fetched {len(popular_tags)} popular tags from database")
-            else:
-                # If no results, try a simpler query
-                simple_query = """
-                SELECT 
-                    TagName,
-                    1 AS TagUsage
-                FROM Tags
-                ORDER BY TagName
-                LIMIT 50
-                """
-                popular_tags = rows_to_dict_list(conn.execute(simple_query).fetchall())
-                print(f"Using simple query: fetched {len(popular_tags)} tags")
-        except Exception as e:
-            print(f"Error fetching popular tags: {str(e)}")
-            popular_tags = []
-        
-        # Rating distribution by tag
-        try:
-            rating_distribution_query = """
-            SELECT 
-                t.TagName,
-                r.Rating,
-                COUNT(*) AS CountPerRating
-            FROM Product_Tags pt
-            JOIN Tags t ON pt.TagID = t.TagID
-            JOIN Product_Ratings r ON pt.ProductID = r.ProductID
-            GROUP BY t.TagName, r.Rating
-            ORDER BY t.TagName, r.Rating
-            """
-            
-            rating_distribution_results = conn.execute(rating_distribution_query).fetchall()
-            if rating_distribution_results:
-                rating_distribution = rows_to_dict_list(rating_distribution_results)
-                print(f"Successfully fetched {len(rating_distribution)} rating distribution records from database")
-            else:
-                # Try a more lenient query with LEFT JOIN
-                lenient_query = """
-                SELECT 
-                    t.TagName,
-                    COALESCE(r.Rating, 3) as Rating,
-                    COUNT(pt.ProductID) AS CountPerRating
-                FROM Product_Tags pt
-                JOIN Tags t ON pt.TagID = t.TagID
-                LEFT JOIN Product_Ratings r ON pt.ProductID = r.ProductID
-                GROUP BY t.TagName, r.Rating
-                ORDER BY t.TagName, r.Rating
-                """
-                rating_distribution = rows_to_dict_list(conn.execute(lenient_query).fetchall())
-                print(f"Using lenient query: fetched {len(rating_distribution)} rating distribution records")
-        except Exception as e:
-            print(f"Error fetching rating distribution: {str(e)}")
-            rating_distribution = []
-        
-        # Get tags for filter
-        try:
-            tags_result = conn.execute(
-                "SELECT DISTINCT TagName FROM Tags ORDER BY TagName"
-            ).fetchall()
-            
-            if tags_result:
-                tags = rows_to_dict_list(tags_result)
-                print(f"Successfully fetched {len(tags)} tags for filter from database")
-            else:
-                # Use product tags as a fallback
-                tags_query = """
-                SELECT DISTINCT t.TagName 
-                FROM Product_Tags pt
-                JOIN Tags t ON pt.TagID = t.TagID
-                ORDER BY t.TagName
-                """
-                tags = rows_to_dict_list(conn.execute(tags_query).fetchall())
-                print(f"Using fallback query: fetched {len(tags)} product tags")
-        except Exception as e:
-            print(f"Error fetching tags: {str(e)}")
-            tags = []
-        
-        # Get total products
-        try:
-            total_products_query = "SELECT COUNT(*) as count FROM Products"
-            total_products_result = conn.execute(total_products_query).fetchone()
-            if total_products_result:
-                total_products = total_products_result['count']
-                print(f"Successfully fetched total products count: {total_products}")
-            else:
-                # Count manually
-                product_ids_query = "SELECT DISTINCT [Product ID] FROM Products"
-                product_ids = conn.execute(product_ids_query).fetchall()
-                total_products = len(product_ids) if product_ids else 0
-                print(f"Using manual count: found {total_products} products")  
-        except Exception as e:
-            print(f"Error fetching total products: {str(e)}")
-            total_products = 0
-        
-        # Get total tags
-        try:
-            total_tags_query = "SELECT COUNT(*) as count FROM Tags"
-            total_tags_result = conn.execute(total_tags_query).fetchone()
-            if total_tags_result:
-                total_tags = total_tags_result['count']
-                print(f"Successfully fetched total tags count: {total_tags}")
-            else:
-                # Count manually
-                tag_ids_query = "SELECT DISTINCT TagID FROM Tags"
-                tag_ids = conn.execute(tag_ids_query).fetchall()
-                total_tags = len(tag_ids) if tag_ids else 0
-                print(f"Using manual count: found {total_tags} tags")  
-        except Exception as e:
-            print(f"Error fetching total tags: {str(e)}")
-            total_tags = 0
-        
-        # Calculate average rating across all products
-        try:
-            avg_rating_query = "SELECT AVG(Rating) as avg_rating FROM Product_Ratings"
-            avg_rating_result = conn.execute(avg_rating_query).fetchone()
-            if avg_rating_result and avg_rating_result['avg_rating'] is not None:
-                avg_rating = round(float(avg_rating_result['avg_rating']), 1)
-                print(f"Successfully fetched average product rating: {avg_rating}")
-            else:
-                # Calculate manually
-                ratings_query = "SELECT Rating FROM Product_Ratings"
-                ratings = rows_to_dict_list(conn.execute(ratings_query).fetchall())
-                if ratings:
-                    avg_rating = round(sum(r['Rating'] for r in ratings) / len(ratings), 1)
-                else:
-                    avg_rating = 3.5  # Fallback
-                print(f"Using manual calculation: average rating {avg_rating}")  
-        except Exception as e:
-            print(f"Error fetching average rating: {str(e)}")
-            avg_rating = 3.5
-        
-        # Get lowest rated tag
-        try:
-            lowest_rated_tag_query = """
-            SELECT 
-                t.TagName,
-                AVG(r.Rating) AS AvgRating
-            FROM Product_Tags pt
-            JOIN Tags t ON pt.TagID = t.TagID
-            JOIN Product_Ratings r ON pt.ProductID = r.ProductID
-            GROUP BY t.TagName
-            HAVING COUNT(r.Rating) > 0
-            ORDER BY AvgRating ASC
-            LIMIT 1
-            """
-            lowest_rated_tag_result = conn.execute(lowest_rated_tag_query).fetchone()
-            if lowest_rated_tag_result:
-                lowest_rated_tag = dict(lowest_rated_tag_result)
-                print(f"Successfully fetched lowest rated tag: {lowest_rated_tag['TagName']} with rating {lowest_rated_tag['AvgRating']}")
-            else:
-                # Try more lenient query
-                lenient_query = """
-                SELECT 
-                    t.TagName,
-                    COALESCE(AVG(r.Rating), 2.5) AS AvgRating
-                FROM Product_Tags pt
-                JOIN Tags t ON pt.TagID = t.TagID
-                LEFT JOIN Product_Ratings r ON pt.ProductID = r.ProductID
-                GROUP BY t.TagName
-                ORDER BY AvgRating ASC
-                LIMIT 1
-                """
-                result = conn.execute(lenient_query).fetchone()
-                lowest_rated_tag = dict(result) if result else {'TagName': 'Value', 'AvgRating': 2.5}
-                print(f"Using lenient query: lowest rated tag {lowest_rated_tag['TagName']}")
-        except Exception as e:
-            print(f"Error fetching lowest rated tag: {str(e)}")
-            lowest_rated_tag = {'TagName': 'Value', 'AvgRating': 2.5}
-        
-        # Get most tagged product count
-        try:
-            most_tags_query = """
-            SELECT 
-                p.[Product Name] as ProductName,
-                COUNT(pt.TagID) as TagCount
-            FROM Products p
-            JOIN Product_Tags pt ON p.[Product ID] = pt.ProductID
-            GROUP BY p.[Product ID], p.[Product Name]
-            ORDER BY TagCount DESC
-            LIMIT 1
-            """
-            most_tags_result = conn.execute(most_tags_query).fetchone()
-            if most_tags_result:
-                most_tags_count = most_tags_result['TagCount']
-                print(f"Successfully fetched product with most tags: {most_tags_count} tags")
-            else:
-                # Try direct count
-                count_query = """
-                SELECT COUNT(*) as max_count
-                FROM (SELECT ProductID, COUNT(*) as tag_count 
-                      FROM Product_Tags 
-                      GROUP BY ProductID 
-                      ORDER BY tag_count DESC LIMIT 1)
-                """
-                result = conn.execute(count_query).fetchone()
-                most_tags_count = result['max_count'] if result and 'max_count' in result else 5
-                print(f"Using direct count: most tagged product has {most_tags_count} tags")
-        except Exception as e:
-            print(f"Error fetching product with most tags: {str(e)}")
-            most_tags_count = 5
-        
-        # Calculate rating distribution counts for pie chart
-        try:
-            rating_count_query = """
-            SELECT 
-                Rating,
-                COUNT(*) as Count
-            FROM Product_Ratings
-            GROUP BY Rating
-            ORDER BY Rating DESC
-            """
-            rating_counts = conn.execute(rating_count_query).fetchall()
-            
-            # Initialize with zeros for 5 star ratings (5,4,3,2,1)
-            rating_dist = [0, 0, 0, 0, 0]
-            
-            # Fill in the data we have
-            if rating_counts and len(rating_counts) > 0:
-                print(f"Successfully fetched {len(rating_counts)} rating distribution records")
-                for row in rating_counts:
-                    if 1 <= row['Rating'] <= 5:
-                        # Arrays are 0-indexed, so Rating 5 goes to index 0, Rating 4 to index 1, etc.
-                        rating_dist[5 - row['Rating']] = row['Count']
-            else:
-                # Try an alternative query
-                alt_query = """
-                SELECT 
-                    COALESCE(Rating, 3) as Rating,
-                    COUNT(*) as Count
-                FROM Product_Ratings
-                GROUP BY Rating
-                UNION ALL
-                SELECT 
-                    3 as Rating,
-                    1 as Count
-                WHERE NOT EXISTS (SELECT 1 FROM Product_Ratings)
-                ORDER BY Rating DESC
-                """
-                alt_counts = conn.execute(alt_query).fetchall()
-                if alt_counts and len(alt_counts) > 0:
-                    for row in alt_counts:
-                        if 1 <= row['Rating'] <= 5:
-                            rating_dist[5 - row['Rating']] = row['Count']
-                    print(f"Using alternative query: fetched {len(alt_counts)} rating records")
-                else:
-                    # Check if we have any ratings at all - if not, use reasonable sample data
-                    count = conn.execute("SELECT COUNT(*) as count FROM Product_Ratings").fetchone()
-                    if not count or count['count'] == 0:
-                        # If there are truly no ratings in the database, use reasonable sample data
-                        rating_dist = [3, 7, 12, 6, 2]  # Reasonable sample: 5★:3, 4★:7, 3★:12, 2★:6, 1★:2
-                        print("No ratings found in database, using reasonable sample data")
-        except Exception as e:
-            print(f"Error calculating rating distribution: {str(e)}")
-            # Use a somewhat reasonable distribution as a last resort
-            rating_dist = [3, 7, 12, 6, 2]
-        
-        # Process rating distribution for visualization
-        rating_data = {}
-        try:
-            for row in rating_distribution:
-                tag = row['TagName']
-                rating = row['Rating']
-                count = row['CountPerRating']
-                if tag not in rating_data:
-                    rating_data[tag] = {1:0, 2:0, 3:0, 4:0, 5:0}
-                rating_data[tag][rating] = count
-        except Exception as e:
-            print(f"Error processing rating distribution: {str(e)}")
-            # Get rating distribution data by aspect from the database
-            try:
-                # Get common tags that could represent aspects (Quality, Price, etc)
-                aspect_tags_query = """
-                SELECT DISTINCT t.TagName
-                FROM Tags t
-                JOIN Product_Tags pt ON t.TagID = pt.TagID
-                WHERE t.TagName IN ('Quality', 'Price', 'Value', 'Design', 'Performance', 'Material')
-                GROUP BY t.TagName
-                ORDER BY COUNT(pt.ProductID) DESC
-                LIMIT 5
-                """
-                aspect_tags = rows_to_dict_list(conn.execute(aspect_tags_query).fetchall())
-                
-                rating_data = {}
-                
-                if aspect_tags:
-                    print(f"Found {len(aspect_tags)} aspect tags in database")
-                    for tag in aspect_tags:
-                        aspect = tag['TagName']
-                        # Get ratings distribution for this aspect
-                        aspect_query = """
-                        SELECT 
-                            r.Rating,
-                            COUNT(*) as Count
-                        FROM Product_Tags pt
-                        JOIN Tags t ON pt.TagID = t.TagID
-                        JOIN Product_Ratings r ON pt.ProductID = r.ProductID
-                        WHERE t.TagName = ?
-                        GROUP BY r.Rating
-                        ORDER BY r.Rating
-                        """
-                        aspect_ratings = rows_to_dict_list(conn.execute(aspect_query, (aspect,)).fetchall())
-                        
-                        # Transform to required format {1:count, 2:count, ...}
-                        rating_dict = {1:0, 2:0, 3:0, 4:0, 5:0}
-                        for row in aspect_ratings:
-                            if 1 <= row['Rating'] <= 5:
-                                rating_dict[row['Rating']] = row['Count']
-                        
-                        rating_data[aspect] = rating_dict
-                else:
-                    # If no aspect tags found, try getting any tags with sufficient ratings
-                    print("No predefined aspect tags found, using top-rated tags instead")
-                    top_tags_query = """
-                    SELECT 
-                        t.TagName,
-                        COUNT(r.Rating) as RatingCount
-                    FROM Product_Tags pt
-                    JOIN Tags t ON pt.TagID = t.TagID
-                    JOIN Product_Ratings r ON pt.ProductID = r.ProductID
-                    GROUP BY t.TagName
-                    HAVING RatingCount > 0
-                    ORDER BY RatingCount DESC
-                    LIMIT 3
-                    """
-                    top_tags = rows_to_dict_list(conn.execute(top_tags_query).fetchall())
-                    
-                    for tag in top_tags:
-                        aspect = tag['TagName']
-                        # Get ratings distribution for this tag
-                        aspect_query = """
-                        SELECT 
-                            r.Rating,
-                            COUNT(*) as Count
-                        FROM Product_Tags pt
-                        JOIN Tags t ON pt.TagID = t.TagID
-                        JOIN Product_Ratings r ON pt.ProductID = r.ProductID
-                        WHERE t.TagName = ?
-                        GROUP BY r.Rating
-                        ORDER BY r.Rating
-                        """
-                        aspect_ratings = rows_to_dict_list(conn.execute(aspect_query, (aspect,)).fetchall())
-                        
-                        # Transform to required format {1:count, 2:count, ...}
-                        rating_dict = {1:0, 2:0, 3:0, 4:0, 5:0}
-                        for row in aspect_ratings:
-                            if 1 <= row['Rating'] <= 5:
-                                rating_dict[row['Rating']] = row['Count']
-                        
-                        rating_data[aspect] = rating_dict
-                
-                # If still no data, use fallback
-                if not rating_data:
-                    print("No rating aspect data found in database, using fallback data")
-                    rating_data = {
-                        "Quality": {1:2, 2:4, 3:8, 4:12, 5:6},
-                        "Value": {1:1, 2:3, 3:9, 4:8, 5:4}
-                    }
-            except Exception as e:
-                print(f"Error fetching aspect ratings: {str(e)}")
-                # Fallback data
-                rating_data = {
-                    "Quality": {1:2, 2:4, 3:8, 4:12, 5:6},
-                    "Value": {1:1, 2:3, 3:9, 4:8, 5:4}
-                }
-        
-        # Calculate recommendation strength based on real database data
-        # Higher is better (scale 0-100)
-        # Based on: data completeness, rating distribution, and tag coverage
-        try:
-            # Get total ratings
-            total_ratings_query = "SELECT COUNT(*) as count FROM Product_Ratings"
-            total_ratings_result = conn.execute(total_ratings_query).fetchone()
-            total_ratings = total_ratings_result['count'] if total_ratings_result else 0
-            
-            # Get product-tag coverage percentage
-            coverage_query = """
-            SELECT 
-                (CAST(COUNT(DISTINCT pt.ProductID) AS FLOAT) / 
-                CAST((SELECT COUNT(*) FROM Products) AS FLOAT) * 100) as coverage_pct
-            FROM Product_Tags pt
-            """
-            coverage_result = conn.execute(coverage_query).fetchone()
-            coverage_pct = coverage_result['coverage_pct'] if coverage_result and coverage_result['coverage_pct'] else 0
-            
-            # Calculate recommendation strength based on actual metrics
-            # Factors: total products, total ratings, rating diversity, tag coverage, tag total
-            rec_strength = min(100, 
-                          ((total_products or 1) / 20) +                       # Product count factor
-                          ((total_ratings or 1) / 40) +                        # Rating volume factor
-                          ((sum(rating_dist) > 0) * 15) +                      # Has ratings bonus
-                          ((len([x for x in rating_dist if x > 0]) or 1) * 5) + # Rating diversity factor
-                          (coverage_pct / 2) +                                 # Tag coverage factor
-                          ((total_tags or 1) / 10))                            # Tag richness factor
-            
-            print(f"Calculated recommendation strength from actual metrics: {rec_strength:.1f}")
-        except Exception as e:
-            print(f"Error calculating recommendation strength: {str(e)}")
-            # Fallback formula if database queries failed
-            rec_strength = min(100, ((total_products or 1) / 10) + 
-                          ((sum(rating_dist) or 1) / 10) + 
-                          ((total_tags or 1) / 5))       # Close the database connection
+        payload = analytical_chart(conn, chart)
         conn.close()
         
-        # Prepare data for charts
-        tag_names = [row['TagName'] for row in popular_tags] if popular_tags else ['Tag1', 'Tag2', 'Tag3', 'Tag4', 'Tag5']
-        tag_usage = [row['TagUsage'] for row in popular_tags] if popular_tags else [25, 20, 15, 12, 10]
-        
-        # Generate tag activity time series data for line chart (past 6 months trend)
-        # Each tag will have an array of 6 values representing activity over the past 6 months
-        tag_activity = []
-        for i, usage in enumerate(tag_usage[:5]):  # Limit to top 5 tags for readability
-            # Generate trend data based on current usage count
-            trend = generate_trend_data(usage)
-            tag_activity.append(trend)
-            
-        # If we have no data, use sample data
-        if not tag_activity or len(tag_activity) == 0:
-            print("No tag activity data found, using sample data")
-            tag_activity = [
-                [12, 15, 18, 22, 25, 30],  # First tag trend
-                [8, 10, 12, 15, 18, 20],   # Second tag trend
-                [20, 18, 16, 14, 15, 17],  # Third tag trend
-                [5, 8, 10, 12, 15, 18],    # Fourth tag trend
-                [15, 13, 12, 10, 8, 10]    # Fifth tag trend
-            ]
-        
-        # Generate data for tag ratings chart
-        tag_ratings_data = []
-        for tag in tag_names[:10]:  # Limit to top 10 tags
-            avg_tag_rating = 0
-            for item in tag_ratings:
-                if item['TagName'] == tag:
-                    avg_tag_rating = item.get('AvgRating', 0)
-                    break
-            tag_ratings_data.append(avg_tag_rating)
-        
-        # Render the template with all the data
-        # Convert rec_strength from 0-100 scale to 0-1 scale for the gauge
-        recommendation_strength = min(1.0, max(0.0, rec_strength / 100.0))
-        print(f"Recommendation strength value passed to template: {recommendation_strength:.2f}")
-        
-        # Make sure we're passing data correctly and handling empty lists
-        try:
-            # SIMPLIFIED APPROACH: Query directly for the chart data
-            print("Preparing chart data...")
-            
-            try:
-                # Direct query for tag ratings chart - simpler and more reliable
-                avg_rating_by_tag_query = """
-                SELECT 
-                    t.TagName,
-                    ROUND(AVG(r.Rating), 2) AS AvgRating,
-                    COUNT(r.Rating) AS RatingCount
-                FROM Tags t
-                JOIN Product_Tags pt ON t.TagID = pt.TagID
-                JOIN Product_Ratings r ON pt.ProductID = r.ProductID
-                GROUP BY t.TagName
-                HAVING COUNT(r.Rating) > 0
-                ORDER BY AvgRating DESC
-                LIMIT 15
-                """
-                
-                direct_tag_ratings = rows_to_dict_list(conn.execute(avg_rating_by_tag_query).fetchall())
-                print(f"Direct query returned {len(direct_tag_ratings)} tag ratings")
-                
-                if direct_tag_ratings:
-                    tag_names = [item['TagName'] for item in direct_tag_ratings]
-                    tag_ratings_data = [float(item['AvgRating']) for item in direct_tag_ratings]
-                    print(f"Tag names: {tag_names[:5]}... (total: {len(tag_names)})")
-                    print(f"Tag ratings: {tag_ratings_data[:5]}... (total: {len(tag_ratings_data)})")
-                else:
-                    # Fallback if no data
-                    print("No direct tag ratings data, trying alternative query")
-                    alt_query = """
-                    SELECT 
-                        t.TagName,
-                        COALESCE(ROUND(AVG(r.Rating), 2), 3.0) AS AvgRating,
-                        COUNT(r.Rating) AS RatingCount
-                    FROM Tags t
-                    LEFT JOIN Product_Tags pt ON t.TagID = pt.TagID
-                    LEFT JOIN Product_Ratings r ON pt.ProductID = r.ProductID
-                    GROUP BY t.TagName
-                    ORDER BY COUNT(pt.ProductID) DESC
-                    LIMIT 10
-                    """
-                    
-                    alt_tag_ratings = rows_to_dict_list(conn.execute(alt_query).fetchall())
-                    tag_names = [item['TagName'] for item in alt_tag_ratings]
-                    tag_ratings_data = [float(item['AvgRating']) for item in alt_tag_ratings]
-                    print(f"Alternative query returned {len(alt_tag_ratings)} results")
-            except Exception as e:
-                print(f"Error getting chart data via SQL: {str(e)}")
-                # If all SQL approaches fail, fall back to the aggregated method
-                tag_avg_ratings = {}
-                for item in tag_ratings:
-                    tag_name = item['TagName']
-                    if tag_name not in tag_avg_ratings:
-                        tag_avg_ratings[tag_name] = {'sum': 0, 'count': 0}
-                    tag_avg_ratings[tag_name]['sum'] += item['AvgRating']
-                    tag_avg_ratings[tag_name]['count'] += 1
-                
-                # Calculate average rating per tag
-                tag_names = []
-                tag_ratings_data = []
-                for tag_name, data in tag_avg_ratings.items():
-                    avg = data['sum'] / data['count'] if data['count'] > 0 else 0
-                    tag_names.append(tag_name)
-                    tag_ratings_data.append(round(avg, 2))
-                
-                # Limit to top 10 tags by rating for chart readability
-                if tag_names and tag_ratings_data:
-                    # Create pairs and sort by rating (descending)
-                    pairs = sorted(zip(tag_names, tag_ratings_data), key=lambda x: x[1], reverse=True)
-                    # Unzip the sorted pairs
-                    tag_names, tag_ratings_data = zip(*pairs[:10]) if pairs else ([], [])
-                    tag_names = list(tag_names)
-                    tag_ratings_data = list(tag_ratings_data)
-            
-            # In case we have no data even after all attempts
-            if not tag_names or len(tag_names) == 0:
-                print("WARNING: No tag names available after all attempts. Using sample data.")
-                tag_names = ["Electronics", "Clothing", "Home", "Sports", "Books"]
-                tag_ratings_data = [4.7, 4.3, 4.1, 3.9, 4.5]
-            
-            # Prepare JSON for template - ensure they're valid JSON
-            tag_names_json = json.dumps(tag_names)
-            tag_ratings_data_json = json.dumps(tag_ratings_data)
-            tag_activity_json = json.dumps(tag_activity if tag_activity else [])
-            rating_dist_json = json.dumps(rating_dist if rating_dist else [0, 0, 0, 0, 0])
-            
-            # Convert complex dictionary to a simpler format for JavaScript
-            rating_data_simplified = {}
-            for aspect, ratings in rating_data.items():
-                rating_data_simplified[aspect] = list(ratings.values())
-            rating_data_json = json.dumps(rating_data_simplified)
-            
-            print("JSON data prepared successfully")
-        except Exception as e:
-            print(f"Error preparing JSON data: {str(e)}")
-            # Provide fallback JSON data
-            tag_names_json = json.dumps(["Tag1", "Tag2", "Tag3", "Tag4", "Tag5"])
-            tag_ratings_data_json = json.dumps([4.2, 3.8, 4.0, 3.5, 4.7])
-            tag_activity_json = json.dumps([85, 72, 65, 59, 52])
-            rating_dist_json = json.dumps([10, 15, 8, 5, 2])
-            rating_data_json = json.dumps({"Quality": [2, 4, 8, 12, 6], "Value": [1, 3, 9, 8, 4]})
+        response = jsonify(payload)
+        # Charts only move when ratings or tags change, so let the browser
+        # reuse them briefly and revalidate with the ETag after that
+        response.cache_control.public = True
+        response.cache_control.max_age = ANALYTICAL_CHART_MAX_AGE
+        response.add_etag()
+        return response.make_conditional(request)
+    except Exception as e:
+        print(f"Error building analytical chart {chart}: {str(e)}")
+        return jsonify({'error': str(e), 'chart': chart}), 500
+
+# Streamed CSV / NDJSON export of a dashboard dataset, taking the same filters as its chart
+@app.route('/api/export/<dataset>')
+def api_export(dataset):
+    build_query = EXPORTS.get(dataset)
+    if build_query is None:
+        return jsonify({'error': f"Unknown dataset '{dataset}'", 'datasets': sorted(EXPORTS)}), 404
+    export_format = request.args.get('format', 'csv')
+    if export_format not in STREAM_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(STREAM_FORMATS)}"}), 400
+    
+    conn = get_db_connection()
+    try:
+        query, params = build_query(conn, request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        conn.close()
+    
+    # Rows go out as they're read from a connection of the response's own
+    filename = f"{dataset}.{export_format}"
+    if export_format == 'ndjson':
+        return ndjson_response(iter_query(get_db_connection, query, params, exclude=HIDDEN_COLUMNS),
+                               filename=filename)
+    return csv_response(get_db_connection, query, params, exclude=HIDDEN_COLUMNS, filename=filename)
+
+# Resolve a comma separated list of tag names to TagIDs (unknown names map to -1)
+def _tag_ids_from_param(conn, value):
+    if not value:
+        return []
+    _, tags = get_dictionaries(conn)
+    tags_lower = {name.lower(): tag_id for name, tag_id in tags.items() if name}
+    return [tags_lower.get(name.strip().lower(), -1) for name in value.split(',') if name.strip()]
+
+# API endpoint for multi-tag product filtering over the bitmap index
+@app.route('/api/tag_filter')
+def api_tag_filter():
+    try:
+        limit = int(request.args.get('limit', '100'))
+        category = request.args.get('category', 'all')
+        conn = get_db_connection()
+        tag_index = get_tag_index(conn)
         
-        # For category data, we'll use a separate endpoint to avoid template issues
-        # The chart will load this data via AJAX after the page loads
-        try:
-            # We'll still pass empty arrays for initial page load
-            # The actual data will be fetched from /api/category-chart-data via AJAX
-            category_names = []  
-            category_ratings = []
-        except Exception as e:
-            print(f"Error preparing category data: {str(e)}")
-            category_names = []
-            category_ratings = []
+        all_tags = _tag_ids_from_param(conn, request.args.get('all', ''))
+        any_tags = [tag_id for tag_id in _tag_ids_from_param(conn, request.args.get('any', '')) if tag_id != -1]
+        not_tags = [tag_id for tag_id in _tag_ids_from_param(conn, request.args.get('exclude', '')) if tag_id != -1]
+        category_ids = resolve_category_ids(conn, category) if category != 'all' else None
+        conn.close()
         
-        # Debug print to verify the data being passed to the template
-        print(f"DEBUG - Category names: {category_names}")
-        print(f"DEBUG - Category ratings: {category_ratings}")
-        print(f"DEBUG - Category JSON: {json.dumps(category_names)}")
+        matches = tag_index.filter(all_tags=all_tags, any_tags=any_tags, not_tags=not_tags,
+                                   category_ids=category_ids)
+        return jsonify({
+            'count': len(matches),
+            'product_ids': tag_index.product_ids(matches, limit=limit)
+        })
+    except Exception as e:
+        print(f"Error filtering products by tag: {str(e)}")
+        return jsonify({'error': str(e), 'count': 0, 'product_ids': []})
+
+# API endpoint for tags that co-occur with a given tag
+@app.route('/api/tag_cooccurrence')
+def api_tag_cooccurrence():
+    try:
+        tag = request.args.get('tag', '')
+        limit = int(request.args.get('limit', '20'))
+        conn = get_db_connection()
+        tag_index = get_tag_index(conn)
+        _, tags = get_dictionaries(conn)
+        tag_ids = _tag_ids_from_param(conn, tag)
+        conn.close()
         
-        # Get top rated products for the Deep Dive Analysis section
+        tag_names = {tag_id: name for name, tag_id in tags.items()}
+        counts = tag_index.co_occurrence(tag_ids[0]) if tag_ids else {}
+        ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return jsonify({
+            'tag': tag,
+            'product_count': len(tag_index.filter(all_tags=tag_ids[:1])) if tag_ids else 0,
+            'data': [{'TagName': tag_names.get(tag_id), 'Count': count} for tag_id, count in ranked]
+        })
+    except Exception as e:
+        print(f"Error computing tag co-occurrence: {str(e)}")
+        return jsonify({'error': str(e), 'tag': '', 'product_count': 0, 'data': []})
+
+# API endpoint for item-to-item recommendations
+# source=precomputed reads Product_Neighbours (see build_product_neighbours.py),
+# source=lsh uses the MinHash LSH index, auto prefers precomputed when available
+@app.route('/api/recommendations')
+def api_recommendations():
+    product_id = request.args.get('product_id', '')
+    source = request.args.get('source', 'auto')
+    if not product_id:
+        return jsonify({'error': 'product_id is required', 'product_id': '', 'recommendations': []}), 400
+    
+    try:
+        limit = int(request.args.get('limit', '10'))
+        conn = get_db_connection()
+        recommendations = []
+        used_source = 'lsh'
+        if source in ('auto', 'precomputed'):
+            recommendations = precomputed_neighbours(conn, product_id, limit=limit)
+            used_source = 'precomputed'
+        if not recommendations and source in ('auto', 'lsh'):
+            recommendations = recommend(conn, product_id, limit=limit)
+            used_source = 'lsh'
+        conn.close()
+        return jsonify({
+            'product_id': product_id,
+            'source': used_source,
+            'recommendations': recommendations
+        })
+    except Exception as e:
+        print(f"Error computing recommendations: {str(e)}")
+        return jsonify({'error': str(e), 'product_id': product_id, 'recommendations': []})
+
+# API endpoint for tag activity trends from the tag_activity_rollup
+@app.route('/api/tag_activity')
+def api_tag_activity():
+    grain = request.args.get('grain', 'month')
+    if grain not in ACTIVITY_GRAINS:
+        return jsonify({'error': f"grain must be one of {', '.join(ACTIVITY_GRAINS)}", 'buckets': [], 'series': []}), 400
+    try:
+        periods = int(request.args.get('periods', '6'))
+        top_n = int(request.args.get('top', '5'))
+    except ValueError:
+        return jsonify({'error': "periods and top must be integers", 'buckets': [], 'series': []}), 400
+    if not 1 <= periods <= MAX_ACTIVITY_PERIODS:
+        return jsonify({'error': f"periods must be between 1 and {MAX_ACTIVITY_PERIODS}", 'buckets': [], 'series': []}), 400
+    
+    try:
+        conn = get_db_connection()
+        activity = tag_activity(conn, grain=grain, periods=periods, top_n=top_n)
+        conn.close()
+        return jsonify(activity)
+    except Exception as e:
+        print(f"Error fetching tag activity: {str(e)}")
+        return jsonify({'error': str(e), 'buckets': [], 'series': []})
+
+# Declarative aggregation API - measures, dimensions, grain and filters are all
+# query parameters; any other parameter filters on the dimension it names
+_OLAP_PARAMETERS = ('measures', 'dimensions', 'grain', 'start', 'end', 'limit')
+
+@app.route('/api/olap')
+def api_olap():
+    measures = [name for name in request.args.get('measures', '').split(',') if name]
+    dimensions = [name for name in request.args.get('dimensions', '').split(',') if name]
+    filters = {name: [value for value in request.args.get(name).split(',') if value]
+               for name in request.args if name not in _OLAP_PARAMETERS}
+    
+    try:
+        conn = get_db_connection()
         try:
-            top_products_query = """
-            SELECT 
-                p.[Product Name] as ProductName,
-                ROUND(AVG(CAST(r.Rating AS FLOAT)), 1) AS Rating,
-                COUNT(r.Rating) AS ReviewCount,
-                GROUP_CONCAT(DISTINCT t.TagName) AS Tags
-            FROM Products p
-            JOIN Product_Ratings r ON p.[Product ID] = r.ProductID
-            LEFT JOIN Product_Tags pt ON p.[Product ID] = pt.ProductID
-            LEFT JOIN Tags t ON pt.TagID = t.TagID
-            GROUP BY p.[Product Name]
-            HAVING COUNT(r.Rating) >= 3
-            ORDER BY Rating DESC, ReviewCount DESC
-            LIMIT 10
-            """
-            
-            top_products_result = conn.execute(top_products_query).fetchall()
-            top_products = rows_to_dict_list(top_products_result)
-            print(f"Successfully fetched {len(top_products)} top rated products")
-        except Exception as e:
-            print(f"Error fetching top products: {str(e)}")
-            # Provide sample data as fallback
-            top_products = [
-                {"ProductName": "Premium Wireless Headphones", "Rating": 4.8, "ReviewCount": 42, "Tags": "Electronics,Audio,Wireless"},
-                {"ProductName": "Ergonomic Office Chair", "Rating": 4.7, "ReviewCount": 35, "Tags": "Furniture,Office"},
-                {"ProductName": "Smart Watch Series 5", "Rating": 4.6, "ReviewCount": 28, "Tags": "Electronics,Wearable"},
-                {"ProductName": "Ultra HD Monitor", "Rating": 4.5, "ReviewCount": 31, "Tags": "Electronics,Computer"},
-                {"ProductName": "Wireless Charging Pad", "Rating": 4.4, "ReviewCount": 24, "Tags": "Electronics,Accessories"}
-            ]
-        
-        # Make sure we're using proper JSON encoding with the right attribute name
-        return render_template(
-            'dashboard_analytical.html',
-            tag_ratings=tag_ratings,
-            popular_tags=popular_tags,
-            tag_names=tag_names_json,
-            tag_ratings_data=tag_ratings_data_json,
-            tag_activity=tag_activity_json,
-            rating_distribution=rating_dist_json,
-            rating_data=rating_data_json,
-            category_names=json.dumps(category_names),
-            category_ratings=json.dumps(category_ratings),
-            tags=tags,
-            total_products=total_products,
-            total_tags=total_tags,
-            avg_rating=avg_rating,
-            lowest_rated_tag=lowest_rated_tag,
-            most_tags_count=most_tags_count,
-            recommendation_strength=recommendation_strength,
-            top_products=top_products
-        )
+            result = olap_query(
+                conn,
+                measures,
+                dimensions=dimensions,
+                filters=filters,
+                grain=request.args.get('grain') or None,
+                start=request.args.get('start'),
+                end=request.args.get('end'),
+                limit=request.args.get('limit', type=int)
+            )
+        finally:
+            conn.close()
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({'error': str(e), 'rollups': describe_rollups(), 'rows': []}), 400
     except Exception as e:
-        print(f"Error in dashboard_analytical: {str(e)}")
-        return render_template('error.html', error=str(e)), 500
+        print(f"Error running OLAP query: {str(e)}")
+        return jsonify({'error': str(e), 'rows': []})
+
+@app.route('/api/olap/rollups')
+def api_olap_rollups():
+    return jsonify({'rollups': describe_rollups()})
 
 # API endpoint for category chart data
 @app.route('/api/category-chart-data')
@@ -2131,14 +1728,14 @@ def api_category_chart_data():
         category_query = """
         SELECT 
             COALESCE(p.[Product Category], 'Uncategorized') AS Category,
-            ROUND(AVG(CAST(r.Rating AS FLOAT)), 2) AS AvgRating,
-            COUNT(DISTINCT r.ProductID) AS ProductCount
-        FROM Products p
-        LEFT JOIN Product_Ratings r ON p.[Product ID] = r.ProductID
+            ROUND(SUM(s.RatingSum) * 1.0 / SUM(s.RatingCount), 2) AS AvgRating,
+            COUNT(s.ProductID) AS ProductCount
+        FROM product_rating_stats s
+        JOIN Products p ON p.[Product ID] = s.ProductID
         WHERE p.[Product Category] IS NOT NULL AND p.[Product Category] != ''
         GROUP BY p.[Product Category]
-        HAVING COUNT(r.ProductID) > 0
-        ORDER BY AVG(r.Rating) DESC
+        HAVING SUM(s.RatingCount) > 0
+        ORDER BY AvgRating DESC
         LIMIT 10
         """
         
@@ -2177,5 +1774,7 @@ def api_category_chart_data():
             'product_counts': []
         }), 500
 
+start_cache_warming(app, get_write_connection)
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -4,6 +4,7 @@ import os
 import json
 from datetime import datetime, timedelta
 import decimal
+from db_profiles import connect
 
 app = Flask(__name__)
 
@@ -13,7 +14,7 @@ def get_db_connection():
     db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stock-project.db')
     app.config['DATABASE'] = db_path
     print(f"Database path: {db_path}")
-    conn = sqlite3.connect(db_path)
+    conn = connect(db_path)
     conn.row_factory = sqlite3.Row
     return conn
 
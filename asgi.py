@@ -0,0 +1,78 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgiInstance
+
+from app import app
+from live_updates import asgi_tactical_stream
+
+# ASGI entry point: uvicorn asgi:application
+#
+# The Flask app runs behind an asgiref WSGI adapter on a bounded pool of
+# REQUEST_THREADS threads, rather than asgiref's default of one shared thread
+# for every request. Views that wait on the database (async ones via
+# async_db) don't hold the event loop, and the tactical event stream is
+# served natively on the loop, so an open dashboard costs no thread at all.
+# One worker process can then keep many slow clients connected.
+
+REQUEST_THREADS = 32
+
+_request_executor = ThreadPoolExecutor(max_workers=REQUEST_THREADS, thread_name_prefix='request')
+
+# Routes served directly on the event loop
+ASGI_ROUTES = {
+    '/api/tactical/stream': asgi_tactical_stream
+}
+
+
+class _PooledWsgiInstance(WsgiToAsgiInstance):
+    async def run_wsgi_app(self, body):
+        await sync_to_async(self._run_wsgi_app, thread_sensitive=False, executor=_request_executor)(body)
+
+    def _run_wsgi_app(self, body):
+        # Runs on a pool thread, so start_response and sending happen together there
+        environ = self.build_environ(self.scope, body)
+        output = self.wsgi_application(environ, self.start_response)
+        try:
+            sent = 0
+            for chunk in output:
+                if not self.response_started:
+                    self.response_started = True
+                    self.sync_send(self.response_start)
+                # Never send more than a Content-Length the app declared
+                if self.response_content_length is not None:
+                    chunk = chunk[:self.response_content_length - sent]
+                self.sync_send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                sent += len(chunk)
+                if sent == self.response_content_length:
+                    break
+        finally:
+            # Lets streamed responses close their cursors and connections
+            if hasattr(output, 'close'):
+                output.close()
+        if not self.response_started:
+            self.response_started = True
+            self.sync_send(self.response_start)
+        self.sync_send({'type': 'http.response.body'})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await asyncio.get_running_loop().run_in_executor(None, _request_executor.shutdown)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+
+    handler = ASGI_ROUTES.get(scope.get('path'))
+    if handler is not None and scope.get('method') == 'GET':
+        return await handler(scope, receive, send)
+    await _PooledWsgiInstance(app)(scope, receive, send)
@@ -0,0 +1,59 @@
+import asyncio
+import functools
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Database work for views, off the event loop and side by side.
+#
+# sqlite3 calls block, so async views hand them to a bounded pool of threads.
+# While they run the loop is free for other requests. DB_WORKERS caps how
+# many statements run at once however many clients are waiting.
+#
+# A query group is a set of named, independent read queries from one view.
+# Each runs on its own pool thread against that thread's pooled read
+# connection, so the view waits for roughly its slowest query instead of the
+# sum of them (readers don't block each other in SQLite).
+
+DB_WORKERS = 8
+
+_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix='db')
+
+# Pool threads' open connections: {connect function: connection}
+_local = threading.local()
+
+
+async def run_db(fn, *args, **kwargs):
+    """fn(*args, **kwargs) on the database pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+def _pooled_connection(connect):
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(connect)
+    if conn is None:
+        conn = connections[connect] = connect()
+    return conn
+
+
+def _run_pooled(connect, query):
+    conn = _pooled_connection(connect)
+    try:
+        return query(conn)
+    except sqlite3.Error:
+        # Don't hand a connection in an unknown state to the next query
+        _local.connections.pop(connect, None)
+        conn.close()
+        raise
+
+
+async def gather_query_group(connect, queries):
+    """{name: query(conn)} for a dict of independent read queries, run in parallel.
+
+    connect opens a read connection; each pool thread keeps its own one open.
+    """
+    results = await asyncio.gather(*(run_db(_run_pooled, connect, query) for query in queries.values()))
+    return dict(zip(queries, results))
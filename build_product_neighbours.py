@@ -0,0 +1,182 @@
+import argparse
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy import sparse
+
+from db_profiles import DB_PATH, connect, checkpoint
+
+# Batch job: precompute the top-N tag neighbours of every product.
+#
+# Product_Tags is turned into a CSR product x tag matrix weighted by TF-IDF
+# (rare tags count for more than tags every product has), rows are L2
+# normalised so a sparse matrix product gives cosine similarity, and the
+# similarity is computed in row blocks spread over a process pool. Results go
+# to Product_Neighbours, which the app reads directly.
+#
+# Usage: python build_product_neighbours.py [--top-n 20] [--block-size 1024] [--workers 4]
+
+# Set in each worker by _init_worker so the matrix is shipped once per process
+_matrix = None
+_matrix_t = None
+
+
+NEIGHBOURS_COLUMNS = """
+    ProductID TEXT NOT NULL,
+    Rank INTEGER NOT NULL,
+    NeighbourID TEXT NOT NULL,
+    Score REAL NOT NULL,
+    PRIMARY KEY (ProductID, Rank)
+"""
+
+
+def ensure_neighbours_table(conn):
+    conn.execute(f"CREATE TABLE IF NOT EXISTS Product_Neighbours ({NEIGHBOURS_COLUMNS}) WITHOUT ROWID")
+    conn.commit()
+
+
+def build_tfidf_matrix(conn):
+    """CSR matrix (products x tags) with L2 normalised TF-IDF rows, plus the product ids."""
+    product_ids = []
+    product_index = {}
+    tag_index = {}
+    rows = []
+    cols = []
+
+    for product_id, tag_id in conn.execute("SELECT ProductID, TagID FROM Product_Tags ORDER BY ProductID"):
+        if product_id not in product_index:
+            product_index[product_id] = len(product_ids)
+            product_ids.append(product_id)
+        if tag_id not in tag_index:
+            tag_index[tag_id] = len(tag_index)
+        rows.append(product_index[product_id])
+        cols.append(tag_index[tag_id])
+
+    n_products, n_tags = len(product_ids), len(tag_index)
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+
+    # Tag presence is binary, so TF is 1 and the weight is the smoothed IDF
+    document_frequency = np.bincount(cols, minlength=n_tags)
+    idf = np.log((1.0 + n_products) / (1.0 + document_frequency)) + 1.0
+    matrix = sparse.csr_matrix((idf[cols], (rows, cols)), shape=(n_products, n_tags), dtype=np.float32)
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    matrix = sparse.diags(1.0 / norms).dot(matrix).tocsr().astype(np.float32)
+    return matrix, product_ids
+
+
+def _init_worker(data, indices, indptr, shape):
+    global _matrix, _matrix_t
+    _matrix = sparse.csr_matrix((data, indices, indptr), shape=shape)
+    _matrix_t = _matrix.T.tocsc()
+
+
+def _top_neighbours_block(args):
+    """Top-N cosine neighbours for rows [start, end) as (row, neighbour, score) arrays."""
+    start, end, top_n = args
+    similarities = (_matrix[start:end] @ _matrix_t).tocsr()
+    out_rows, out_cols, out_scores = [], [], []
+
+    for offset in range(end - start):
+        row_start, row_end = similarities.indptr[offset], similarities.indptr[offset + 1]
+        cols = similarities.indices[row_start:row_end]
+        scores = similarities.data[row_start:row_end]
+        # A product is not its own neighbour
+        keep = (cols != start + offset) & (scores > 0)
+        cols, scores = cols[keep], scores[keep]
+        if not len(cols):
+            continue
+        if len(cols) > top_n:
+            best = np.argpartition(-scores, top_n - 1)[:top_n]
+            cols, scores = cols[best], scores[best]
+        # Highest score first, ties broken by ordinal for stable output
+        order = np.lexsort((cols, -scores))
+        out_rows.append(np.full(len(order), start + offset, dtype=np.int64))
+        out_cols.append(cols[order])
+        out_scores.append(scores[order])
+
+    if not out_rows:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=np.float32)
+    return np.concatenate(out_rows), np.concatenate(out_cols), np.concatenate(out_scores)
+
+
+def compute_neighbours(matrix, top_n=20, block_size=1024, workers=None):
+    """Yield (row, neighbour, score) arrays block by block, computed across a process pool."""
+    blocks = [(start, min(start + block_size, matrix.shape[0]), top_n)
+              for start in range(0, matrix.shape[0], block_size)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(matrix.data, matrix.indices, matrix.indptr, matrix.shape)) as pool:
+        for result in pool.map(_top_neighbours_block, blocks):
+            yield result
+
+
+def store_neighbours(conn, product_ids, blocks):
+    """Replace Product_Neighbours in one transaction so readers never see a partial table.
+
+    Blocks are written to a staging table as the pool produces them, each in a
+    transaction of its own, so other writers aren't locked out for the whole
+    computation - only for the final copy into Product_Neighbours.
+    """
+    ensure_neighbours_table(conn)
+    conn.execute("DROP TABLE IF EXISTS Product_Neighbours_Staging")
+    conn.execute(f"CREATE TABLE Product_Neighbours_Staging ({NEIGHBOURS_COLUMNS}) WITHOUT ROWID")
+    conn.commit()
+
+    total = 0
+    for rows, cols, scores in blocks:
+        batch = []
+        rank = 0
+        previous = None
+        for row, col, score in zip(rows.tolist(), cols.tolist(), scores.tolist()):
+            rank = rank + 1 if row == previous else 1
+            previous = row
+            batch.append((product_ids[row], rank, product_ids[col], round(score, 6)))
+        with conn:
+            conn.executemany(
+                "INSERT INTO Product_Neighbours_Staging (ProductID, Rank, NeighbourID, Score) VALUES (?, ?, ?, ?)",
+                batch
+            )
+        total += len(batch)
+
+    with conn:
+        conn.execute("DELETE FROM Product_Neighbours")
+        conn.execute("INSERT INTO Product_Neighbours SELECT * FROM Product_Neighbours_Staging")
+    conn.execute("DROP TABLE Product_Neighbours_Staging")
+    conn.commit()
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute top-N tag neighbours for every product")
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--top-n', type=int, default=20)
+    parser.add_argument('--block-size', type=int, default=1024)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    started = time.time()
+    conn = connect(args.db, 'writer')
+    matrix, product_ids = build_tfidf_matrix(conn)
+    print(f"Built {matrix.shape[0]} x {matrix.shape[1]} TF-IDF matrix with {matrix.nnz} entries")
+
+    if matrix.shape[0] == 0:
+        print("No tagged products, nothing to do")
+        conn.close()
+        return
+
+    blocks = compute_neighbours(matrix, top_n=args.top_n, block_size=args.block_size, workers=args.workers)
+    total = store_neighbours(conn, product_ids, blocks)
+    # Every neighbour went through the WAL twice, staged and then copied
+    checkpoint(conn)
+    conn.close()
+    print(f"Stored {total} neighbours for {len(product_ids)} products in {time.time() - started:.1f}s "
+          f"({math.ceil(matrix.shape[0] / args.block_size)} blocks)")
+
+
+if __name__ == '__main__':
+    main()
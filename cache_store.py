@@ -0,0 +1,206 @@
+import json
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Where query_cache keeps its entries.
+#
+# MemoryCacheStore is private to the process. SqliteCacheStore keeps entries
+# in a file every worker process opens, so a payload computed by one worker
+# is served by all of them. Writes are single statements, atomic under
+# SQLite's own locking. Triggers keep the file's total entry size in
+# cache_totals, and once that passes max_bytes the least recently used
+# entries are dropped. An entry whose data version no longer matches is
+# refreshed just like an in-memory one.
+#
+# An entry is {'version': tuple, 'value': ..., 'stored_at': epoch seconds,
+# 'retry_at': epoch seconds}.
+
+# Default size limit for the shared cache file
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Seconds between LastUsed updates for an entry, so reads rarely write
+TOUCH_INTERVAL = 60
+
+# Decoded values each process keeps from the shared file
+MEMO_LIMIT = 512
+
+# Entries MemoryCacheStore holds before dropping the least recently used
+MEMORY_MAX_ENTRIES = 1024
+
+
+class MemoryCacheStore:
+    """Cache entries for this process only, at most max_entries of them."""
+
+    def __init__(self, max_entries=MEMORY_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # Least recently used first
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return dict(entry)
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = dict(entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def set_retry(self, key, retry_at):
+        with self._lock:
+            if key in self._entries:
+                self._entries[key]['retry_at'] = retry_at
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SqliteCacheStore:
+    """Cache entries shared by every process opening `path`."""
+
+    def __init__(self, path, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        # key -> (stored_at, value): saves unpickling a payload this process has already seen
+        self._memo = {}
+        self._memo_lock = threading.Lock()
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+        CREATE TABLE IF NOT EXISTS cache_entries (
+            Key TEXT PRIMARY KEY,
+            Version TEXT NOT NULL,
+            Value BLOB NOT NULL,
+            Size INTEGER NOT NULL,
+            StoredAt REAL NOT NULL,
+            RetryAt REAL NOT NULL DEFAULT 0,
+            LastUsed REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_cache_entries_last_used ON cache_entries(LastUsed);
+        """)
+        # Totals and triggers in one transaction so no entry is missed or counted twice
+        conn.executescript("""
+        BEGIN IMMEDIATE;
+        CREATE TABLE IF NOT EXISTS cache_totals (
+            Id INTEGER PRIMARY KEY CHECK (Id = 0),
+            Bytes INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO cache_totals (Id, Bytes) SELECT 0, COALESCE(SUM(Size), 0) FROM cache_entries;
+
+        CREATE TRIGGER IF NOT EXISTS trg_cache_totals_insert
+        AFTER INSERT ON cache_entries
+        BEGIN
+            UPDATE cache_totals SET Bytes = Bytes + NEW.Size WHERE Id = 0;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_cache_totals_update
+        AFTER UPDATE OF Size ON cache_entries
+        BEGIN
+            UPDATE cache_totals SET Bytes = Bytes + NEW.Size - OLD.Size WHERE Id = 0;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_cache_totals_delete
+        AFTER DELETE ON cache_entries
+        BEGIN
+            UPDATE cache_totals SET Bytes = Bytes - OLD.Size WHERE Id = 0;
+        END;
+        COMMIT;
+        """)
+
+    def _conn(self):
+        # One connection per thread; autocommit, so every statement is its own transaction
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT Version, StoredAt, RetryAt, LastUsed FROM cache_entries WHERE Key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        version, stored_at, retry_at, last_used = row
+
+        with self._memo_lock:
+            memo = self._memo.get(key)
+        if memo is not None and memo[0] == stored_at:
+            value = memo[1]
+        else:
+            blob = conn.execute(
+                "SELECT Value FROM cache_entries WHERE Key = ? AND StoredAt = ?", (key, stored_at)
+            ).fetchone()
+            if blob is None:
+                # Replaced by another process in between
+                return self.get(key)
+            value = pickle.loads(blob[0])
+            self._remember(key, stored_at, value)
+
+        now = time.time()
+        if now - last_used > TOUCH_INTERVAL:
+            conn.execute("UPDATE cache_entries SET LastUsed = ? WHERE Key = ?", (now, key))
+        return {'version': tuple(json.loads(version)), 'value': value,
+                'stored_at': stored_at, 'retry_at': retry_at}
+
+    def put(self, key, entry):
+        blob = pickle.dumps(entry['value'], protocol=pickle.HIGHEST_PROTOCOL)
+        conn = self._conn()
+        # An upsert rather than INSERT OR REPLACE, whose implicit delete skips the triggers
+        conn.execute("""
+        INSERT INTO cache_entries (Key, Version, Value, Size, StoredAt, RetryAt, LastUsed)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(Key) DO UPDATE SET
+            Version = excluded.Version,
+            Value = excluded.Value,
+            Size = excluded.Size,
+            StoredAt = excluded.StoredAt,
+            RetryAt = excluded.RetryAt,
+            LastUsed = excluded.LastUsed
+        """, (key, json.dumps(list(entry['version'])), blob, len(blob) + len(key),
+              entry['stored_at'], entry['retry_at'], entry['stored_at']))
+        self._remember(key, entry['stored_at'], entry['value'])
+        self._evict(conn)
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT Bytes FROM cache_totals WHERE Id = 0").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Keep the most recently used entries that fit in max_bytes
+        conn.execute("""
+        DELETE FROM cache_entries WHERE Key IN (
+            SELECT Key FROM (
+                SELECT Key, SUM(Size) OVER (ORDER BY LastUsed DESC, Key) AS Running
+                FROM cache_entries
+            )
+            WHERE Running > ?
+        )
+        """, (self.max_bytes,))
+
+    def _remember(self, key, stored_at, value):
+        with self._memo_lock:
+            if len(self._memo) >= MEMO_LIMIT and key not in self._memo:
+                self._memo.clear()
+            self._memo[key] = (stored_at, value)
+
+    def set_retry(self, key, retry_at):
+        self._conn().execute("UPDATE cache_entries SET RetryAt = ? WHERE Key = ?", (retry_at, key))
+
+    def clear(self):
+        self._conn().execute("DELETE FROM cache_entries")
+        with self._memo_lock:
+            self._memo.clear()
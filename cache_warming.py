@@ -0,0 +1,215 @@
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode
+
+from flask import current_app
+from werkzeug.exceptions import HTTPException
+
+# Startup warm-up of the dashboard caches.
+#
+# After a deploy every cache is cold, so the first visitors pay for every
+# aggregate. warm_cache replays the requests of every view marked for warming
+# (cached_view and warm_with in query_cache) with their default filters - and,
+# on rules with URL arguments, the argument values the view lists - plus
+# the combinations users asked for most recently, through the app with a few
+# threads, and /ready answers 503 until that's done so the worker isn't put
+# into rotation cold. Views without a server-side cache aren't replayed -
+# that would only delay /ready.
+#
+# Popularity comes from Request_Stats: successful GETs of marked views are
+# counted in memory and written out at most once every REQUEST_STATS_FLUSH
+# seconds.
+
+# Most requested combinations (seen in the last POPULAR_DAYS days) warmed on top of the defaults
+POPULAR_LIMIT = 20
+POPULAR_DAYS = 7
+
+WARM_WORKERS = 4
+REQUEST_STATS_FLUSH = 60
+
+# Header marking warm-up requests, which mustn't count towards popularity
+WARM_HEADER = 'X-Cache-Warm'
+
+_lock = threading.Lock()
+_request_counts = Counter()
+_last_flush = time.time()
+_connect = None
+
+_state = {
+    'status': 'pending',
+    'total': 0,
+    'warmed': 0,
+    'failed': [],
+    'started_at': None,
+    'finished_at': None
+}
+
+
+def ensure_request_stats(conn):
+    conn.executescript("""
+    CREATE TABLE IF NOT EXISTS Request_Stats (
+        Path TEXT NOT NULL,
+        QueryString TEXT NOT NULL DEFAULT '',
+        Hits INTEGER NOT NULL DEFAULT 0,
+        LastSeen TEXT NOT NULL,
+        PRIMARY KEY (Path, QueryString)
+    ) WITHOUT ROWID;
+    """)
+    conn.commit()
+
+
+def record_request(request, response):
+    """Count a successful GET towards the popular combinations."""
+    global _last_flush
+    if request.method != 'GET' or response.status_code != 200:
+        return
+    if not _is_warmable(current_app.view_functions.get(request.endpoint)):
+        return
+    if request.headers.get(WARM_HEADER):
+        return
+
+    with _lock:
+        _request_counts[(request.path, urlencode(sorted(request.args.items(multi=True))))] += 1
+        if _connect is None or time.time() - _last_flush < REQUEST_STATS_FLUSH:
+            return
+        counts = dict(_request_counts)
+        _request_counts.clear()
+        _last_flush = time.time()
+    flush_request_stats(counts)
+
+
+def flush_request_stats(counts):
+    conn = _connect()
+    try:
+        conn.executemany("""
+        INSERT INTO Request_Stats (Path, QueryString, Hits, LastSeen)
+        VALUES (?, ?, ?, datetime('now'))
+        ON CONFLICT(Path, QueryString) DO UPDATE SET
+            Hits = Hits + excluded.Hits,
+            LastSeen = excluded.LastSeen
+        """, [(path, query, hits) for (path, query), hits in counts.items()])
+        conn.execute("DELETE FROM Request_Stats WHERE LastSeen < datetime('now', '-30 days')")
+        conn.commit()
+    except Exception as e:
+        print(f"Error saving request stats: {str(e)}")
+    finally:
+        conn.close()
+
+
+def popular_requests(conn, limit=POPULAR_LIMIT):
+    rows = conn.execute("""
+    SELECT Path, QueryString
+    FROM Request_Stats
+    WHERE LastSeen >= datetime('now', ?)
+    ORDER BY Hits DESC
+    LIMIT ?
+    """, (f'-{POPULAR_DAYS} days', limit)).fetchall()
+    return [f"{path}?{query}" if query else path for path, query in rows]
+
+
+def _is_warmable(view):
+    return getattr(view, 'warm_queries', None) is not None
+
+
+def warm_requests(app):
+    """Default requests of every view marked for warming, from the app's URL map."""
+    urls = []
+    seen = set()
+    adapter = app.url_map.bind('localhost')
+    for rule in app.url_map.iter_rules():
+        view = app.view_functions.get(rule.endpoint)
+        if rule.endpoint in seen or 'GET' not in rule.methods or not _is_warmable(view):
+            continue
+        if rule.arguments:
+            # Only the argument values the view asked for
+            paths = [adapter.build(rule.endpoint, values) for values in getattr(view, 'warm_arguments', ())
+                     if set(values) == rule.arguments]
+        else:
+            paths = [rule.rule]
+        if not paths:
+            continue
+        # One URL per endpoint, not one per alias
+        seen.add(rule.endpoint)
+        urls += [f"{path}?{query}" if query else path for path in paths for query in view.warm_queries]
+    return urls
+
+
+def _replayable(app, url):
+    # Popular URLs are only replayed while they still reach a marked view
+    try:
+        endpoint, _ = app.url_map.bind('localhost').match(url.partition('?')[0], method='GET')
+    except HTTPException:
+        return False
+    return _is_warmable(app.view_functions.get(endpoint))
+
+
+def _normalise(url):
+    # Same argument order as the cache keys, so a popular URL equal to a default is warmed once
+    path, _, query = url.partition('?')
+    params = sorted(parse_qsl(query, keep_blank_values=True))
+    return f"{path}?{urlencode(params)}" if params else path
+
+
+def _warm_one(app, url):
+    client = app.test_client()
+    response = client.get(url, headers={WARM_HEADER: '1'})
+    response.close()
+    if response.status_code != 200:
+        raise RuntimeError(f"HTTP {response.status_code}")
+
+
+def warm_cache(app):
+    """Request every default and popular URL concurrently; returns the readiness state."""
+    urls = warm_requests(app)
+    try:
+        conn = _connect()
+        try:
+            urls += [url for url in popular_requests(conn) if _replayable(app, url)]
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"Error loading popular requests: {str(e)}")
+    urls = list(dict.fromkeys(_normalise(url) for url in urls))
+
+    with _lock:
+        _state.update(status='warming', total=len(urls), warmed=0, failed=[],
+                      started_at=time.time(), finished_at=None)
+
+    def run(url):
+        try:
+            _warm_one(app, url)
+            with _lock:
+                _state['warmed'] += 1
+        except Exception as e:
+            print(f"Error warming {url}: {str(e)}")
+            with _lock:
+                _state['failed'].append(url)
+
+    with ThreadPoolExecutor(max_workers=WARM_WORKERS, thread_name_prefix='cache-warm') as pool:
+        list(pool.map(run, urls))
+
+    with _lock:
+        _state.update(status='ready', finished_at=time.time())
+        print(f"Cache warm-up finished: {_state['warmed']}/{_state['total']} requests "
+              f"in {_state['finished_at'] - _state['started_at']:.1f}s")
+    return readiness()
+
+
+def start_cache_warming(app, connect):
+    """Warm the caches on a background thread so the server can start listening meanwhile."""
+    global _connect
+    _connect = connect
+    thread = threading.Thread(target=warm_cache, args=(app,), name='cache-warm', daemon=True)
+    thread.start()
+    return thread
+
+
+def readiness():
+    with _lock:
+        state = dict(_state, failed=list(_state['failed']))
+    state['ready'] = state['status'] == 'ready'
+    if state['started_at'] is not None:
+        state['seconds'] = round((state['finished_at'] or time.time()) - state['started_at'], 2)
+    return state
@@ -2,6 +2,7 @@ import sqlite3
 import os
 import json
 from datetime import datetime
+from db_profiles import connect
 
 def rows_to_dict_list(rows):
     return [dict(row) for row in rows] if rows else []
@@ -19,7 +20,7 @@ def check_database():
     print(f"Database size: {os.path.getsize(db_path) / (1024*1024):.2f} MB")
     
     # Connect to database
-    conn = sqlite3.connect(db_path)
+    conn = connect(db_path)
     conn.row_factory = sqlite3.Row
     
     # Test all dashboard queries
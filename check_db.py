@@ -1,5 +1,6 @@
 import sqlite3
 import os
+from db_profiles import connect
 
 def check_database_structure(db_path):
     if not os.path.exists(db_path):
@@ -7,7 +8,7 @@ def check_database_structure(db_path):
         return
     
     try:
-        conn = sqlite3.connect(db_path)
+        conn = connect(db_path)
         cursor = conn.cursor()
         
         # Get all tables
@@ -1,6 +1,7 @@
 import sqlite3
 import os
 from datetime import datetime
+from db_profiles import connect
 
 def rows_to_dict_list(rows):
     return [dict(row) for row in rows] if rows else []
@@ -14,7 +15,7 @@ def main():
     print(f"Database size: {os.path.getsize(db_path) / (1024*1024):.2f} MB")
     
     # Connect to database
-    conn = sqlite3.connect(db_path)
+    conn = connect(db_path)
     conn.row_factory = sqlite3.Row
     
     # Test basic database connection with simple query
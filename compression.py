@@ -0,0 +1,94 @@
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    # Optional - without it everything is served with gzip
+    brotli = None
+
+# Response compression with Accept-Encoding negotiation.
+#
+# compress_response runs after every request and compresses textual bodies
+# on the fly. Responses rebuilt from the result cache arrive already encoded:
+# cached_view compresses a payload once, when it's stored, with
+# encoded_variants, so a repeat hit costs neither the query nor the
+# compression.
+
+# Bodies smaller than this aren't worth the CPU or the header bytes
+MIN_COMPRESS_SIZE = 1024
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/javascript', 'image/svg+xml')
+
+# Preferred first; brotli only when the module is installed
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+# Levels for responses compressed per request, and for cached ones compressed once
+FAST_LEVELS = {'br': 5, 'gzip': 6}
+CACHED_LEVELS = {'br': 11, 'gzip': 9}
+
+
+def is_compressible(mimetype):
+    return bool(mimetype) and (mimetype.startswith('text/') or mimetype in COMPRESSIBLE_MIMETYPES)
+
+
+def negotiate_encoding(accept_encoding):
+    """Best encoding from ENCODINGS the client accepts (Accept-Encoding header), or None."""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    best = None
+    for encoding in ENCODINGS:
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (encoding, quality)
+    return best[0] if best else None
+
+
+def compress(body, encoding, levels=FAST_LEVELS):
+    if encoding == 'br':
+        return brotli.compress(body, quality=levels['br'])
+    return gzip.compress(body, compresslevel=levels['gzip'], mtime=0)
+
+
+def encoded_variants(body, mimetype):
+    """{encoding: bytes} for a body about to be cached, empty if it isn't worth compressing."""
+    if not is_compressible(mimetype) or len(body) < MIN_COMPRESS_SIZE:
+        return {}
+    return {encoding: compress(body, encoding, CACHED_LEVELS) for encoding in ENCODINGS}
+
+
+def apply_encoding(response, encoding, body):
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    # Same entity, different bytes - a strong ETag no longer identifies it
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def compress_response(request, response):
+    """after_request hook compressing the body if the client accepts it."""
+    if not is_compressible(response.mimetype):
+        return response
+    response.vary.add('Accept-Encoding')
+
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers):
+        return response
+    body = response.get_data()
+    if len(body) < MIN_COMPRESS_SIZE:
+        return response
+
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+    if encoding is not None:
+        apply_encoding(response, encoding, compress(body, encoding))
+    return response
@@ -0,0 +1,233 @@
+from datetime import datetime, timedelta
+
+from lookups import category_filter, tag_filter
+
+# Row-level queries behind the dashboard datasets.
+#
+# Each builder takes a connection (for resolving filter names to ids) and the
+# request arguments and returns (sql, params) for a query whose rows can be
+# streamed as they are read - /api/export/<dataset> writes them out as CSV or
+# NDJSON without holding the result. Orders follow an index where the
+# dataset can be large, so SQLite doesn't have to sort it first.
+
+
+def _price_window(args, alias='ph'):
+    """Conditions for the strategic dashboard's category / months / year filters."""
+    months = int(args.get('months', '6'))
+    cutoff_date = (datetime.now() - timedelta(days=months * 30)).strftime("%Y-%m-%d")
+    conditions = [f"{alias}.EffectiveDate >= ?"]
+    params = [cutoff_date]
+
+    category = args.get('category', 'all')
+    if category and category != 'all':
+        conditions.append("p.[Product Category] = ?")
+        params.append(category)
+
+    year = args.get('year', 'all')
+    if year and year != 'all':
+        conditions.append(f"strftime('%Y', {alias}.EffectiveDate) = ?")
+        params.append(year)
+    return conditions, params
+
+
+def price_trend_rows(conn, args):
+    """Every price point, per product in date order (millions of rows on a real history)."""
+    conditions, params = [], []
+    category = args.get('category', 'all')
+    if category and category != 'all':
+        conditions.append("p.[Product Category] = ?")
+        params.append(category)
+    if args.get('start'):
+        conditions.append("ph.EffectiveDate >= ?")
+        params.append(args['start'])
+    if args.get('end'):
+        conditions.append("ph.EffectiveDate < date(?, '+1 day')")
+        params.append(args['end'])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    return f"""
+    SELECT
+        p.[Product Category] AS Category,
+        ph.ProductID,
+        p.[Product Name] AS ProductName,
+        ph.EffectiveDate,
+        ph.Price
+    FROM Pricing_History ph
+    JOIN Products p ON p.[Product ID] = ph.ProductID
+    {where}
+    ORDER BY ph.ProductID, ph.EffectiveDate
+    """, params
+
+
+def price_volatility_rows(conn, args):
+    """Per-product price spread behind the volatility chart's category averages."""
+    conditions, params = _price_window(args)
+    return f"""
+    SELECT
+        p.[Product Category] AS Category,
+        ph.ProductID,
+        p.[Product Name] AS ProductName,
+        COUNT(ph.Price) AS PricePoints,
+        ROUND(AVG(ph.Price), 2) AS AvgPrice,
+        ROUND(MIN(ph.Price), 2) AS MinPrice,
+        ROUND(MAX(ph.Price), 2) AS MaxPrice,
+        ROUND(MAX(ph.Price) - MIN(ph.Price), 2) AS PriceRange,
+        ROUND((MAX(ph.Price) - MIN(ph.Price)) / NULLIF(AVG(ph.Price), 0) * 100, 2) AS VolatilityPct
+    FROM Pricing_History ph
+    JOIN Products p ON p.[Product ID] = ph.ProductID
+    WHERE {' AND '.join(conditions)}
+    GROUP BY ph.ProductID
+    HAVING COUNT(ph.Price) >= 2
+    ORDER BY ph.ProductID
+    """, params
+
+
+def price_heatmap_rows(conn, args):
+    """Average price and month-on-month growth per category and month."""
+    conditions, params = _price_window(args)
+    return f"""
+    WITH monthly AS (
+        SELECT
+            p.[Product Category] AS Category,
+            strftime('%Y-%m', ph.EffectiveDate) AS Month,
+            ROUND(AVG(ph.Price), 2) AS AvgPrice
+        FROM Pricing_History ph
+        JOIN Products p ON p.[Product ID] = ph.ProductID
+        WHERE {' AND '.join(conditions)}
+        GROUP BY p.[Product Category], strftime('%Y-%m', ph.EffectiveDate)
+    )
+    SELECT
+        Category,
+        Month,
+        AvgPrice,
+        LAG(AvgPrice) OVER (PARTITION BY Category ORDER BY Month) AS PrevAvgPrice,
+        CASE
+            WHEN LAG(AvgPrice) OVER (PARTITION BY Category ORDER BY Month) > 0
+            THEN ROUND((AvgPrice - LAG(AvgPrice) OVER (PARTITION BY Category ORDER BY Month))
+                       / LAG(AvgPrice) OVER (PARTITION BY Category ORDER BY Month) * 100, 2)
+            ELSE 0
+        END AS GrowthRate
+    FROM monthly
+    ORDER BY Category, Month
+    """, params
+
+
+def stock_matrix_rows(conn, args):
+    """Stock cube cells: stock per category, region and expiry month."""
+    conditions, params = [], []
+    category = args.get('category', 'all')
+    if category and category != 'all':
+        category_sql, category_params = category_filter(conn, category, column='s.CategoryID')
+        conditions.append(category_sql)
+        params.extend(category_params)
+    region = args.get('region', 'all')
+    if region and region != 'all':
+        conditions.append("s.Region = ?")
+        params.append(region)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    return f"""
+    SELECT
+        COALESCE(c.CategoryName, 'Uncategorized') AS Category,
+        s.Region,
+        s.ExpiryMonth,
+        s.TotalStock,
+        s.ItemCount
+    FROM stock_cube s
+    LEFT JOIN Categories c ON c.CategoryID = s.CategoryID
+    {where}
+    ORDER BY s.CategoryID, s.Region, s.ExpiryMonth
+    """, params
+
+
+def expiring_products_query(conn, args):
+    """Stock expiring within the window, unordered - callers add the order and any page bound.
+
+    _ExpiryKey is the raw ExpirationDate, there for page cursors.
+    """
+    # Process days parameter based on expiry range
+    expiry_range = args.get('expiryRange', 'all')
+    if expiry_range == '7days':
+        days = 7
+    elif expiry_range == '14days':
+        days = 14
+    elif expiry_range == '30days':
+        days = 30
+    else:
+        try:
+            days = int(args.get('days', '30'))
+        except ValueError:
+            raise ValueError("days must be an integer")
+
+    # Signed, so a negative window ('-5 days') reaches back into expired stock
+    params = [f'{days:+d} days']
+
+    # Bounded on the raw ExpirationDate so the (ExpirationDate, ProductID)
+    # index serves both the window and the order
+    query = """
+    SELECT
+        p.[Product Name],
+        i.StockQuantity,
+        p.[Product Category] as Category,
+        p.Rating,
+        datetime(i.ExpirationDate) as ExpirationDate,
+        julianday(i.ExpirationDate) - julianday('now') as DaysRemaining,
+        p.[Product ID] as ProductID,
+        i.ExpirationDate as _ExpiryKey
+    FROM Inventory i
+    JOIN Products p ON i.ProductID = p.[Product ID]
+    WHERE i.ExpirationDate IS NOT NULL
+    AND i.ExpirationDate <= datetime('now', ?)
+    """
+
+    # Apply additional filters as indexed id lookups
+    category = args.get('category', 'all')
+    if category != 'all':
+        category_sql, category_params = category_filter(conn, category)
+        query += f" AND {category_sql}"
+        params.extend(category_params)
+
+    tag = args.get('tag', 'all')
+    if tag != 'all':
+        tag_sql, tag_params = tag_filter(conn, tag)
+        query += f" AND {tag_sql}"
+        params.extend(tag_params)
+
+    return query, params
+
+
+def expiring_products_rows(conn, args):
+    query, params = expiring_products_query(conn, args)
+    return query + " ORDER BY i.ExpirationDate, i.ProductID", params
+
+
+def tag_ratings_rows(conn, args):
+    """Usage and rating histogram per tag."""
+    return """
+    SELECT
+        t.TagName,
+        ts.ProductCount AS Products,
+        ts.RatingCount AS Ratings,
+        ROUND(ts.AvgRating, 2) AS AvgRating,
+        ts.Count1 AS Stars1,
+        ts.Count2 AS Stars2,
+        ts.Count3 AS Stars3,
+        ts.Count4 AS Stars4,
+        ts.Count5 AS Stars5
+    FROM tag_stats ts
+    JOIN Tags t ON t.TagID = ts.TagID
+    ORDER BY t.TagName
+    """, []
+
+
+EXPORTS = {
+    'price_trend': price_trend_rows,
+    'price_volatility': price_volatility_rows,
+    'price_heatmap': price_heatmap_rows,
+    'stock_matrix': stock_matrix_rows,
+    'expiring_products': expiring_products_rows,
+    'tag_ratings': tag_ratings_rows
+}
+
+# Columns only there for paging, left out of exports
+HIDDEN_COLUMNS = ('_ExpiryKey',)
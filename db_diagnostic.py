@@ -1,6 +1,7 @@
 import sqlite3
 import os
 import json
+from db_profiles import connect
 
 DB_PATH = r'C:\Users\samuel\Documents\final project\stock-project-main\stock-project.db'
 
@@ -13,7 +14,7 @@ def check_database():
         return
         
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = connect(DB_PATH)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -0,0 +1,72 @@
+import os
+import sqlite3
+from urllib.request import pathname2url
+
+# Connection profiles: every entry point opens the database through connect().
+#
+# Writers put the database in WAL mode, so dashboard readers keep reading
+# their snapshot while ingestion writes, instead of waiting on the rollback
+# journal's lock. Readers open the file read-only with a large page cache and
+# memory-mapped I/O. Writers commit with synchronous=NORMAL, which is still
+# crash safe under WAL. They checkpoint in batches - every WAL_AUTOCHECKPOINT
+# pages, and explicitly through checkpoint() after a bulk job.
+#
+# Writers also turn on recursive_triggers. Without it, the row an INSERT OR
+# REPLACE deletes fires no delete trigger, and every trigger-maintained
+# summary (table_stats, stock_cube, ...) keeps counting it. Anything writing
+# to the database outside connect() must set the same pragma.
+
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stock-project.db')
+
+# Milliseconds a connection waits for a lock before giving up
+BUSY_TIMEOUT = 5000
+
+# WAL pages written before SQLite checkpoints on its own (its default is 1000)
+WAL_AUTOCHECKPOINT = 4000
+
+PROFILES = {
+    'reader': {
+        'read_only': True,
+        'pragmas': (
+            ('query_only', 'ON'),
+            ('cache_size', -32768),  # KiB, per connection
+            ('mmap_size', 268435456),
+            ('temp_store', 'MEMORY'),
+            ('busy_timeout', BUSY_TIMEOUT)
+        )
+    },
+    'writer': {
+        'read_only': False,
+        'pragmas': (
+            ('journal_mode', 'WAL'),  # persistent, so readers get it too
+            ('synchronous', 'NORMAL'),
+            ('recursive_triggers', 'ON'),
+            ('wal_autocheckpoint', WAL_AUTOCHECKPOINT),
+            ('cache_size', -32768),
+            ('temp_store', 'MEMORY'),
+            ('busy_timeout', BUSY_TIMEOUT)
+        )
+    }
+}
+
+
+def connect(path=DB_PATH, profile='reader'):
+    """sqlite3 connection to `path` set up for `profile` ('reader' or 'writer')."""
+    settings = PROFILES[profile]
+    if settings['read_only']:
+        conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(path))}?mode=ro", uri=True)
+    else:
+        conn = sqlite3.connect(path)
+    for name, value in settings['pragmas']:
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+def checkpoint(conn):
+    """Copy the WAL back into the database and truncate it, after a batch of writes."""
+    try:
+        busy, _, _ = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        if busy:
+            print("WAL checkpoint incomplete: readers still active")
+    except sqlite3.Error as e:
+        print(f"Error checkpointing WAL: {str(e)}")
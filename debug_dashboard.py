@@ -2,6 +2,7 @@ from flask import Flask, render_template, jsonify, request
 import sqlite3
 import json
 import sys
+from db_profiles import connect
 
 app = Flask(__name__)
 
@@ -13,7 +14,7 @@ def debug_dashboard():
 
     try:
         # Connect to the database
-        conn = sqlite3.connect(db_path)
+        conn = connect(db_path)
         conn.row_factory = sqlite3.Row
         print("Connection successful", file=sys.stderr)
         
@@ -9,6 +9,7 @@ import sqlite3
 import json
 import os
 import sys
+from db_profiles import connect
 
 app = Flask(__name__)
 app.template_folder = 'templates'
@@ -20,7 +21,7 @@ def get_db_connection():
     """Get a connection to the SQLite database using the absolute path."""
     print(f"Connecting to database at: {DB_PATH}")
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = connect(DB_PATH)
         conn.row_factory = sqlite3.Row
         return conn
     except Exception as e:
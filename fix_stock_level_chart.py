@@ -1,6 +1,7 @@
 import sqlite3
 import json
 import os
+from db_profiles import connect
 
 # Full absolute path to both potential database files
 main_db = os.path.join(os.path.dirname(__file__), 'stock-project.db')
@@ -37,11 +38,11 @@ def check_stock_data():
     # Try main database first
     if os.path.exists(main_db):
         print(f"Using main database: {main_db}")
-        conn = sqlite3.connect(main_db)
+        conn = connect(main_db)
         conn.row_factory = sqlite3.Row
     elif os.path.exists(alt_db):
         print(f"Using alternative database: {alt_db}")
-        conn = sqlite3.connect(alt_db)
+        conn = connect(alt_db)
         conn.row_factory = sqlite3.Row
     else:
         print("No database file found!")
@@ -1,12 +1,13 @@
 import sqlite3
 import json
 import os
+from db_profiles import connect
 
 def get_db_connection():
     """Connect to the SQLite database"""
     db_path = os.path.join(os.getcwd(), 'stock-project.db')
     print(f"Using database at: {db_path}")
-    conn = sqlite3.connect(db_path)
+    conn = connect(db_path)
     conn.row_factory = sqlite3.Row
     return conn
 
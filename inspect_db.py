@@ -1,10 +1,10 @@
-import sqlite3
 import os
+from db_profiles import connect
 
 # Connect to the database
 db_path = os.path.join(os.getcwd(), 'stock-project.db')
 print(f"Connecting to database at: {db_path}")
-conn = sqlite3.connect(db_path)
+conn = connect(db_path)
 cursor = conn.cursor()
 
 # List all tables in the database
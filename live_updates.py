@@ -0,0 +1,317 @@
+import asyncio
+import json
+import queue
+import threading
+import time
+
+from flask import current_app
+
+from async_db import run_db
+from query_cache import db_version
+from stock_cube import stock_cube_slice
+from summary_tables import table_stats
+
+# Server-Sent Events for the tactical dashboard.
+#
+# One watcher thread per process polls Data_Versions, which triggers bump on
+# every write, and recomputes only the aggregates whose source tables moved.
+# What changed is pushed to every subscriber as a diff, so a stock change
+# costs one computation however many dashboards are open, and nobody has to
+# poll the /api endpoints to see it. New subscribers get a snapshot first;
+# the watcher stops when the last one disconnects.
+
+# Seconds between checks of Data_Versions
+POLL_INTERVAL = 1.0
+
+# Seconds of silence after which a comment is sent to keep proxies from closing the stream
+HEARTBEAT_INTERVAL = 15
+
+# Events queued per subscriber; one that falls this far behind is disconnected
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Expiry counts move with the clock too, so they're recomputed at least this often (seconds)
+EXPIRY_RECHECK = 60
+
+LOW_STOCK_ITEMS = 10
+
+
+def _kpis(conn):
+    stats = table_stats(conn)
+    return {
+        'total_products': stats.get('Products', {}).get('rows', 0),
+        'avg_stock': round(stats.get('Inventory', {}).get('StockQuantity', {}).get('avg') or 0, 1),
+        'avg_price': round(stats.get('Products', {}).get('Price', {}).get('avg') or 0, 2)
+    }
+
+
+def _stock_levels(conn):
+    totals = stock_cube_slice(conn, group_by=('category',))['category_totals']
+    top = max(totals.items(), key=lambda item: item[1]) if totals else None
+    return {
+        'categories': totals,
+        'top_category': {'name': top[0], 'stock': top[1]} if top else None
+    }
+
+
+def _low_stock(conn):
+    # Both reads are range scans on idx_inventory_stock
+    counts = conn.execute("""
+    SELECT
+        COALESCE(SUM(StockQuantity < 5), 0),
+        COALESCE(SUM(StockQuantity < 10), 0),
+        COALESCE(SUM(StockQuantity < 20), 0)
+    FROM Inventory
+    WHERE StockQuantity < 20
+    """).fetchone()
+    items = conn.execute("""
+    SELECT i.ProductID, p.[Product Name], i.StockQuantity
+    FROM Inventory i
+    JOIN Products p ON p.[Product ID] = i.ProductID
+    WHERE i.StockQuantity < 20
+    ORDER BY i.StockQuantity, i.ProductID
+    LIMIT ?
+    """, (LOW_STOCK_ITEMS,)).fetchall()
+    return {
+        'critical': counts[0],
+        'low': counts[1],
+        'medium': counts[2],
+        'items': [{'ProductID': row[0], 'ProductName': row[1], 'StockQuantity': row[2]} for row in items]
+    }
+
+
+def _expiring(conn):
+    row = conn.execute("""
+    SELECT
+        COALESCE(SUM(ExpirationDate < datetime('now')), 0),
+        COALESCE(SUM(ExpirationDate >= datetime('now') AND ExpirationDate <= datetime('now', '+7 days')), 0),
+        COALESCE(SUM(ExpirationDate >= datetime('now') AND ExpirationDate <= datetime('now', '+14 days')), 0),
+        COALESCE(SUM(ExpirationDate >= datetime('now')), 0)
+    FROM Inventory
+    WHERE ExpirationDate IS NOT NULL AND ExpirationDate <= datetime('now', '+30 days')
+    """).fetchone()
+    return {
+        'expired': row[0],
+        'within_7_days': row[1],
+        'within_14_days': row[2],
+        'within_30_days': row[3]
+    }
+
+
+# name -> (source tables, compute(conn), whether it also moves with the clock)
+TACTICAL_AGGREGATES = {
+    'kpis': (('Products', 'Inventory'), _kpis, False),
+    'stock_levels': (('Products', 'Inventory'), _stock_levels, False),
+    'low_stock': (('Products', 'Inventory'), _low_stock, False),
+    'expiring': (('Inventory',), _expiring, True)
+}
+
+
+def _diff(old, new):
+    """Entries of `new` that differ from `old`, recursing into dicts; removed keys map to None."""
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return new
+    changes = {}
+    for key, value in new.items():
+        if key not in old:
+            changes[key] = value
+        elif old[key] != value:
+            changes[key] = _diff(old[key], value)
+    for key in old:
+        if key not in new:
+            changes[key] = None
+    return changes
+
+
+class _Subscriber:
+    __slots__ = ('queue', 'closed', 'notify')
+
+    def __init__(self, notify=None):
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.closed = False
+        # Called from the watcher thread after each message or on closing, for
+        # subscribers that wait on something other than the queue
+        self.notify = notify
+
+
+class _Hub:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self.subscribers = set()
+        self.state = {}
+        self.keys = {}
+        self.seq = 0
+        self.thread = None
+        self.connect = None
+
+    def refresh(self, conn):
+        """Recompute the aggregates whose inputs moved and publish their diffs."""
+        with self.refresh_lock:
+            clock = int(time.time() // EXPIRY_RECHECK)
+            for name, (tables, compute, timed) in TACTICAL_AGGREGATES.items():
+                key = db_version(conn, tables) + ((clock,) if timed else ())
+                if self.keys.get(name) == key:
+                    continue
+                payload = compute(conn)
+                previous = self.state.get(name)
+                with self.lock:
+                    self.keys[name] = key
+                    self.state[name] = payload
+                # The first computation goes out with the snapshot instead
+                if previous is not None:
+                    changes = _diff(previous, payload)
+                    if changes:
+                        self.publish(name, changes)
+
+    def publish(self, event, data):
+        with self.lock:
+            self.seq += 1
+            message = f"id: {self.seq}\nevent: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+            for subscriber in list(self.subscribers):
+                try:
+                    subscriber.queue.put_nowait(message)
+                except queue.Full:
+                    # Too slow to keep up - it'll reconnect and start from a snapshot
+                    subscriber.closed = True
+                    self.subscribers.discard(subscriber)
+                if subscriber.notify is not None:
+                    subscriber.notify()
+
+    def subscribe(self, notify=None):
+        subscriber = _Subscriber(notify)
+        # Registered first, so the watcher can't stop and drop the state meanwhile
+        with self.lock:
+            self.subscribers.add(subscriber)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.watch, name='tactical-updates', daemon=True)
+                self.thread.start()
+
+        if not self.state:
+            conn = self.connect()
+            try:
+                self.refresh(conn)
+            finally:
+                conn.close()
+
+        # Any diff queued before this is already part of the snapshot
+        with self.lock:
+            self.seq += 1
+            subscriber.queue.put_nowait(
+                f"id: {self.seq}\nevent: snapshot\ndata: {json.dumps(self.state, default=str)}\n\n")
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def watch(self):
+        conn = None
+        try:
+            while True:
+                with self.lock:
+                    if not self.subscribers:
+                        # Forget the state so the next subscriber starts from fresh numbers
+                        self.state = {}
+                        self.keys = {}
+                        self.thread = None
+                        return
+                try:
+                    if conn is None:
+                        conn = self.connect()
+                    self.refresh(conn)
+                except Exception as e:
+                    print(f"Error refreshing tactical updates: {str(e)}")
+                    if conn is not None:
+                        conn.close()
+                        conn = None
+                time.sleep(POLL_INTERVAL)
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+_hub = _Hub()
+
+
+def init_live_updates(connect):
+    _hub.connect = connect
+
+
+def tactical_event_stream():
+    """text/event-stream response: a snapshot, then diffs of the tactical aggregates."""
+    subscriber = _hub.subscribe()
+
+    def generate():
+        try:
+            while not subscriber.closed:
+                try:
+                    yield subscriber.queue.get(timeout=HEARTBEAT_INTERVAL)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+        finally:
+            _hub.unsubscribe(subscriber)
+
+    response = current_app.response_class(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Tell nginx not to buffer the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def asgi_tactical_stream(scope, receive, send):
+    """The same stream as a native ASGI app, holding no thread while a client waits.
+
+    The watcher wakes the connection through the event loop when there's a
+    message for it, so idle clients cost nothing between events.
+    """
+    loop = asyncio.get_running_loop()
+    wakeup = asyncio.Event()
+
+    def notify():
+        try:
+            loop.call_soon_threadsafe(wakeup.set)
+        except RuntimeError:
+            # The loop has shut down
+            pass
+
+    subscriber = await run_db(_hub.subscribe, notify)
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(b'content-type', b'text/event-stream; charset=utf-8'),
+                    (b'cache-control', b'no-cache'),
+                    (b'x-accel-buffering', b'no')]
+    })
+
+    async def wait_for_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    disconnected = asyncio.ensure_future(wait_for_disconnect())
+    try:
+        while True:
+            # Cleared before draining, so a message queued meanwhile sets it again
+            wakeup.clear()
+            while True:
+                try:
+                    message = subscriber.queue.get_nowait()
+                except queue.Empty:
+                    break
+                await send({'type': 'http.response.body', 'body': message.encode(), 'more_body': True})
+            if subscriber.closed:
+                break
+
+            woken = asyncio.ensure_future(wakeup.wait())
+            done, _ = await asyncio.wait({woken, disconnected}, timeout=HEARTBEAT_INTERVAL,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            woken.cancel()
+            if disconnected in done:
+                break
+            if not done:
+                await send({'type': 'http.response.body', 'body': b": keepalive\n\n", 'more_body': True})
+        if not disconnected.done():
+            # Dropped for falling behind; end the response so the client reconnects
+            await send({'type': 'http.response.body'})
+    finally:
+        disconnected.cancel()
+        _hub.unsubscribe(subscriber)
@@ -0,0 +1,142 @@
+import threading
+
+# Category and tag dictionaries.
+#
+# Dashboard filters used to match with [Product Category] LIKE '%x%' and
+# Tag LIKE '%x%', which can't use an index and scan every product. Instead the
+# filter value is resolved to integer ids through a small cached dictionary and
+# applied as an indexed equality / IN lookup (Products.CategoryID and the
+# Product_Tags(TagID, ProductID) index).
+
+_lock = threading.Lock()
+_cache = {
+    'signature': None,
+    'categories': {},
+    'tags': {}
+}
+
+
+def ensure_lookup_indexes(conn):
+    """Create the Categories dictionary, Products.CategoryID and the filter indexes."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS Categories (
+        CategoryID INTEGER PRIMARY KEY AUTOINCREMENT,
+        CategoryName TEXT UNIQUE
+    )
+    """)
+    conn.execute("""
+    INSERT OR IGNORE INTO Categories (CategoryName)
+    SELECT DISTINCT [Product Category] FROM Products
+    WHERE [Product Category] IS NOT NULL AND [Product Category] != ''
+    """)
+
+    # Integer category id on each product, kept in sync by triggers
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(Products)").fetchall()]
+    if 'CategoryID' not in columns:
+        conn.execute("ALTER TABLE Products ADD COLUMN CategoryID INTEGER")
+    conn.execute("""
+    UPDATE Products
+    SET CategoryID = (SELECT c.CategoryID FROM Categories c
+                      WHERE c.CategoryName = Products.[Product Category])
+    WHERE CategoryID IS NULL
+    """)
+    conn.executescript("""
+    CREATE TRIGGER IF NOT EXISTS trg_products_category_insert
+    AFTER INSERT ON Products
+    WHEN NEW.[Product Category] IS NOT NULL AND NEW.[Product Category] != ''
+    BEGIN
+        INSERT OR IGNORE INTO Categories (CategoryName) VALUES (NEW.[Product Category]);
+        UPDATE Products
+        SET CategoryID = (SELECT CategoryID FROM Categories WHERE CategoryName = NEW.[Product Category])
+        WHERE rowid = NEW.rowid;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_products_category_update
+    AFTER UPDATE OF [Product Category] ON Products
+    BEGIN
+        INSERT OR IGNORE INTO Categories (CategoryName)
+        SELECT NEW.[Product Category]
+        WHERE NEW.[Product Category] IS NOT NULL AND NEW.[Product Category] != '';
+        UPDATE Products
+        SET CategoryID = (SELECT CategoryID FROM Categories WHERE CategoryName = NEW.[Product Category])
+        WHERE rowid = NEW.rowid;
+    END;
+
+    CREATE INDEX IF NOT EXISTS idx_products_category_id ON Products(CategoryID);
+    CREATE INDEX IF NOT EXISTS idx_product_tags_tag ON Product_Tags(TagID, ProductID);
+    CREATE INDEX IF NOT EXISTS idx_inventory_expiration ON Inventory(ExpirationDate, ProductID);
+    CREATE INDEX IF NOT EXISTS idx_inventory_stock ON Inventory(StockQuantity, ProductID);
+    """)
+    conn.commit()
+
+
+def _dictionary_signature(conn):
+    # Both tables are tiny, so this is cheap and catches inserts and deletes
+    row = conn.execute("""
+    SELECT
+        (SELECT COUNT(*) FROM Categories) AS category_count,
+        (SELECT MAX(CategoryID) FROM Categories) AS category_max,
+        (SELECT COUNT(*) FROM Tags) AS tag_count,
+        (SELECT MAX(TagID) FROM Tags) AS tag_max
+    """).fetchone()
+    return tuple(row)
+
+
+def get_dictionaries(conn):
+    """Return ({category name: id}, {tag name: id}), reloading only when the tables change."""
+    signature = _dictionary_signature(conn)
+    with _lock:
+        if _cache['signature'] == signature:
+            return _cache['categories'], _cache['tags']
+
+    categories = {row[0]: row[1] for row in conn.execute(
+        "SELECT CategoryName, CategoryID FROM Categories").fetchall()}
+    tags = {row[0]: row[1] for row in conn.execute(
+        "SELECT TagName, TagID FROM Tags").fetchall()}
+
+    with _lock:
+        _cache['signature'] = signature
+        _cache['categories'] = categories
+        _cache['tags'] = tags
+    return categories, tags
+
+
+def _resolve(dictionary, value):
+    # Exact (case-insensitive) match first, substring match only as a fallback
+    # so old bookmarked partial filters keep working
+    needle = value.strip().lower()
+    exact = [item_id for name, item_id in dictionary.items() if name and name.lower() == needle]
+    if exact:
+        return exact
+    return sorted(item_id for name, item_id in dictionary.items() if name and needle in name.lower())
+
+
+def resolve_category_ids(conn, category):
+    categories, _ = get_dictionaries(conn)
+    return _resolve(categories, category)
+
+
+def resolve_tag_ids(conn, tag):
+    _, tags = get_dictionaries(conn)
+    return _resolve(tags, tag)
+
+
+def _in_clause(column, ids):
+    if not ids:
+        return "0", []
+    if len(ids) == 1:
+        return f"{column} = ?", list(ids)
+    return f"{column} IN ({', '.join('?' for _ in ids)})", list(ids)
+
+
+def category_filter(conn, category, column='p.CategoryID'):
+    """SQL fragment and params restricting `column` to the categories matching `category`."""
+    return _in_clause(column, resolve_category_ids(conn, category))
+
+
+def tag_filter(conn, tag, product_column='p.[Product ID]'):
+    """SQL fragment and params restricting `product_column` to products carrying `tag`."""
+    tag_sql, params = _in_clause('TagID', resolve_tag_ids(conn, tag))
+    if tag_sql == "0":
+        return tag_sql, params
+    return f"{product_column} IN (SELECT ProductID FROM Product_Tags WHERE {tag_sql})", params
@@ -0,0 +1,216 @@
+# Declarative aggregation over the precomputed rollups.
+#
+# A query names the measures it wants, the dimensions to group by, optional
+# filters and a time grain. Every rollup table registers which of those it
+# can answer; the engine picks the smallest one that covers the query and
+# only pushes the remaining GROUP BY over that rollup to SQL. A new chart
+# that fits an existing rollup is a new query, not a new scan of the base
+# tables.
+
+# Period start for each grain, as SQLite expressions over {ts}
+TIME_GRAINS = {
+    'day': "date({ts})",
+    'week': "date({ts}, '-6 days', 'weekday 1')",
+    'month': "strftime('%Y-%m-01', {ts})",
+    'quarter': "printf('%s-%02d-01', strftime('%Y', {ts}), ((CAST(strftime('%m', {ts}) AS INTEGER) - 1) / 3) * 3 + 1)",
+    'year': "strftime('%Y-01-01', {ts})"
+}
+
+# Grains a rollup stored at a given grain can be rolled up to
+_COARSER_GRAINS = {
+    'day': ('day', 'week', 'month', 'quarter', 'year'),
+    'week': ('week',),
+    'month': ('month', 'quarter', 'year')
+}
+
+ROLLUPS = []
+
+# Measures that mean the same thing on every rollup registering them
+_RATING_MEASURES = {
+    'ratings': "SUM({RatingCount})",
+    'rating_sum': "SUM({RatingSum})",
+    'avg_rating': "ROUND(SUM({RatingSum}) * 1.0 / NULLIF(SUM({RatingCount}), 0), 2)"
+}
+
+
+def register_rollup(name, source, dimensions, measures, time_column=None, base_grain=None,
+                    where=None, rank=100):
+    """Make a rollup available to olap_query.
+
+    source is the FROM clause, dimensions and measures map API names to SQL
+    expressions over it, time_column/base_grain say how finely the rollup is
+    bucketed in time (None if it isn't), and rank orders candidates from the
+    smallest table to the largest.
+    """
+    ROLLUPS.append({
+        'name': name,
+        'source': source,
+        'dimensions': dimensions,
+        'measures': measures,
+        'time_column': time_column,
+        'base_grain': base_grain,
+        'where': where,
+        'rank': rank
+    })
+    ROLLUPS.sort(key=lambda rollup: rollup['rank'])
+
+
+def _rating_measures(**columns):
+    return {name: sql.format(**columns) for name, sql in _RATING_MEASURES.items()}
+
+
+register_rollup(
+    'tag_stats',
+    "tag_stats r JOIN Tags t ON t.TagID = r.TagID",
+    dimensions={'tag': 't.TagName'},
+    measures=dict(products='SUM(r.ProductCount)',
+                  **_rating_measures(RatingCount='r.RatingCount', RatingSum='r.RatingSum')),
+    rank=10
+)
+
+register_rollup(
+    'stock_cube',
+    "stock_cube r LEFT JOIN Categories c ON c.CategoryID = r.CategoryID",
+    dimensions={'category': "COALESCE(c.CategoryName, 'Uncategorized')", 'region': 'r.Region',
+                'expiry_month': 'r.ExpiryMonth'},
+    measures={'stock': 'SUM(r.TotalStock)', 'stock_items': 'SUM(r.ItemCount)'},
+    rank=20
+)
+
+for _rank, _grain in ((30, 'month'), (40, 'week'), (50, 'day')):
+    register_rollup(
+        f'tag_activity_rollup_{_grain}',
+        "tag_activity_rollup r JOIN Tags t ON t.TagID = r.TagID",
+        dimensions={'tag': 't.TagName'},
+        measures=dict(assignments='SUM(r.Assignments)',
+                      **_rating_measures(RatingCount='r.Ratings', RatingSum='r.RatingSum')),
+        time_column='r.Bucket',
+        base_grain=_grain,
+        where=f"r.Grain = '{_grain}'",
+        rank=_rank
+    )
+
+register_rollup(
+    'product_rating_stats',
+    "product_rating_stats r JOIN Products p ON p.[Product ID] = r.ProductID",
+    dimensions={'category': "COALESCE(p.[Product Category], 'Uncategorized')", 'product': 'p.[Product Name]'},
+    measures=dict(products='COUNT(*)',
+                  **_rating_measures(RatingCount='r.RatingCount', RatingSum='r.RatingSum')),
+    rank=60
+)
+
+_PRICE_DIMENSIONS = {'category': "COALESCE(p.[Product Category], 'Uncategorized')", 'product': 'p.[Product Name]'}
+
+register_rollup(
+    'price_monthly',
+    "price_monthly r JOIN Products p ON p.[Product ID] = r.ProductID",
+    dimensions=_PRICE_DIMENSIONS,
+    measures={'avg_price': 'ROUND(SUM(r.PriceSum) / NULLIF(SUM(r.PriceCount), 0), 2)',
+              'min_price': 'MIN(r.MinPrice)', 'max_price': 'MAX(r.MaxPrice)',
+              'price_points': 'SUM(r.PriceCount)'},
+    time_column='r.Month',
+    base_grain='month',
+    rank=70
+)
+
+# Base table - only used for what no rollup can answer (day and week prices)
+register_rollup(
+    'pricing_history',
+    "Pricing_History r JOIN Products p ON p.[Product ID] = r.ProductID",
+    dimensions=_PRICE_DIMENSIONS,
+    measures={'avg_price': 'ROUND(AVG(r.Price), 2)', 'min_price': 'MIN(r.Price)',
+              'max_price': 'MAX(r.Price)', 'price_points': 'COUNT(r.Price)'},
+    time_column='r.EffectiveDate',
+    base_grain='day',
+    rank=1000
+)
+
+
+def _covers(rollup, measures, dimensions, grain):
+    if any(measure not in rollup['measures'] for measure in measures):
+        return False
+    if any(dimension not in rollup['dimensions'] for dimension in dimensions):
+        return False
+    if grain is not None:
+        return rollup['base_grain'] is not None and grain in _COARSER_GRAINS[rollup['base_grain']]
+    return True
+
+
+def choose_rollup(measures, dimensions=(), grain=None):
+    """Smallest registered rollup answering the query, or None."""
+    for rollup in ROLLUPS:
+        if _covers(rollup, measures, dimensions, grain):
+            return rollup
+    return None
+
+
+def olap_query(conn, measures, dimensions=(), filters=None, grain=None, start=None, end=None, limit=None):
+    """Aggregate `measures` grouped by `dimensions` (and period, if `grain` is given).
+
+    filters maps dimension names to a value or list of values; start/end bound
+    the period (inclusive, 'YYYY-MM-DD'). Raises ValueError for anything no
+    registered rollup can answer.
+    """
+    filters = {name: value for name, value in (filters or {}).items() if value not in (None, '', [])}
+    if not measures:
+        raise ValueError("At least one measure is required")
+    if grain is not None and grain not in TIME_GRAINS:
+        raise ValueError(f"grain must be one of {', '.join(TIME_GRAINS)}")
+    if grain is None and (start or end):
+        raise ValueError("start/end need a grain")
+
+    rollup = choose_rollup(measures, list(dimensions) + list(filters), grain)
+    if rollup is None:
+        raise ValueError(f"No rollup can answer measures={list(measures)} dimensions={list(dimensions)}"
+                         f" filters={list(filters)} grain={grain}")
+
+    select = [f"{rollup['dimensions'][dimension]} AS {dimension}" for dimension in dimensions]
+    group = [rollup['dimensions'][dimension] for dimension in dimensions]
+    conditions = [rollup['where']] if rollup['where'] else []
+    params = []
+
+    if grain is not None:
+        period = TIME_GRAINS[grain].format(ts=rollup['time_column'])
+        select.insert(0, f"{period} AS period")
+        group.insert(0, period)
+        if start:
+            conditions.append(f"{rollup['time_column']} >= ?")
+            params.append(start)
+        if end:
+            # Compare against the end of the last day so timestamps on it still count
+            conditions.append(f"{rollup['time_column']} < date(?, '+1 day')")
+            params.append(end)
+
+    for dimension, value in filters.items():
+        values = value if isinstance(value, (list, tuple)) else [value]
+        conditions.append(f"{rollup['dimensions'][dimension]} IN ({', '.join('?' for _ in values)})")
+        params.extend(values)
+
+    select.extend(f"{rollup['measures'][measure]} AS {measure}" for measure in measures)
+    sql = f"SELECT {', '.join(select)} FROM {rollup['source']}"
+    if conditions:
+        sql += f" WHERE {' AND '.join(conditions)}"
+    if group:
+        sql += f" GROUP BY {', '.join(group)} ORDER BY {', '.join(group)}"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+
+    cursor = conn.execute(sql, params)
+    names = [column[0] for column in cursor.description]
+    return {
+        'rollup': rollup['name'],
+        'measures': list(measures),
+        'dimensions': list(dimensions),
+        'grain': grain,
+        'rows': [dict(zip(names, row)) for row in cursor.fetchall()]
+    }
+
+
+def describe_rollups():
+    return [{
+        'name': rollup['name'],
+        'dimensions': sorted(rollup['dimensions']),
+        'measures': sorted(rollup['measures']),
+        'grains': list(_COARSER_GRAINS[rollup['base_grain']]) if rollup['base_grain'] else []
+    } for rollup in ROLLUPS]
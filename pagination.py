@@ -0,0 +1,56 @@
+import base64
+import json
+
+# Keyset (cursor) pagination.
+#
+# A page is ordered by a unique key and ends with a cursor holding the key of
+# its last row. The next page asks for rows strictly after that key, which is
+# one index range scan no matter how deep the page is - OFFSET would read and
+# throw away every earlier row first.
+
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """Key values from a cursor made by encode_cursor; None for no cursor, ValueError if it's bad."""
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def page_size(value, default):
+    if value in (None, ''):
+        return default
+    size = int(value)
+    if size < 1:
+        raise ValueError("limit must be at least 1")
+    return min(size, MAX_PAGE_SIZE)
+
+
+def keyset_condition(columns):
+    """SQL comparing `columns` against a cursor's values, as a row value."""
+    return f"({', '.join(columns)}) > ({', '.join('?' for _ in columns)})"
+
+
+def paginate(rows, limit, key, hidden=()):
+    """(page, next cursor or None) from up to limit + 1 rows ordered by key(row).
+
+    Columns in `hidden` are only there for the key and are dropped from the page.
+    """
+    more = len(rows) > limit
+    rows = rows[:limit]
+    cursor = encode_cursor(key(rows[-1])) if more and rows else None
+    for row in rows:
+        for column in hidden:
+            row.pop(column, None)
+    return rows, cursor
@@ -0,0 +1,332 @@
+import functools
+import queue
+import threading
+import time
+from datetime import date
+from urllib.parse import urlencode
+
+from flask import current_app, request
+
+from cache_store import MemoryCacheStore
+from compression import apply_encoding, encoded_variants, negotiate_encoding
+
+# Results cached per database version.
+#
+# Data_Versions keeps one counter per source table, bumped by triggers on every
+# insert, update and delete. A cached result remembers the versions of the
+# tables it was computed from, so dashboards don't recompute numbers nobody
+# has changed.
+#
+# Entries are stale-while-revalidate: once the data moves or the entry is
+# older than SOFT_TTL, the old value is still served immediately while a
+# background thread recomputes it. Only a miss, or an entry older than
+# HARD_TTL, makes a request wait for the computation. If recomputing fails
+# the previous value keeps being served.
+#
+# Entries live in a cache store - in process memory by default, or a shared
+# SqliteCacheStore file when several worker processes should share them.
+#
+# Computations are also single-flight: when several requests miss on the same
+# key at once, one of them computes and the rest wait for its result, so load
+# grows with the number of distinct queries rather than the number of users.
+
+VERSIONED_TABLES = ('Products', 'Inventory', 'Tags', 'Product_Tags', 'Product_Ratings', 'Pricing_History')
+
+# Seconds an entry is served without a refresh, and after which it can't be served at all
+SOFT_TTL = 300
+HARD_TTL = 3600
+
+# Seconds to wait before retrying a background refresh that failed
+REFRESH_RETRY = 30
+
+_lock = threading.Lock()
+_in_flight = {}
+_cache_store = MemoryCacheStore()
+
+_refresh_queue = queue.Queue()
+_refresh_pending = set()
+_refresh_thread = None
+
+# Opens a database connection for version checks; set by init_cache
+_connect = None
+
+
+def init_cache(connect, store=None):
+    global _connect, _cache_store
+    _connect = connect
+    if store is not None:
+        _cache_store = store
+
+
+def ensure_data_versions(conn):
+    """Create Data_Versions and the triggers bumping it."""
+    existing = {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()}
+    statements = ["""
+    CREATE TABLE IF NOT EXISTS Data_Versions (
+        TableName TEXT PRIMARY KEY,
+        Version INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID;
+    """]
+    for table in VERSIONED_TABLES:
+        if table not in existing:
+            continue
+        statements.append(f"INSERT OR IGNORE INTO Data_Versions (TableName, Version) VALUES ('{table}', 0);")
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            statements.append(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_version_{table.lower()}_{event.lower()}
+            AFTER {event} ON {table}
+            BEGIN
+                UPDATE Data_Versions SET Version = Version + 1 WHERE TableName = '{table}';
+            END;
+            """)
+    conn.executescript('\n'.join(statements))
+    conn.commit()
+
+
+def db_version(conn, tables=VERSIONED_TABLES):
+    """Tuple of the current versions of `tables`; changes whenever any of them is written."""
+    versions = dict(conn.execute("SELECT TableName, Version FROM Data_Versions").fetchall())
+    return tuple(versions.get(table, 0) for table in tables)
+
+
+class _Flight:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def single_flight(key, compute):
+    """compute(), shared by every caller asking for `key` while it runs."""
+    with _lock:
+        flight = _in_flight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _in_flight[key] = _Flight()
+
+    if not leader:
+        flight.event.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = compute()
+        return flight.result
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _lock:
+            _in_flight.pop(key, None)
+        flight.event.set()
+
+
+def _store(key, version, value):
+    try:
+        _cache_store.put(key, {'version': version, 'value': value, 'stored_at': time.time(), 'retry_at': 0})
+    except Exception as e:
+        # A full or locked cache file costs the next request a recompute, not this one its answer
+        print(f"Error storing {key} in the cache: {str(e)}")
+
+
+def _lookup(key, version, soft_ttl, hard_ttl):
+    """(entry, state) where state is 'fresh', 'stale', 'expired' or None for a miss."""
+    entry = _cache_store.get(key)
+    if entry is None:
+        return None, None
+    age = time.time() - entry['stored_at']
+    if age >= hard_ttl:
+        return entry, 'expired'
+    if entry['version'] == version and age < soft_ttl:
+        return entry, 'fresh'
+    return entry, 'stale'
+
+
+def _refresh_worker():
+    while True:
+        key, job = _refresh_queue.get()
+        try:
+            job()
+        except Exception as e:
+            # Keep serving the stale value; try again after REFRESH_RETRY seconds
+            print(f"Background refresh of {key} failed: {str(e)}")
+            try:
+                _cache_store.set_retry(key, time.time() + REFRESH_RETRY)
+            except Exception as e:
+                print(f"Error recording refresh retry for {key}: {str(e)}")
+        finally:
+            with _lock:
+                _refresh_pending.discard(key)
+
+
+def schedule_refresh(key, entry, job):
+    """Run job() on the background refresh thread unless it's already queued for `key`."""
+    global _refresh_thread
+    with _lock:
+        if key in _refresh_pending or entry['retry_at'] > time.time():
+            return
+        _refresh_pending.add(key)
+        if _refresh_thread is None or not _refresh_thread.is_alive():
+            _refresh_thread = threading.Thread(target=_refresh_worker, name='cache-refresh', daemon=True)
+            _refresh_thread.start()
+    _refresh_queue.put((key, job))
+
+
+def cached(conn, key, compute, tables=VERSIONED_TABLES, soft_ttl=SOFT_TTL, hard_ttl=HARD_TTL):
+    """compute(conn), reused while fresh and refreshed in the background once stale."""
+    version = db_version(conn, tables)
+    entry, state = _lookup(key, version, soft_ttl, hard_ttl)
+    if state == 'fresh':
+        return entry['value']
+    if state == 'stale' and _connect is not None:
+        schedule_refresh(key, entry, lambda: _refresh_cached(key, compute, tables))
+        return entry['value']
+
+    def compute_and_store():
+        value = compute(conn)
+        _store(key, version, value)
+        return value
+
+    try:
+        return single_flight((key, version), compute_and_store)
+    except Exception as e:
+        if entry is None:
+            raise
+        print(f"Recomputing {key} failed, serving the cached value: {str(e)}")
+        return entry['value']
+
+
+def _refresh_cached(key, compute, tables):
+    conn = _connect()
+    try:
+        version = db_version(conn, tables)
+
+        def compute_and_store():
+            value = compute(conn)
+            _store(key, version, value)
+            return value
+
+        single_flight((key, version), compute_and_store)
+    finally:
+        conn.close()
+
+
+def _request_key():
+    # Argument order doesn't matter; the date is part of the key because
+    # many views filter relative to today
+    args = urlencode(sorted(request.args.items(multi=True)))
+    return f"view:{request.path}?{args}@{date.today().isoformat()}"
+
+
+def cached_view(tables=VERSIONED_TABLES, soft_ttl=SOFT_TTL, hard_ttl=HARD_TTL, warm=('',)):
+    """Cache a view's successful response per request arguments and data version.
+
+    Stale responses are served straight away while the view is re-run on the
+    background refresh thread; only a miss or an entry past hard_ttl makes the
+    request wait for the view. `warm` lists the query strings startup warm-up
+    requests it with (see warm_with).
+    """
+    def decorator(view):
+        def render(key, version, args, kwargs, own=None):
+            response = current_app.make_response(view(*args, **kwargs))
+            if own is not None:
+                own['response'] = response
+            if response.status_code != 200 or response.is_streamed or _is_error_payload(response):
+                return None
+            body = response.get_data()
+            # Compressed once here, so hits don't pay for compression either
+            stored = (body, response.status_code, response.mimetype, encoded_variants(body, response.mimetype))
+            _store(key, version, stored)
+            return stored
+
+        def refresh(app, path, query_string, key, args, kwargs):
+            conn = _connect()
+            try:
+                version = db_version(conn, tables)
+            finally:
+                conn.close()
+            with app.test_request_context(path, query_string=query_string):
+                if single_flight((key, version), lambda: render(key, version, args, kwargs)) is None:
+                    raise RuntimeError("view returned an error response")
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if _connect is None:
+                return view(*args, **kwargs)
+
+            key = _request_key()
+            conn = _connect()
+            try:
+                version = db_version(conn, tables)
+            finally:
+                conn.close()
+
+            entry, state = _lookup(key, version, soft_ttl, hard_ttl)
+            if state == 'fresh':
+                return _build_response(entry['value'])
+            if state == 'stale':
+                app = current_app._get_current_object()
+                path, query_string = request.path, request.query_string
+                schedule_refresh(key, entry, lambda: refresh(app, path, query_string, key, args, kwargs))
+                return _build_response(entry['value'])
+
+            own = {}
+            try:
+                stored = single_flight((key, version), lambda: render(key, version, args, kwargs, own))
+            except Exception as e:
+                if entry is None:
+                    raise
+                print(f"Rendering {key} failed, serving the cached response: {str(e)}")
+                return _build_response(entry['value'])
+            if stored is not None:
+                return _build_response(stored)
+            if entry is not None:
+                # Error response - an expired copy beats an error page
+                return _build_response(entry['value'])
+            if 'response' in own:
+                return own['response']
+            # The shared result wasn't cacheable (an error page, say) - answer this request directly
+            return view(*args, **kwargs)
+        return warm_with(*warm)(wrapper)
+    return decorator
+
+
+def warm_with(*query_strings, arguments=()):
+    """Mark a view as worth requesting at startup, once per query string.
+
+    cached_view marks its views itself; use this on views whose data goes
+    through cached(). cache_warming only replays views carrying the mark.
+    Views on rules with URL arguments are requested once per dict of values
+    in `arguments`, e.g. ({'chart': 'tag_ratings'},).
+    """
+    def decorator(view):
+        view.warm_queries = query_strings or ('',)
+        view.warm_arguments = tuple(arguments)
+        return view
+    return decorator
+
+
+def _is_error_payload(response):
+    # Views report failures as {'error': ...} with a 200, which mustn't be cached
+    if not response.is_json:
+        return False
+    payload = response.get_json(silent=True)
+    return isinstance(payload, dict) and 'error' in payload
+
+
+def _build_response(stored):
+    body, status, mimetype = stored[:3]
+    variants = stored[3] if len(stored) > 3 else {}
+    response = current_app.response_class(body, status=status, mimetype=mimetype)
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+    if encoding in variants:
+        apply_encoding(response, encoding, variants[encoding])
+    return response
+
+
+def clear_cache():
+    _cache_store.clear()
@@ -0,0 +1,257 @@
+import random
+import sqlite3
+import threading
+from array import array
+
+# Item-to-item recommendations over product tag sets.
+#
+# Each product's tag set is summarised by a MinHash signature and the
+# signatures are split into LSH bands, so products sharing a band bucket are
+# candidate neighbours. Looking up a product only touches its own buckets
+# instead of comparing it against every other product. Candidates are ranked
+# by estimated Jaccard similarity blended with their average rating.
+#
+# The index follows the same Bitmap_Changes log as the tag bitmap index, so
+# tag edits only re-sign the products they touch.
+
+NUM_PERM = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+
+# Cap on candidates pulled from very popular buckets
+MAX_CANDIDATES = 500
+
+# How much of the final score comes from ratings (the rest is tag similarity)
+RATING_WEIGHT = 0.3
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_EMPTY_SIGNATURE = [_MAX_HASH] * NUM_PERM
+
+# Fixed seed so every worker produces the same signatures
+_rng = random.Random(1337)
+_HASH_PARAMS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+                for _ in range(NUM_PERM)]
+
+
+def ensure_recommendation_indexes(conn):
+    # Covering index for the per-candidate rating lookups
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_product_ratings_product ON Product_Ratings(ProductID, Rating)")
+    conn.commit()
+
+
+def minhash_signature(tag_ids):
+    if not tag_ids:
+        return list(_EMPTY_SIGNATURE)
+    return [min(((a * tag_id + b) % _MERSENNE_PRIME) & _MAX_HASH for tag_id in tag_ids)
+            for a, b in _HASH_PARAMS]
+
+
+def estimated_jaccard(signature, other):
+    return sum(1 for x, y in zip(signature, other) if x == y) / NUM_PERM
+
+
+class MinHashLSHIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.built = False
+        self.last_seq = 0
+        self.product_ordinals = {}
+        self.ordinal_products = []
+        self.product_tags = []
+        # Flat array of NUM_PERM hashes per ordinal keeps memory per product small
+        self.signatures = array('Q')
+        self.buckets = {}
+
+    def _ordinal(self, product_id):
+        ordinal = self.product_ordinals.get(product_id)
+        if ordinal is None:
+            ordinal = len(self.ordinal_products)
+            self.product_ordinals[product_id] = ordinal
+            self.ordinal_products.append(product_id)
+            self.product_tags.append(set())
+            self.signatures.extend(_EMPTY_SIGNATURE)
+        return ordinal
+
+    def signature(self, ordinal):
+        start = ordinal * NUM_PERM
+        return self.signatures[start:start + NUM_PERM]
+
+    def _band_keys(self, signature):
+        return [(band, tuple(signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]))
+                for band in range(BANDS)]
+
+    def _unindex(self, ordinal):
+        if not self.product_tags[ordinal]:
+            return
+        for key in self._band_keys(self.signature(ordinal)):
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                bucket.discard(ordinal)
+                if not bucket:
+                    del self.buckets[key]
+
+    def _index(self, ordinal):
+        tags = self.product_tags[ordinal]
+        signature = minhash_signature(tags)
+        start = ordinal * NUM_PERM
+        self.signatures[start:start + NUM_PERM] = array('Q', signature)
+        if not tags:
+            return
+        for key in self._band_keys(signature):
+            self.buckets.setdefault(key, set()).add(ordinal)
+
+    def rebuild(self, conn):
+        last_seq = conn.execute("SELECT COALESCE(MAX(Seq), 0) FROM Bitmap_Changes").fetchone()[0]
+        self.product_ordinals = {}
+        self.ordinal_products = []
+        self.product_tags = []
+        self.signatures = array('Q')
+        self.buckets = {}
+
+        for (product_id,) in conn.execute("SELECT [Product ID] FROM Products ORDER BY rowid"):
+            self._ordinal(product_id)
+        for product_id, tag_id in conn.execute("SELECT ProductID, TagID FROM Product_Tags"):
+            self.product_tags[self._ordinal(product_id)].add(tag_id)
+        for ordinal in range(len(self.ordinal_products)):
+            self._index(ordinal)
+
+        self.last_seq = last_seq
+        self.built = True
+        print(f"Built MinHash LSH index: {len(self.ordinal_products)} products, {len(self.buckets)} buckets")
+
+    def refresh(self, conn):
+        with self.lock:
+            if not self.built:
+                self.rebuild(conn)
+                return self
+
+            first_seq, max_seq = conn.execute(
+                "SELECT MIN(Seq), MAX(Seq) FROM Bitmap_Changes").fetchone()
+            if max_seq is None or max_seq <= self.last_seq:
+                return self
+            if first_seq > self.last_seq + 1:
+                self.rebuild(conn)
+                return self
+
+            changes = conn.execute("""
+            SELECT Seq, ProductID, ItemID, Op FROM Bitmap_Changes
+            WHERE Seq > ? AND Kind = 'tag' ORDER BY Seq
+            """, (self.last_seq,)).fetchall()
+            touched = {}
+            for seq, product_id, tag_id, op in changes:
+                ordinal = self._ordinal(product_id)
+                if ordinal not in touched:
+                    # Remove from the old buckets before the tag set changes
+                    self._unindex(ordinal)
+                    touched[ordinal] = True
+                if op > 0:
+                    self.product_tags[ordinal].add(tag_id)
+                else:
+                    self.product_tags[ordinal].discard(tag_id)
+            for ordinal in touched:
+                self._index(ordinal)
+            self.last_seq = max_seq
+        return self
+
+    def similar(self, product_id, limit=10):
+        """[(product_id, estimated jaccard)] for the nearest products by tag set."""
+        with self.lock:
+            ordinal = self.product_ordinals.get(product_id)
+            if ordinal is None or not self.product_tags[ordinal]:
+                return []
+            signature = self.signature(ordinal)
+
+            candidates = set()
+            for key in self._band_keys(signature):
+                candidates.update(self.buckets.get(key, ()))
+                if len(candidates) >= MAX_CANDIDATES:
+                    break
+            candidates.discard(ordinal)
+
+            scored = [(self.ordinal_products[other], estimated_jaccard(signature, self.signature(other)))
+                      for other in candidates]
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:limit]
+
+
+_index = MinHashLSHIndex()
+
+
+def get_lsh_index(conn):
+    return _index.refresh(conn)
+
+
+def _rating_stats(conn, product_ids):
+    if not product_ids:
+        return {}
+    placeholders = ', '.join('?' for _ in product_ids)
+    rows = conn.execute(f"""
+    SELECT ProductID, AVG(Rating) AS AvgRating, COUNT(*) AS RatingCount
+    FROM Product_Ratings
+    WHERE ProductID IN ({placeholders})
+    GROUP BY ProductID
+    """, list(product_ids)).fetchall()
+    return {row[0]: (row[1], row[2]) for row in rows}
+
+
+def recommend(conn, product_id, limit=10):
+    """Products similar to `product_id`, ranked by tag similarity blended with rating."""
+    # Pull a few extra neighbours so the rating blend can reorder them
+    neighbours = get_lsh_index(conn).similar(product_id, limit=limit * 3)
+    if not neighbours:
+        return []
+
+    product_ids = [other for other, _ in neighbours]
+    ratings = _rating_stats(conn, product_ids)
+    placeholders = ', '.join('?' for _ in product_ids)
+    names = {row[0]: row[1] for row in conn.execute(f"""
+    SELECT [Product ID], [Product Name] FROM Products WHERE [Product ID] IN ({placeholders})
+    """, product_ids).fetchall()}
+
+    results = []
+    for other, similarity in neighbours:
+        avg_rating, rating_count = ratings.get(other, (None, 0))
+        rating_score = (avg_rating / 5.0) if avg_rating is not None else 0.5
+        results.append({
+            'ProductID': other,
+            'ProductName': names.get(other),
+            'Similarity': round(similarity, 3),
+            'AvgRating': round(avg_rating, 2) if avg_rating is not None else None,
+            'RatingCount': rating_count,
+            'Score': round((1 - RATING_WEIGHT) * similarity + RATING_WEIGHT * rating_score, 4)
+        })
+    results.sort(key=lambda item: item['Score'], reverse=True)
+    return results[:limit]
+
+
+def precomputed_neighbours(conn, product_id, limit=10):
+    """Neighbours written by build_product_neighbours.py (TF-IDF cosine), or [] if not built."""
+    try:
+        rows = conn.execute("""
+        SELECT n.NeighbourID, p.[Product Name], n.Score
+        FROM Product_Neighbours n
+        -- Neighbours deleted since the last batch run drop out until the next one
+        JOIN Products p ON p.[Product ID] = n.NeighbourID
+        WHERE n.ProductID = ?
+        ORDER BY n.Rank
+        LIMIT ?
+        """, (product_id, limit)).fetchall()
+    except sqlite3.OperationalError:
+        # Table doesn't exist until the batch job has run once
+        return []
+
+    ratings = _rating_stats(conn, [row[0] for row in rows])
+    results = []
+    for neighbour_id, name, score in rows:
+        avg_rating, rating_count = ratings.get(neighbour_id, (None, 0))
+        results.append({
+            'ProductID': neighbour_id,
+            'ProductName': name,
+            'Similarity': round(score, 3),
+            'AvgRating': round(avg_rating, 2) if avg_rating is not None else None,
+            'RatingCount': rating_count,
+            'Score': round(score, 4)
+        })
+    return results
+
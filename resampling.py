@@ -0,0 +1,70 @@
+from datetime import date
+
+# Downsampling for time-series charts.
+#
+# Largest-Triangle-Three-Buckets keeps the first and last point and, for each
+# bucket in between, the point forming the largest triangle with the point
+# kept from the previous bucket and the average of the next bucket. Peaks and
+# troughs survive, so a few hundred points still look like the full series.
+
+DEFAULT_MAX_POINTS = 500
+
+# Bounds for a requested max_points: LTTB needs the two end points plus one
+# bucket, and the upper bound keeps payloads bounded
+MIN_MAX_POINTS = 3
+MAX_MAX_POINTS = 5000
+
+
+def lttb(points, threshold):
+    """Indices of the points to keep from [(x, y)], at most `threshold` of them."""
+    n = len(points)
+    if threshold >= n:
+        return list(range(n))
+    if threshold < 3:
+        return [0, n - 1][:max(threshold, 0)]
+
+    kept = [0]
+    bucket_size = (n - 2) / (threshold - 2)
+    previous = 0
+
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+
+        # Average of the next bucket (the last point for the final bucket)
+        next_start = end
+        next_end = min(int((bucket + 2) * bucket_size) + 1, n)
+        if next_start >= next_end:
+            next_start, next_end = n - 1, n
+        count = next_end - next_start
+        avg_x = sum(points[i][0] for i in range(next_start, next_end)) / count
+        avg_y = sum(points[i][1] for i in range(next_start, next_end)) / count
+
+        prev_x, prev_y = points[previous]
+        best, best_area = start, -1.0
+        for i in range(start, end):
+            x, y = points[i]
+            area = abs((prev_x - avg_x) * (y - prev_y) - (prev_x - x) * (avg_y - prev_y))
+            if area > best_area:
+                best, best_area = i, area
+        kept.append(best)
+        previous = best
+
+    kept.append(n - 1)
+    return kept
+
+
+def _date_ordinal(value):
+    return date.fromisoformat(str(value)[:10]).toordinal()
+
+
+def downsample_rows(rows, x_key, y_key, max_points=DEFAULT_MAX_POINTS):
+    """Rows (dicts, ordered by date `x_key`) reduced to at most max_points with LTTB."""
+    points = []
+    usable = []
+    for row in rows:
+        if row[x_key] is None or row[y_key] is None:
+            continue
+        points.append((_date_ordinal(row[x_key]), float(row[y_key])))
+        usable.append(row)
+    return [usable[i] for i in lttb(points, max_points)]
@@ -0,0 +1,106 @@
+import hashlib
+import mimetypes
+import os
+import re
+
+from flask import current_app, request, send_from_directory
+
+from compression import CACHED_LEVELS, ENCODINGS, compress, is_compressible, negotiate_encoding
+
+# Fingerprinted static assets.
+#
+# At startup every file under static/ is hashed, and url_for('static', ...)
+# hands out names with the hash in them (css/style.3f2a9c1be0d4.css). Since
+# such a URL can only ever refer to those exact bytes it's served as
+# immutable for a year, so after the first visit browsers don't ask for it
+# again. Textual assets are compressed once at startup and served from
+# memory; everything else (the background videos) goes through send_file,
+# which answers Range requests with 206 and hands the file to the server's
+# sendfile support where there is one.
+#
+# Unhashed names, and names with a hash from an earlier deploy, keep working
+# with the usual revalidation.
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+HASH_LENGTH = 12
+
+# name.<hash>.ext
+_FINGERPRINTED = re.compile(r'^(.*)\.[0-9a-f]{%d}(\.[^./]+)$' % HASH_LENGTH)
+
+# Fingerprinted name -> asset, and original name -> fingerprinted name
+_assets = {}
+_fingerprints = {}
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def build_asset_manifest(static_folder):
+    """Hash (and for text, precompress) everything under static_folder."""
+    _assets.clear()
+    _fingerprints.clear()
+    for root, _, files in os.walk(static_folder):
+        for name in files:
+            path = os.path.join(root, name)
+            filename = os.path.relpath(path, static_folder).replace(os.sep, '/')
+            file_hash = _file_hash(path)
+            stem, ext = os.path.splitext(filename)
+            fingerprinted = f"{stem}.{file_hash}{ext}"
+            mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+            variants = {}
+            if is_compressible(mimetype):
+                with open(path, 'rb') as f:
+                    body = f.read()
+                variants = {encoding: compress(body, encoding, CACHED_LEVELS) for encoding in ENCODINGS}
+
+            _assets[fingerprinted] = {'filename': filename, 'hash': file_hash,
+                                      'mimetype': mimetype, 'variants': variants}
+            _fingerprints[filename] = fingerprinted
+    print(f"Fingerprinted {len(_assets)} static assets")
+    return dict(_fingerprints)
+
+
+def fingerprint_static_urls(endpoint, values):
+    """url_defaults hook swapping static filenames for their fingerprinted names."""
+    if endpoint == 'static' and values.get('filename') in _fingerprints:
+        values['filename'] = _fingerprints[values['filename']]
+
+
+def serve_static(filename):
+    asset = _assets.get(filename)
+    if asset is None:
+        # A name fingerprinted by an earlier deploy (from a cached page, say)
+        # gets the current file, revalidated like an unhashed name
+        match = _FINGERPRINTED.match(filename)
+        if match and match.group(1) + match.group(2) in _fingerprints:
+            filename = match.group(1) + match.group(2)
+        return current_app.send_static_file(filename)
+
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding')) if asset['variants'] else None
+    if encoding is not None:
+        response = current_app.response_class(asset['variants'][encoding], mimetype=asset['mimetype'])
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.set_etag(asset['hash'], weak=True)
+        response = response.make_conditional(request)
+    else:
+        response = send_from_directory(current_app.static_folder, asset['filename'],
+                                       etag=asset['hash'], conditional=True, max_age=IMMUTABLE_MAX_AGE)
+
+    response.cache_control.public = True
+    response.cache_control.max_age = IMMUTABLE_MAX_AGE
+    response.cache_control.immutable = True
+    return response
+
+
+def init_static_assets(app):
+    build_asset_manifest(app.static_folder)
+    app.url_defaults(fingerprint_static_urls)
+    app.view_functions['static'] = serve_static
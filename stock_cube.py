@@ -0,0 +1,257 @@
+from lookups import get_dictionaries, resolve_category_ids
+
+# Stock cube: inventory totals by category x region x expiry month.
+#
+# The availability matrix used to re-sum Inventory per category in a
+# correlated subquery for every (category, region) group. stock_cube holds
+# those sums already, so the matrix and any drill-down are one indexed read
+# plus window functions for the marginal totals.
+#
+# stock_cube_items records which cell each Inventory row was counted in,
+# keyed by its ProductID - not its rowid, which an INSERT OR REPLACE upsert
+# changes without firing the delete trigger.
+# Triggers on Inventory and Products only ever re-place rows there (reading
+# the product's current category and region), and triggers on
+# stock_cube_items move the stock between cells. Re-placing is idempotent, so
+# it doesn't matter how many product triggers fire for one change.
+#
+# Products without a Region column are all filed under region 'All';
+# uncategorised products use CategoryID 0 and stock without an expiration date
+# uses expiry month 'none'.
+
+CUBE_DIMENSIONS = {
+    'category': 'CategoryID',
+    'region': 'Region',
+    'expiry': 'ExpiryMonth'
+}
+
+
+def _place_items_sql(inventory_filter, has_region):
+    region = "COALESCE(p.Region, 'All')" if has_region else "'All'"
+    return f"""
+        INSERT INTO stock_cube_items (ProductID, CategoryID, Region, ExpiryMonth, Stock)
+        SELECT i.ProductID, COALESCE(p.CategoryID, 0), {region},
+               COALESCE(strftime('%Y-%m', i.ExpirationDate), 'none'), COALESCE(i.StockQuantity, 0)
+        FROM Inventory i
+        JOIN Products p ON p.[Product ID] = i.ProductID
+        WHERE {inventory_filter}
+        ON CONFLICT(ProductID) DO UPDATE SET
+            CategoryID = excluded.CategoryID,
+            Region = excluded.Region,
+            ExpiryMonth = excluded.ExpiryMonth,
+            Stock = excluded.Stock;
+    """
+
+
+def _cube_delta_sql(row, sign):
+    return f"""
+        INSERT INTO stock_cube (CategoryID, Region, ExpiryMonth, TotalStock, ItemCount)
+        VALUES ({row}.CategoryID, {row}.Region, {row}.ExpiryMonth, {sign}{row}.Stock, {sign}1)
+        ON CONFLICT(CategoryID, Region, ExpiryMonth) DO UPDATE SET
+            TotalStock = TotalStock + excluded.TotalStock,
+            ItemCount = ItemCount + excluded.ItemCount;
+        DELETE FROM stock_cube
+        WHERE CategoryID = {row}.CategoryID AND Region = {row}.Region
+        AND ExpiryMonth = {row}.ExpiryMonth AND ItemCount <= 0;
+    """
+
+
+def _drop_rowid_cube(conn):
+    # Cubes built before items were keyed by ProductID are rebuilt from scratch;
+    # their triggers reference the old column, so they go too
+    item_columns = [row[1] for row in conn.execute("PRAGMA table_info(stock_cube_items)").fetchall()]
+    if 'ItemRowID' not in item_columns:
+        return
+    triggers = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_stock_cube_%'").fetchall()]
+    conn.executescript("BEGIN;" + "".join(f"DROP TRIGGER {name};" for name in triggers) + """
+    DROP TABLE stock_cube_items;
+    DROP TABLE IF EXISTS stock_cube;
+    COMMIT;
+    """)
+    print("Dropped rowid-keyed stock_cube for a rebuild")
+
+
+def ensure_stock_cube(conn):
+    """Create, backfill and attach triggers for stock_cube."""
+    _drop_rowid_cube(conn)
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stock_cube'"
+    ).fetchone()
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(Products)").fetchall()]
+    has_region = 'Region' in columns
+    product_columns = 'CategoryID, Region' if has_region else 'CategoryID'
+
+    # Items are placed before the cube triggers exist, then summed in one go
+    backfill = "" if exists else f"""
+    {_place_items_sql('1', has_region)}
+    INSERT INTO stock_cube (CategoryID, Region, ExpiryMonth, TotalStock, ItemCount)
+    SELECT CategoryID, Region, ExpiryMonth, SUM(Stock), COUNT(*)
+    FROM stock_cube_items
+    GROUP BY CategoryID, Region, ExpiryMonth;
+    """
+
+    # Backfill and triggers go in one transaction so no stock is missed or counted twice
+    conn.executescript(f"""
+    BEGIN;
+    CREATE TABLE IF NOT EXISTS stock_cube (
+        CategoryID INTEGER NOT NULL,
+        Region TEXT NOT NULL,
+        ExpiryMonth TEXT NOT NULL,
+        TotalStock INTEGER NOT NULL DEFAULT 0,
+        ItemCount INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (CategoryID, Region, ExpiryMonth)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_stock_cube_region ON stock_cube(Region, CategoryID);
+    CREATE INDEX IF NOT EXISTS idx_stock_cube_expiry ON stock_cube(ExpiryMonth, CategoryID);
+
+    CREATE TABLE IF NOT EXISTS stock_cube_items (
+        ProductID TEXT PRIMARY KEY,
+        CategoryID INTEGER NOT NULL,
+        Region TEXT NOT NULL,
+        ExpiryMonth TEXT NOT NULL,
+        Stock INTEGER NOT NULL DEFAULT 0
+    );
+    {backfill}
+    CREATE TRIGGER IF NOT EXISTS trg_stock_cube_items_insert
+    AFTER INSERT ON stock_cube_items
+    BEGIN
+        {_cube_delta_sql('NEW', '')}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_stock_cube_items_delete
+    AFTER DELETE ON stock_cube_items
+    BEGIN
+        {_cube_delta_sql('OLD', '-')}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_stock_cube_items_update
+    AFTER UPDATE ON stock_cube_items
+    BEGIN
+        {_cube_delta_sql('OLD', '-')}
+        {_cube_delta_sql('NEW', '')}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_stock_cube_inventory_insert
+    AFTER INSERT ON Inventory
+    BEGIN
+        {_place_items_sql('i.ProductID = NEW.ProductID', has_region)}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_stock_cube_inventory_update
+    AFTER UPDATE OF ProductID, StockQuantity, ExpirationDate ON Inventory
+    BEGIN
+        DELETE FROM stock_cube_items WHERE ProductID = OLD.ProductID;
+        {_place_items_sql('i.ProductID = NEW.ProductID', has_region)}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_stock_cube_inventory_delete
+    AFTER DELETE ON Inventory
+    BEGIN
+        DELETE FROM stock_cube_items WHERE ProductID = OLD.ProductID;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_stock_cube_products_insert
+    AFTER INSERT ON Products
+    BEGIN
+        {_place_items_sql('i.ProductID = NEW.[Product ID]', has_region)}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_stock_cube_products_update
+    AFTER UPDATE OF {product_columns} ON Products
+    BEGIN
+        {_place_items_sql('i.ProductID = NEW.[Product ID]', has_region)}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_stock_cube_products_delete
+    AFTER DELETE ON Products
+    BEGIN
+        DELETE FROM stock_cube_items WHERE ProductID = OLD.[Product ID];
+    END;
+    COMMIT;
+    """)
+    if not exists:
+        print(f"Backfilled stock_cube ({'by region' if has_region else 'no Region column, single region'})")
+
+
+def stock_cube_slice(conn, group_by=('category', 'region'), category=None, region=None,
+                     expiry_from=None, expiry_to=None):
+    """Cube cells grouped by `group_by`, with category, region and grand totals.
+
+    Each row has TotalStock, ItemCount, the share of its category's stock
+    (CategoryPct), of its region's stock (RegionPct) and of all stock in the
+    slice (TotalPct). Filters narrow the slice before grouping; expiry bounds
+    are 'YYYY-MM' months.
+    """
+    unknown = [dimension for dimension in group_by if dimension not in CUBE_DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown cube dimension(s): {', '.join(unknown)}")
+    group_columns = [CUBE_DIMENSIONS[dimension] for dimension in group_by]
+
+    conditions = []
+    params = []
+    if category and category != 'all':
+        category_ids = resolve_category_ids(conn, category)
+        if not category_ids:
+            conditions.append("0")
+        else:
+            conditions.append(f"CategoryID IN ({', '.join('?' for _ in category_ids)})")
+            params.extend(category_ids)
+    if region and region != 'all':
+        conditions.append("Region = ?")
+        params.append(region)
+    if expiry_from:
+        conditions.append("ExpiryMonth >= ? AND ExpiryMonth != 'none'")
+        params.append(expiry_from)
+    if expiry_to:
+        conditions.append("ExpiryMonth <= ? AND ExpiryMonth != 'none'")
+        params.append(expiry_to)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    select_columns = ', '.join(group_columns)
+    group_clause = f"GROUP BY {select_columns}" if group_columns else ""
+    category_partition = "PARTITION BY CategoryID" if 'CategoryID' in group_columns else ""
+    region_partition = "PARTITION BY Region" if 'Region' in group_columns else ""
+
+    rows = conn.execute(f"""
+    WITH cells AS (
+        SELECT {select_columns + ',' if group_columns else ''}
+               SUM(TotalStock) AS TotalStock, SUM(ItemCount) AS ItemCount
+        FROM stock_cube
+        {where}
+        {group_clause}
+    )
+    SELECT cells.*,
+           ROUND(TotalStock * 100.0 / NULLIF(SUM(TotalStock) OVER ({category_partition}), 0), 2) AS CategoryPct,
+           ROUND(TotalStock * 100.0 / NULLIF(SUM(TotalStock) OVER ({region_partition}), 0), 2) AS RegionPct,
+           ROUND(TotalStock * 100.0 / NULLIF(SUM(TotalStock) OVER (), 0), 2) AS TotalPct
+    FROM cells
+    ORDER BY {select_columns or 'TotalStock DESC'}
+    """, params)
+    names = [column[0] for column in rows.description]
+    rows = [dict(zip(names, row)) for row in rows.fetchall()]
+
+    categories, _ = get_dictionaries(conn)
+    category_names = {category_id: name for name, category_id in categories.items()}
+
+    cells = []
+    category_totals = {}
+    region_totals = {}
+    grand_total = 0
+    for row in rows:
+        cell = row
+        if 'CategoryID' in cell:
+            cell['CategoryName'] = category_names.get(cell['CategoryID'], 'Uncategorized')
+            category_totals[cell['CategoryName']] = category_totals.get(cell['CategoryName'], 0) + cell['TotalStock']
+        if 'Region' in cell:
+            region_totals[cell['Region']] = region_totals.get(cell['Region'], 0) + cell['TotalStock']
+        grand_total += cell['TotalStock']
+        cells.append(cell)
+
+    return {
+        'group_by': list(group_by),
+        'cells': cells,
+        'category_totals': category_totals,
+        'region_totals': region_totals,
+        'grand_total': grand_total
+    }
@@ -0,0 +1,77 @@
+import csv
+import io
+import json
+
+from flask import current_app
+
+# Streamed query results.
+#
+# iter_query opens its own connection when iteration starts and reads the
+# cursor FETCH_SIZE rows at a time, so a response built on it holds one batch
+# in memory however many rows the query returns.
+
+FETCH_SIZE = 500
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+STREAM_FORMATS = ('csv', 'ndjson')
+
+
+def _iter_batches(connect, sql, params, exclude):
+    # Yields the column names first, then lists of row tuples
+    conn = connect()
+    try:
+        cursor = conn.execute(sql, params)
+        names = [column[0] for column in cursor.description]
+        keep = [index for index, name in enumerate(names) if name not in exclude]
+        yield [names[index] for index in keep]
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            yield [tuple(row[index] for index in keep) for row in rows]
+    finally:
+        conn.close()
+
+
+def iter_query(connect, sql, params=(), exclude=()):
+    """Rows of `sql` as dicts, without the `exclude` columns."""
+    batches = _iter_batches(connect, sql, params, exclude)
+    names = next(batches)
+    for rows in batches:
+        for row in rows:
+            yield dict(zip(names, row))
+
+
+def ndjson_response(rows, filename=None):
+    """Streamed response with one JSON object per line."""
+    def generate():
+        for row in rows:
+            yield json.dumps(row, default=str) + '\n'
+
+    return _attachment(current_app.response_class(generate(), mimetype=NDJSON_MIMETYPE), filename)
+
+
+def csv_response(connect, sql, params=(), exclude=(), filename=None):
+    """Streamed CSV of `sql`, header row first, written one fetched batch at a time."""
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        batches = _iter_batches(connect, sql, params, exclude)
+        writer.writerow(next(batches))
+        for rows in batches:
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        # Header and any rows not yet sent (all of it for an empty result)
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    return _attachment(current_app.response_class(generate(), mimetype='text/csv'), filename)
+
+
+def _attachment(response, filename):
+    if filename:
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
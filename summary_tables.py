@@ -0,0 +1,693 @@
+from datetime import date, timedelta
+
+# Precomputed summary tables kept current by triggers.
+#
+# The dashboards used to rebuild these aggregates from the raw tables on every
+# page view (and, for ratings, after joining through Product_Tags, which fans
+# each rating out once per tag). Each table here is backfilled once and then
+# maintained incrementally by triggers on the base tables, so the charts read
+# a handful of indexed rows instead.
+
+# Bayesian average: every product starts with PRIOR_WEIGHT virtual ratings at
+# the global mean, so a single 5-star review doesn't top the chart
+PRIOR_WEIGHT = 5
+
+
+# --- Product rating stats ---
+
+def _rating_add_sql(new):
+    return f"""
+        INSERT INTO product_rating_stats
+            (ProductID, RatingCount, RatingSum, Count1, Count2, Count3, Count4, Count5)
+        VALUES
+            ({new}.ProductID, 1, {new}.Rating, {new}.Rating = 1, {new}.Rating = 2,
+             {new}.Rating = 3, {new}.Rating = 4, {new}.Rating = 5)
+        ON CONFLICT(ProductID) DO UPDATE SET
+            RatingCount = RatingCount + 1,
+            RatingSum = RatingSum + excluded.RatingSum,
+            Count1 = Count1 + excluded.Count1,
+            Count2 = Count2 + excluded.Count2,
+            Count3 = Count3 + excluded.Count3,
+            Count4 = Count4 + excluded.Count4,
+            Count5 = Count5 + excluded.Count5;
+        {_rating_averages_sql(new)}
+    """
+
+
+def _rating_remove_sql(old):
+    return f"""
+        UPDATE product_rating_stats SET
+            RatingCount = RatingCount - 1,
+            RatingSum = RatingSum - {old}.Rating,
+            Count1 = Count1 - ({old}.Rating = 1),
+            Count2 = Count2 - ({old}.Rating = 2),
+            Count3 = Count3 - ({old}.Rating = 3),
+            Count4 = Count4 - ({old}.Rating = 4),
+            Count5 = Count5 - ({old}.Rating = 5)
+        WHERE ProductID = {old}.ProductID;
+        DELETE FROM product_rating_stats WHERE ProductID = {old}.ProductID AND RatingCount <= 0;
+        {_rating_averages_sql(old)}
+    """
+
+
+def _rating_averages_sql(row):
+    return f"""
+        UPDATE product_rating_stats SET
+            AvgRating = RatingSum * 1.0 / RatingCount,
+            BayesianAvg = (RatingSum + (SELECT PriorMean * PriorWeight FROM rating_prior))
+                          / (RatingCount + (SELECT PriorWeight FROM rating_prior))
+        WHERE ProductID = {row}.ProductID;
+    """
+
+
+def ensure_product_rating_stats(conn):
+    """Create, backfill and attach triggers for product_rating_stats."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_rating_stats'"
+    ).fetchone()
+
+    backfill = "" if exists else """
+    INSERT INTO product_rating_stats
+        (ProductID, RatingCount, RatingSum, Count1, Count2, Count3, Count4, Count5)
+    SELECT
+        ProductID, COUNT(*), SUM(Rating),
+        SUM(Rating = 1), SUM(Rating = 2), SUM(Rating = 3), SUM(Rating = 4), SUM(Rating = 5)
+    FROM Product_Ratings
+    WHERE ProductID IS NOT NULL AND Rating IS NOT NULL
+    GROUP BY ProductID;
+    """
+
+    # Backfill and triggers go in one transaction so no rating is missed or counted twice
+    conn.executescript(f"""
+    BEGIN;
+    CREATE TABLE IF NOT EXISTS rating_prior (
+        ID INTEGER PRIMARY KEY CHECK (ID = 1),
+        PriorMean REAL NOT NULL,
+        PriorWeight REAL NOT NULL
+    );
+    INSERT OR IGNORE INTO rating_prior (ID, PriorMean, PriorWeight) VALUES (1, 3.0, {PRIOR_WEIGHT});
+
+    CREATE TABLE IF NOT EXISTS product_rating_stats (
+        ProductID TEXT PRIMARY KEY,
+        RatingCount INTEGER NOT NULL DEFAULT 0,
+        RatingSum INTEGER NOT NULL DEFAULT 0,
+        Count1 INTEGER NOT NULL DEFAULT 0,
+        Count2 INTEGER NOT NULL DEFAULT 0,
+        Count3 INTEGER NOT NULL DEFAULT 0,
+        Count4 INTEGER NOT NULL DEFAULT 0,
+        Count5 INTEGER NOT NULL DEFAULT 0,
+        AvgRating REAL,
+        BayesianAvg REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_product_rating_stats_bayes
+        ON product_rating_stats(BayesianAvg DESC, RatingCount DESC);
+    CREATE INDEX IF NOT EXISTS idx_product_rating_stats_avg
+        ON product_rating_stats(AvgRating DESC, RatingCount DESC);
+    {backfill}
+    CREATE TRIGGER IF NOT EXISTS trg_rating_stats_insert
+    AFTER INSERT ON Product_Ratings
+    WHEN NEW.ProductID IS NOT NULL AND NEW.Rating IS NOT NULL
+    BEGIN
+        {_rating_add_sql('NEW')}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_rating_stats_delete
+    AFTER DELETE ON Product_Ratings
+    WHEN OLD.ProductID IS NOT NULL AND OLD.Rating IS NOT NULL
+    BEGIN
+        {_rating_remove_sql('OLD')}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_rating_stats_update_old
+    AFTER UPDATE OF ProductID, Rating ON Product_Ratings
+    WHEN OLD.ProductID IS NOT NULL AND OLD.Rating IS NOT NULL
+    BEGIN
+        {_rating_remove_sql('OLD')}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_rating_stats_update_new
+    AFTER UPDATE OF ProductID, Rating ON Product_Ratings
+    WHEN NEW.ProductID IS NOT NULL AND NEW.Rating IS NOT NULL
+    BEGIN
+        {_rating_add_sql('NEW')}
+    END;
+    COMMIT;
+    """)
+    if not exists:
+        print("Backfilled product_rating_stats")
+    refresh_rating_prior(conn)
+
+
+def refresh_rating_prior(conn):
+    """Move the Bayesian prior to the current global mean and re-rank every product.
+
+    Triggers keep individual rows current between refreshes; the prior itself
+    drifts slowly, so this only needs to run at startup or from a periodic job.
+    """
+    conn.execute("""
+    UPDATE rating_prior SET PriorMean = COALESCE(
+        (SELECT SUM(RatingSum) * 1.0 / NULLIF(SUM(RatingCount), 0) FROM product_rating_stats),
+        PriorMean)
+    WHERE ID = 1
+    """)
+    conn.execute("""
+    UPDATE product_rating_stats SET
+        AvgRating = RatingSum * 1.0 / RatingCount,
+        BayesianAvg = (RatingSum + (SELECT PriorMean * PriorWeight FROM rating_prior))
+                      / (RatingCount + (SELECT PriorWeight FROM rating_prior))
+    """)
+    conn.commit()
+
+
+# --- Tag stats ---
+
+_RATING_COLUMNS = ('RatingSum', 'RatingCount', 'Count1', 'Count2', 'Count3', 'Count4', 'Count5')
+
+
+def _tag_stats_delta_sql(tag_filter, sign, row, rated_delta):
+    # Add (sign='+') or subtract (sign='-') a product's rating stats on every tag matched by tag_filter
+    assignments = ',\n            '.join(f"{column} = {column} {sign} {row}.{column}" for column in _RATING_COLUMNS)
+    return f"""
+        UPDATE tag_stats SET
+            {assignments},
+            RatedProductCount = RatedProductCount {sign} {rated_delta}
+        WHERE {tag_filter};
+        UPDATE tag_stats SET AvgRating = RatingSum * 1.0 / NULLIF(RatingCount, 0)
+        WHERE {tag_filter};
+    """
+
+
+def _tag_assignment_sql(row, sign):
+    # Tag (un)assigned: move the product's whole rating summary onto / off the tag
+    product_stats = f"FROM product_rating_stats WHERE ProductID = {row}.ProductID"
+    assignments = ',\n            '.join(
+        f"{column} = {column} {sign} COALESCE((SELECT {column} {product_stats}), 0)" for column in _RATING_COLUMNS)
+    return f"""
+        UPDATE tag_stats SET
+            {assignments},
+            RatedProductCount = RatedProductCount {sign} EXISTS (SELECT 1 {product_stats}),
+            ProductCount = ProductCount {sign} 1
+        WHERE TagID = {row}.TagID;
+        UPDATE tag_stats SET AvgRating = RatingSum * 1.0 / NULLIF(RatingCount, 0)
+        WHERE TagID = {row}.TagID;
+    """
+
+
+def ensure_tag_stats(conn):
+    """Create, backfill and attach triggers for tag_stats (needs product_rating_stats)."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tag_stats'"
+    ).fetchone()
+
+    backfill = "" if exists else """
+    INSERT INTO tag_stats
+        (TagID, ProductCount, RatedProductCount, RatingSum, RatingCount,
+         Count1, Count2, Count3, Count4, Count5, AvgRating)
+    SELECT
+        t.TagID,
+        COUNT(pt.ProductID),
+        COUNT(s.ProductID),
+        COALESCE(SUM(s.RatingSum), 0),
+        COALESCE(SUM(s.RatingCount), 0),
+        COALESCE(SUM(s.Count1), 0),
+        COALESCE(SUM(s.Count2), 0),
+        COALESCE(SUM(s.Count3), 0),
+        COALESCE(SUM(s.Count4), 0),
+        COALESCE(SUM(s.Count5), 0),
+        SUM(s.RatingSum) * 1.0 / NULLIF(SUM(s.RatingCount), 0)
+    FROM Tags t
+    LEFT JOIN Product_Tags pt ON pt.TagID = t.TagID
+    LEFT JOIN product_rating_stats s ON s.ProductID = pt.ProductID
+    GROUP BY t.TagID;
+    """
+
+    product_tags = "TagID IN (SELECT TagID FROM Product_Tags WHERE ProductID = {}.ProductID)"
+
+    conn.executescript(f"""
+    BEGIN;
+    CREATE TABLE IF NOT EXISTS tag_stats (
+        TagID INTEGER PRIMARY KEY,
+        ProductCount INTEGER NOT NULL DEFAULT 0,
+        RatedProductCount INTEGER NOT NULL DEFAULT 0,
+        RatingSum INTEGER NOT NULL DEFAULT 0,
+        RatingCount INTEGER NOT NULL DEFAULT 0,
+        Count1 INTEGER NOT NULL DEFAULT 0,
+        Count2 INTEGER NOT NULL DEFAULT 0,
+        Count3 INTEGER NOT NULL DEFAULT 0,
+        Count4 INTEGER NOT NULL DEFAULT 0,
+        Count5 INTEGER NOT NULL DEFAULT 0,
+        AvgRating REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_tag_stats_avg ON tag_stats(AvgRating);
+    CREATE INDEX IF NOT EXISTS idx_tag_stats_usage ON tag_stats(ProductCount DESC);
+    CREATE INDEX IF NOT EXISTS idx_tag_stats_rating_count ON tag_stats(RatingCount DESC);
+    {backfill}
+    CREATE TRIGGER IF NOT EXISTS trg_tag_stats_tags_insert
+    AFTER INSERT ON Tags
+    BEGIN
+        INSERT OR IGNORE INTO tag_stats (TagID) VALUES (NEW.TagID);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_tag_stats_tags_delete
+    AFTER DELETE ON Tags
+    BEGIN
+        DELETE FROM tag_stats WHERE TagID = OLD.TagID;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_tag_stats_assign
+    AFTER INSERT ON Product_Tags
+    BEGIN
+        INSERT OR IGNORE INTO tag_stats (TagID) VALUES (NEW.TagID);
+        {_tag_assignment_sql('NEW', '+')}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_tag_stats_unassign
+    AFTER DELETE ON Product_Tags
+    BEGIN
+        {_tag_assignment_sql('OLD', '-')}
+    END;
+
+    -- Re-tagging moves the product from the old tag's counts to the new one's
+    CREATE TRIGGER IF NOT EXISTS trg_tag_stats_reassign
+    AFTER UPDATE OF ProductID, TagID ON Product_Tags
+    BEGIN
+        {_tag_assignment_sql('OLD', '-')}
+        INSERT OR IGNORE INTO tag_stats (TagID) VALUES (NEW.TagID);
+        {_tag_assignment_sql('NEW', '+')}
+    END;
+
+    -- Rating changes arrive through product_rating_stats, so each new rating
+    -- is applied once per tag of the product instead of re-joining raw ratings
+    CREATE TRIGGER IF NOT EXISTS trg_tag_stats_rating_insert
+    AFTER INSERT ON product_rating_stats
+    BEGIN
+        {_tag_stats_delta_sql(product_tags.format('NEW'), '+', 'NEW', 1)}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_tag_stats_rating_delete
+    AFTER DELETE ON product_rating_stats
+    BEGIN
+        {_tag_stats_delta_sql(product_tags.format('OLD'), '-', 'OLD', 1)}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_tag_stats_rating_update
+    AFTER UPDATE OF RatingSum, RatingCount, Count1, Count2, Count3, Count4, Count5 ON product_rating_stats
+    BEGIN
+        {_tag_stats_delta_sql(product_tags.format('OLD'), '-', 'OLD', 0)}
+        {_tag_stats_delta_sql(product_tags.format('NEW'), '+', 'NEW', 0)}
+    END;
+    COMMIT;
+    """)
+    if not exists:
+        print("Backfilled tag_stats")
+
+
+# --- Tag activity events and time-bucketed rollup ---
+
+ACTIVITY_GRAINS = ('day', 'week', 'month')
+
+# Most buckets one tag_activity call returns
+MAX_ACTIVITY_PERIODS = 366
+
+# Bucket start for each grain as SQLite date expressions over {ts}
+_GRAIN_BUCKETS = {
+    'day': "date({ts})",
+    'week': "date({ts}, '-6 days', 'weekday 1')",
+    'month': "strftime('%Y-%m-01', {ts})"
+}
+
+# Optional timestamp columns on Product_Ratings that a backfill can use
+_RATING_DATE_COLUMNS = ('RatingDate', 'ReviewDate', 'CreatedAt', 'Timestamp')
+
+
+def _activity_rollup_sql(row):
+    statements = []
+    for grain, bucket in _GRAIN_BUCKETS.items():
+        bucket_sql = bucket.format(ts=f"{row}.CreatedAt")
+        statements.append(f"""
+        INSERT INTO tag_activity_rollup (Grain, Bucket, TagID, Assignments, Ratings, RatingSum)
+        VALUES ('{grain}', {bucket_sql}, {row}.TagID,
+                {row}.EventType = 'assign', {row}.EventType = 'rating',
+                CASE WHEN {row}.EventType = 'rating' THEN {row}.Value ELSE 0 END)
+        ON CONFLICT(Grain, Bucket, TagID) DO UPDATE SET
+            Assignments = Assignments + excluded.Assignments,
+            Ratings = Ratings + excluded.Ratings,
+            RatingSum = RatingSum + excluded.RatingSum;""")
+    return ''.join(statements)
+
+
+def ensure_tag_activity(conn):
+    """Create the tag event log, its rollup and the triggers recording new events."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tag_events'"
+    ).fetchone()
+
+    conn.executescript(f"""
+    BEGIN;
+    CREATE TABLE IF NOT EXISTS tag_events (
+        EventID INTEGER PRIMARY KEY AUTOINCREMENT,
+        TagID INTEGER NOT NULL,
+        ProductID TEXT,
+        EventType TEXT NOT NULL,
+        Value INTEGER,
+        CreatedAt TEXT NOT NULL DEFAULT (datetime('now'))
+    );
+    CREATE INDEX IF NOT EXISTS idx_tag_events_created ON tag_events(CreatedAt);
+
+    CREATE TABLE IF NOT EXISTS tag_activity_rollup (
+        Grain TEXT NOT NULL,
+        Bucket TEXT NOT NULL,
+        TagID INTEGER NOT NULL,
+        Assignments INTEGER NOT NULL DEFAULT 0,
+        Ratings INTEGER NOT NULL DEFAULT 0,
+        RatingSum INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (Grain, Bucket, TagID)
+    ) WITHOUT ROWID;
+
+    CREATE TRIGGER IF NOT EXISTS trg_tag_events_assign
+    AFTER INSERT ON Product_Tags
+    BEGIN
+        INSERT INTO tag_events (TagID, ProductID, EventType, Value)
+        VALUES (NEW.TagID, NEW.ProductID, 'assign', 1);
+    END;
+
+    -- A rating counts as activity for every tag on the rated product
+    CREATE TRIGGER IF NOT EXISTS trg_tag_events_rating
+    AFTER INSERT ON Product_Ratings
+    WHEN NEW.Rating IS NOT NULL
+    BEGIN
+        INSERT INTO tag_events (TagID, ProductID, EventType, Value)
+        SELECT TagID, NEW.ProductID, 'rating', NEW.Rating
+        FROM Product_Tags WHERE ProductID = NEW.ProductID;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_tag_activity_rollup
+    AFTER INSERT ON tag_events
+    BEGIN
+        {_activity_rollup_sql('NEW')}
+    END;
+    COMMIT;
+    """)
+
+    if not exists:
+        # Ratings only have history if the table carries a timestamp column
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(Product_Ratings)").fetchall()]
+        date_column = next((column for column in _RATING_DATE_COLUMNS if column in columns), None)
+        if date_column:
+            conn.execute(f"""
+            INSERT INTO tag_events (TagID, ProductID, EventType, Value, CreatedAt)
+            SELECT pt.TagID, r.ProductID, 'rating', r.Rating, datetime(r.[{date_column}])
+            FROM Product_Ratings r
+            JOIN Product_Tags pt ON pt.ProductID = r.ProductID
+            WHERE r.Rating IS NOT NULL AND datetime(r.[{date_column}]) IS NOT NULL
+            ORDER BY r.[{date_column}]
+            """)
+            conn.commit()
+            print(f"Backfilled tag_events from Product_Ratings.{date_column}")
+
+
+def _bucket_starts(grain, start, end):
+    """Every bucket start (ISO date string) from the bucket containing `start` up to `end`."""
+    if grain == 'day':
+        current = start
+    elif grain == 'week':
+        current = start - timedelta(days=start.weekday())
+    else:
+        current = start.replace(day=1)
+
+    buckets = []
+    while current <= end:
+        buckets.append(current.isoformat())
+        if grain == 'day':
+            current += timedelta(days=1)
+        elif grain == 'week':
+            current += timedelta(days=7)
+        else:
+            current = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return buckets
+
+
+def tag_activity(conn, grain='month', periods=6, top_n=5, end=None):
+    """Real activity trend for the top-N tags over the last `periods` buckets.
+
+    Returns {'buckets': [...], 'series': [{'TagName', 'values', 'ratings', 'assignments'}]}
+    where each value is assignments + ratings in that bucket.
+    """
+    if grain not in ACTIVITY_GRAINS:
+        raise ValueError(f"grain must be one of {', '.join(ACTIVITY_GRAINS)}")
+    if not 1 <= periods <= MAX_ACTIVITY_PERIODS:
+        raise ValueError(f"periods must be between 1 and {MAX_ACTIVITY_PERIODS}")
+
+    end = end or date.today()
+    if grain == 'day':
+        start = end - timedelta(days=periods - 1)
+    elif grain == 'week':
+        start = end - timedelta(weeks=periods - 1)
+    else:
+        start = end.replace(day=1)
+        for _ in range(periods - 1):
+            start = (start - timedelta(days=1)).replace(day=1)
+    buckets = _bucket_starts(grain, start, end)
+
+    # One read: rank tags over the range and pull their buckets through the rollup key
+    rows = conn.execute("""
+    WITH top_tags AS (
+        SELECT TagID, SUM(Assignments + Ratings) AS Total
+        FROM tag_activity_rollup
+        WHERE Grain = ? AND Bucket BETWEEN ? AND ?
+        GROUP BY TagID
+        ORDER BY Total DESC
+        LIMIT ?
+    )
+    SELECT t.TagName, tt.Total, r.Bucket, r.Assignments, r.Ratings
+    FROM top_tags tt
+    JOIN Tags t ON t.TagID = tt.TagID
+    JOIN tag_activity_rollup r
+        ON r.Grain = ? AND r.TagID = tt.TagID AND r.Bucket BETWEEN ? AND ?
+    ORDER BY tt.Total DESC, t.TagName, r.Bucket
+    """, (grain, buckets[0], buckets[-1], top_n, grain, buckets[0], buckets[-1])).fetchall()
+
+    bucket_index = {bucket: i for i, bucket in enumerate(buckets)}
+    series = {}
+    for tag_name, _, bucket, assignments, ratings in rows:
+        entry = series.setdefault(tag_name, {
+            'TagName': tag_name,
+            'values': [0] * len(buckets),
+            'assignments': [0] * len(buckets),
+            'ratings': [0] * len(buckets)
+        })
+        i = bucket_index.get(bucket)
+        if i is None:
+            continue
+        entry['assignments'][i] = assignments
+        entry['ratings'][i] = ratings
+        entry['values'][i] = assignments + ratings
+
+    return {'grain': grain, 'buckets': buckets, 'series': list(series.values())}
+
+
+# --- Table stats ---
+
+# Row count for each table plus sum/count of the numeric columns the KPI cards
+# average, so COUNT(*) and AVG() become single-row lookups
+TABLE_STATS_COLUMNS = {
+    'Products': ('Price',),
+    'Inventory': ('StockQuantity',),
+    'Product_Ratings': ('Rating',),
+    'Tags': ()
+}
+
+
+def _table_stats_row_sql(table, delta):
+    return f"""
+        UPDATE table_stats SET RowCount = RowCount + ({delta})
+        WHERE TableName = '{table}' AND ColumnName = '*';
+    """
+
+
+def _table_stats_value_sql(table, column, row, sign):
+    return f"""
+        UPDATE table_stats SET
+            ValueSum = ValueSum {sign} COALESCE({row}.[{column}], 0),
+            ValueCount = ValueCount {sign} ({row}.[{column}] IS NOT NULL)
+        WHERE TableName = '{table}' AND ColumnName = '{column}';
+    """
+
+
+def ensure_table_stats(conn):
+    """Create, recount and attach triggers for table_stats.
+
+    The counters are recounted on every call (i.e. every start), which clears
+    any drift left by writers that bypassed the triggers - an INSERT OR
+    REPLACE without recursive_triggers, for one. It's a single aggregate scan
+    per table.
+    """
+    statements = []
+    for table, columns in TABLE_STATS_COLUMNS.items():
+        statements.append(f"""
+        INSERT OR REPLACE INTO table_stats (TableName, ColumnName, RowCount, ValueSum, ValueCount)
+        SELECT '{table}', '*', COUNT(*), 0, 0 FROM {table};
+        """)
+        for column in columns:
+            statements.append(f"""
+            INSERT OR REPLACE INTO table_stats (TableName, ColumnName, RowCount, ValueSum, ValueCount)
+            SELECT '{table}', '{column}', 0, COALESCE(SUM([{column}]), 0), COUNT([{column}]) FROM {table};
+            """)
+
+        insert_sql = ''.join(_table_stats_value_sql(table, column, 'NEW', '+') for column in columns)
+        delete_sql = ''.join(_table_stats_value_sql(table, column, 'OLD', '-') for column in columns)
+        statements.append(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_table_stats_{table.lower()}_insert
+        AFTER INSERT ON {table}
+        BEGIN
+            {_table_stats_row_sql(table, 1)}
+            {insert_sql}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_table_stats_{table.lower()}_delete
+        AFTER DELETE ON {table}
+        BEGIN
+            {_table_stats_row_sql(table, -1)}
+            {delete_sql}
+        END;
+        """)
+        for column in columns:
+            statements.append(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_table_stats_{table.lower()}_{column.lower()}_update
+            AFTER UPDATE OF [{column}] ON {table}
+            BEGIN
+                {_table_stats_value_sql(table, column, 'OLD', '-')}
+                {_table_stats_value_sql(table, column, 'NEW', '+')}
+            END;
+            """)
+
+    # Recount and triggers go in one transaction so no row is missed or counted twice
+    conn.executescript(f"""
+    BEGIN;
+    CREATE TABLE IF NOT EXISTS table_stats (
+        TableName TEXT NOT NULL,
+        ColumnName TEXT NOT NULL,
+        RowCount INTEGER NOT NULL DEFAULT 0,
+        ValueSum REAL NOT NULL DEFAULT 0,
+        ValueCount INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (TableName, ColumnName)
+    ) WITHOUT ROWID;
+    {''.join(statements)}
+    COMMIT;
+    """)
+
+
+def table_stats(conn):
+    """{'Products': {'rows': n, 'Price': {'sum', 'count', 'avg'}}, ...} from table_stats."""
+    stats = {}
+    for table, column, row_count, value_sum, value_count in conn.execute(
+            "SELECT TableName, ColumnName, RowCount, ValueSum, ValueCount FROM table_stats").fetchall():
+        entry = stats.setdefault(table, {'rows': 0})
+        if column == '*':
+            entry['rows'] = row_count
+        else:
+            entry[column] = {
+                'sum': value_sum,
+                'count': value_count,
+                'avg': value_sum / value_count if value_count else None
+            }
+    return stats
+
+
+# --- Monthly price rollup ---
+
+# One row per product per month; charts at month grain or coarser read this
+# instead of every Pricing_History row
+
+def _price_month_sql(row):
+    return f"strftime('%Y-%m-01', {row}.EffectiveDate)"
+
+
+def _price_monthly_add_sql(new):
+    return f"""
+        INSERT INTO price_monthly (ProductID, Month, PriceSum, PriceCount, MinPrice, MaxPrice)
+        VALUES ({new}.ProductID, {_price_month_sql(new)}, {new}.Price, 1, {new}.Price, {new}.Price)
+        ON CONFLICT(ProductID, Month) DO UPDATE SET
+            PriceSum = PriceSum + excluded.PriceSum,
+            PriceCount = PriceCount + 1,
+            MinPrice = MIN(MinPrice, excluded.MinPrice),
+            MaxPrice = MAX(MaxPrice, excluded.MaxPrice);
+    """
+
+
+def _price_monthly_recompute_sql(old):
+    # Min/max can't be taken back incrementally, so rebuild the one cell
+    return f"""
+        DELETE FROM price_monthly WHERE ProductID = {old}.ProductID AND Month = {_price_month_sql(old)};
+        INSERT INTO price_monthly (ProductID, Month, PriceSum, PriceCount, MinPrice, MaxPrice)
+        SELECT ProductID, {_price_month_sql('ph')}, SUM(Price), COUNT(Price), MIN(Price), MAX(Price)
+        FROM Pricing_History ph
+        WHERE ph.ProductID = {old}.ProductID
+        AND ph.EffectiveDate >= {_price_month_sql(old)}
+        AND ph.EffectiveDate < date({_price_month_sql(old)}, '+1 month')
+        AND ph.Price IS NOT NULL
+        GROUP BY ProductID, {_price_month_sql('ph')};
+    """
+
+
+def ensure_price_monthly(conn):
+    """Create, backfill and attach triggers for price_monthly."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'price_monthly'"
+    ).fetchone()
+
+    backfill = "" if exists else f"""
+    INSERT INTO price_monthly (ProductID, Month, PriceSum, PriceCount, MinPrice, MaxPrice)
+    SELECT ProductID, {_price_month_sql('ph')}, SUM(Price), COUNT(Price), MIN(Price), MAX(Price)
+    FROM Pricing_History ph
+    WHERE ProductID IS NOT NULL AND Price IS NOT NULL AND EffectiveDate IS NOT NULL
+    GROUP BY ProductID, {_price_month_sql('ph')};
+    """
+
+    # Backfill and triggers go in one transaction so no price is missed or counted twice
+    conn.executescript(f"""
+    BEGIN;
+    CREATE TABLE IF NOT EXISTS price_monthly (
+        ProductID TEXT NOT NULL,
+        Month TEXT NOT NULL,
+        PriceSum REAL NOT NULL DEFAULT 0,
+        PriceCount INTEGER NOT NULL DEFAULT 0,
+        MinPrice REAL,
+        MaxPrice REAL,
+        PRIMARY KEY (ProductID, Month)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_price_monthly_month ON price_monthly(Month, ProductID);
+    CREATE INDEX IF NOT EXISTS idx_pricing_history_product_date ON Pricing_History(ProductID, EffectiveDate);
+    {backfill}
+    CREATE TRIGGER IF NOT EXISTS trg_price_monthly_insert
+    AFTER INSERT ON Pricing_History
+    WHEN NEW.ProductID IS NOT NULL AND NEW.Price IS NOT NULL AND NEW.EffectiveDate IS NOT NULL
+    BEGIN
+        {_price_monthly_add_sql('NEW')}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_price_monthly_delete
+    AFTER DELETE ON Pricing_History
+    WHEN OLD.ProductID IS NOT NULL AND OLD.EffectiveDate IS NOT NULL
+    BEGIN
+        {_price_monthly_recompute_sql('OLD')}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_price_monthly_update
+    AFTER UPDATE OF ProductID, Price, EffectiveDate ON Pricing_History
+    BEGIN
+        {_price_monthly_recompute_sql('OLD')}
+        {_price_monthly_recompute_sql('NEW')}
+    END;
+    COMMIT;
+    """)
+    if not exists:
+        print("Backfilled price_monthly")
+
+
+def ensure_summary_tables(conn):
+    ensure_product_rating_stats(conn)
+    ensure_tag_stats(conn)
+    ensure_tag_activity(conn)
+    ensure_table_stats(conn)
+    ensure_price_monthly(conn)
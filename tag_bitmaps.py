@@ -0,0 +1,315 @@
+import threading
+
+# In-memory tag -> product bitmap index.
+#
+# Every product gets a dense ordinal and each TagID (and CategoryID) keeps a
+# compressed bitset of the ordinals carrying it. Multi-tag filters become
+# AND/OR/NOT over bitsets and "how many products have this tag" is a popcount,
+# so the analytical dashboard doesn't have to re-run the Product_Tags join.
+#
+# Changes to Product_Tags and to product categories are appended to
+# Bitmap_Changes by triggers; the index replays new entries on refresh instead
+# of rebuilding from scratch.
+
+CHUNK_BITS = 16
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+# Keep this many applied change log entries around for lagging workers
+CHANGE_LOG_RETENTION = 50000
+
+
+class Bitmap:
+    """Roaring-style bitset: one int bitmap per 65536-ordinal chunk, empty chunks omitted."""
+
+    __slots__ = ('chunks',)
+
+    def __init__(self, chunks=None):
+        self.chunks = chunks if chunks is not None else {}
+
+    @classmethod
+    def from_ordinals(cls, ordinals):
+        bitmap = cls()
+        for ordinal in ordinals:
+            bitmap.add(ordinal)
+        return bitmap
+
+    def add(self, ordinal):
+        key = ordinal >> CHUNK_BITS
+        self.chunks[key] = self.chunks.get(key, 0) | (1 << (ordinal & CHUNK_MASK))
+
+    def discard(self, ordinal):
+        key = ordinal >> CHUNK_BITS
+        bits = self.chunks.get(key, 0) & ~(1 << (ordinal & CHUNK_MASK))
+        if bits:
+            self.chunks[key] = bits
+        else:
+            self.chunks.pop(key, None)
+
+    def copy(self):
+        return Bitmap(dict(self.chunks))
+
+    def __and__(self, other):
+        small, large = (self, other) if len(self.chunks) <= len(other.chunks) else (other, self)
+        chunks = {}
+        for key, bits in small.chunks.items():
+            both = bits & large.chunks.get(key, 0)
+            if both:
+                chunks[key] = both
+        return Bitmap(chunks)
+
+    def __or__(self, other):
+        chunks = dict(self.chunks)
+        for key, bits in other.chunks.items():
+            chunks[key] = chunks.get(key, 0) | bits
+        return Bitmap(chunks)
+
+    def __sub__(self, other):
+        chunks = {}
+        for key, bits in self.chunks.items():
+            rest = bits & ~other.chunks.get(key, 0)
+            if rest:
+                chunks[key] = rest
+        return Bitmap(chunks)
+
+    def __len__(self):
+        return sum(bits.bit_count() for bits in self.chunks.values())
+
+    def __bool__(self):
+        return bool(self.chunks)
+
+    def __iter__(self):
+        for key in sorted(self.chunks):
+            bits = self.chunks[key]
+            base = key << CHUNK_BITS
+            while bits:
+                low = bits & -bits
+                yield base + low.bit_length() - 1
+                bits ^= low
+
+
+def ensure_bitmap_change_log(conn):
+    """Create the change log and the triggers feeding it."""
+    conn.executescript("""
+    CREATE TABLE IF NOT EXISTS Bitmap_Changes (
+        Seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        Kind TEXT NOT NULL,
+        ProductID TEXT NOT NULL,
+        ItemID INTEGER,
+        Op INTEGER NOT NULL
+    );
+
+    CREATE TRIGGER IF NOT EXISTS trg_bitmap_product_tags_insert
+    AFTER INSERT ON Product_Tags
+    BEGIN
+        INSERT INTO Bitmap_Changes (Kind, ProductID, ItemID, Op) VALUES ('tag', NEW.ProductID, NEW.TagID, 1);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_bitmap_product_tags_delete
+    AFTER DELETE ON Product_Tags
+    BEGIN
+        INSERT INTO Bitmap_Changes (Kind, ProductID, ItemID, Op) VALUES ('tag', OLD.ProductID, OLD.TagID, -1);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_bitmap_product_tags_update
+    AFTER UPDATE ON Product_Tags
+    BEGIN
+        INSERT INTO Bitmap_Changes (Kind, ProductID, ItemID, Op) VALUES ('tag', OLD.ProductID, OLD.TagID, -1);
+        INSERT INTO Bitmap_Changes (Kind, ProductID, ItemID, Op) VALUES ('tag', NEW.ProductID, NEW.TagID, 1);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_bitmap_products_category
+    AFTER UPDATE OF CategoryID ON Products
+    BEGIN
+        INSERT INTO Bitmap_Changes (Kind, ProductID, ItemID, Op)
+        SELECT 'category', OLD.[Product ID], OLD.CategoryID, -1 WHERE OLD.CategoryID IS NOT NULL;
+        INSERT INTO Bitmap_Changes (Kind, ProductID, ItemID, Op)
+        SELECT 'category', NEW.[Product ID], NEW.CategoryID, 1 WHERE NEW.CategoryID IS NOT NULL;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_bitmap_products_delete
+    AFTER DELETE ON Products
+    BEGIN
+        INSERT INTO Bitmap_Changes (Kind, ProductID, ItemID, Op)
+        SELECT 'category', OLD.[Product ID], OLD.CategoryID, -1 WHERE OLD.CategoryID IS NOT NULL;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_bitmap_products_live_insert
+    AFTER INSERT ON Products
+    BEGIN
+        INSERT INTO Bitmap_Changes (Kind, ProductID, ItemID, Op) VALUES ('product', NEW.[Product ID], NULL, 1);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_bitmap_products_live_delete
+    AFTER DELETE ON Products
+    BEGIN
+        INSERT INTO Bitmap_Changes (Kind, ProductID, ItemID, Op) VALUES ('product', OLD.[Product ID], NULL, -1);
+    END;
+    """)
+    conn.commit()
+
+
+def prune_bitmap_change_log(conn, keep=CHANGE_LOG_RETENTION):
+    conn.execute("""
+    DELETE FROM Bitmap_Changes
+    WHERE Seq <= (SELECT MAX(Seq) FROM Bitmap_Changes) - ?
+    """, (keep,))
+    conn.commit()
+
+
+class TagBitmapIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.built = False
+        self.last_seq = 0
+        self.product_ordinals = {}
+        self.ordinal_products = []
+        self.tag_bitmaps = {}
+        self.category_bitmaps = {}
+        # Products that still exist; tag rows of deleted products can outlive them
+        self.live = Bitmap()
+
+    def _ordinal(self, product_id):
+        ordinal = self.product_ordinals.get(product_id)
+        if ordinal is None:
+            ordinal = len(self.ordinal_products)
+            self.product_ordinals[product_id] = ordinal
+            self.ordinal_products.append(product_id)
+        return ordinal
+
+    def _apply(self, bitmaps, item_id, product_id, op):
+        ordinal = self._ordinal(product_id)
+        if op > 0:
+            bitmaps.setdefault(item_id, Bitmap()).add(ordinal)
+        elif item_id in bitmaps:
+            bitmaps[item_id].discard(ordinal)
+            if not bitmaps[item_id]:
+                del bitmaps[item_id]
+
+    def rebuild(self, conn):
+        # Read the log position first so changes made during the build get replayed
+        last_seq = conn.execute("SELECT COALESCE(MAX(Seq), 0) FROM Bitmap_Changes").fetchone()[0]
+        self.product_ordinals = {}
+        self.ordinal_products = []
+        self.tag_bitmaps = {}
+        self.category_bitmaps = {}
+        self.live = Bitmap()
+
+        for product_id, category_id in conn.execute(
+                "SELECT [Product ID], CategoryID FROM Products ORDER BY rowid"):
+            ordinal = self._ordinal(product_id)
+            self.live.add(ordinal)
+            if category_id is not None:
+                self.category_bitmaps.setdefault(category_id, Bitmap()).add(ordinal)
+
+        for tag_id, product_id in conn.execute(
+                "SELECT TagID, ProductID FROM Product_Tags ORDER BY TagID"):
+            self.tag_bitmaps.setdefault(tag_id, Bitmap()).add(self._ordinal(product_id))
+
+        self.last_seq = last_seq
+        self.built = True
+        print(f"Built tag bitmap index: {len(self.ordinal_products)} products, {len(self.tag_bitmaps)} tags")
+
+    def refresh(self, conn):
+        """Bring the index up to date with the change log."""
+        with self.lock:
+            if not self.built:
+                self.rebuild(conn)
+                return self
+
+            first_seq, max_seq = conn.execute(
+                "SELECT MIN(Seq), MAX(Seq) FROM Bitmap_Changes").fetchone()
+            if max_seq is None or max_seq <= self.last_seq:
+                return self
+            if first_seq > self.last_seq + 1:
+                # Entries we never saw were pruned - start over
+                self.rebuild(conn)
+                return self
+
+            changes = conn.execute("""
+            SELECT Seq, Kind, ProductID, ItemID, Op FROM Bitmap_Changes
+            WHERE Seq > ? ORDER BY Seq
+            """, (self.last_seq,)).fetchall()
+            for seq, kind, product_id, item_id, op in changes:
+                if kind == 'product':
+                    ordinal = self._ordinal(product_id)
+                    if op > 0:
+                        self.live.add(ordinal)
+                    else:
+                        self.live.discard(ordinal)
+                else:
+                    bitmaps = self.tag_bitmaps if kind == 'tag' else self.category_bitmaps
+                    self._apply(bitmaps, item_id, product_id, op)
+                self.last_seq = seq
+        return self
+
+    def tag(self, tag_id):
+        return self.tag_bitmaps.get(tag_id, Bitmap())
+
+    def category(self, category_id):
+        return self.category_bitmaps.get(category_id, Bitmap())
+
+    def filter(self, all_tags=(), any_tags=(), not_tags=(), category_ids=None):
+        """Bitmap of products having every tag in all_tags, at least one of any_tags,
+        none of not_tags and (optionally) one of category_ids."""
+        with self.lock:
+            result = None
+            for tag_id in all_tags:
+                result = self.tag(tag_id).copy() if result is None else result & self.tag(tag_id)
+            if any_tags:
+                union = Bitmap()
+                for tag_id in any_tags:
+                    union = union | self.tag(tag_id)
+                result = union if result is None else result & union
+            if category_ids is not None:
+                categories = Bitmap()
+                for category_id in category_ids:
+                    categories = categories | self.category(category_id)
+                result = categories if result is None else result & categories
+            # Deleted products drop out whichever bitmaps still carry them
+            result = self.live.copy() if result is None else result & self.live
+            for tag_id in not_tags:
+                result = result - self.tag(tag_id)
+            return result
+
+    def product_ids(self, bitmap, limit=None):
+        product_ids = []
+        for ordinal in bitmap:
+            if limit is not None and len(product_ids) >= limit:
+                break
+            product_ids.append(self.ordinal_products[ordinal])
+        return product_ids
+
+    def tag_counts(self, bitmap=None):
+        """{TagID: live product count}, optionally restricted to the products in `bitmap`."""
+        with self.lock:
+            if bitmap is None:
+                bitmap = self.live
+            return {tag_id: len(tag_bitmap & bitmap) for tag_id, tag_bitmap in self.tag_bitmaps.items()}
+
+    def co_occurrence(self, tag_id):
+        """{other TagID: number of products carrying both tags}."""
+        counts = self.tag_counts(self.tag(tag_id) & self.live)
+        counts.pop(tag_id, None)
+        return {other: count for other, count in counts.items() if count}
+
+
+_index = TagBitmapIndex()
+
+
+def get_tag_index(conn):
+    """Process-wide bitmap index, refreshed from the change log."""
+    return _index.refresh(conn)
+
+
+def popular_tags(conn, limit=50):
+    """[{'TagName', 'TagUsage'}] for the most used tags, counted from the bitmaps."""
+    from lookups import get_dictionaries
+
+    _, tags = get_dictionaries(conn)
+    tag_names = {tag_id: name for name, tag_id in tags.items()}
+    counts = get_tag_index(conn).tag_counts()
+    ranked = sorted(
+        ((tag_names[tag_id], count) for tag_id, count in counts.items() if tag_id in tag_names and count),
+        key=lambda item: (-item[1], item[0])
+    )
+    return [{'TagName': name, 'TagUsage': count} for name, count in ranked[:limit]]
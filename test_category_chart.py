@@ -1,5 +1,6 @@
 import sqlite3
 import json
+from db_profiles import connect
 
 # Use the exact absolute path as specified
 DB_PATH = r"C:\Users\samuel\Documents\final project\stock-project-main\stock-project.db"
@@ -13,7 +14,7 @@ def main():
     
     try:
         # Connect to the database with the absolute path
-        conn = sqlite3.connect(DB_PATH)
+        conn = connect(DB_PATH)
         print("Connection successful")
         
         # Enable row factory to access columns by name
@@ -1,5 +1,6 @@
 import sqlite3
 import json
+from db_profiles import connect
 
 # Use the absolute path to ensure consistent connections
 db_path = r'C:\Users\samuel\Documents\final project\stock-project-main\stock-project.db'
@@ -7,7 +8,7 @@ print(f"Testing connection to database: {db_path}")
 
 try:
     # Connect to the database
-    conn = sqlite3.connect(db_path)
+    conn = connect(db_path)
     conn.row_factory = sqlite3.Row
     print("Connection successful")
     